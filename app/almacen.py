@@ -0,0 +1,509 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Almacén de fragmentos direccionados por contenido (deduplicación)
+
+El destino se organiza como un repositorio:
+    fragmentos/ab/abcdef...   Fragmentos guardados una sola vez por su hash
+    manifiestos/AAAAMMDD_HHMMSS.json   Descripción de cada ejecución
+    .pyrespaldos_almacen.json          Parámetros del troceado del repositorio
+
+Uso desde la línea de comandos:
+    python -m app.almacen listar <repositorio>
+    python -m app.almacen extraer <repositorio> <manifiesto|ultimo> <destino> [rutas...]
+"""
+
+import os
+import sys
+import json
+import random
+import hashlib
+import argparse
+import datetime
+import threading
+
+from app.config import obtener_opciones_backup
+from app.indice import IndiceArbol, PREFIJO_INTERNO, escanear_arbol
+from app.plan_copia import planificar_copia, archivo_modificado
+from app.planificador import ejecutar_en_paralelo
+
+NOMBRE_CONFIGURACION = PREFIJO_INTERNO + "_almacen.json"
+CARPETA_FRAGMENTOS = "fragmentos"
+CARPETA_MANIFIESTOS = "manifiestos"
+
+# Parámetros del troceado para repositorios nuevos (fragmento medio ~ mínimo + 2^bits)
+PARAMETROS_PREDETERMINADOS = {
+    'version': 2,
+    'tamano_minimo': 256 * 1024,
+    'tamano_maximo': 4 * 1024 * 1024,
+    'bits_corte': 19,
+    'semilla': 0x5EED
+}
+
+# Versión más reciente del formato de repositorio que entiende este módulo
+VERSION_ALMACEN = 2
+
+# Tamaño de cada lectura del origen
+_TAMANO_LECTURA = 8 * 1024 * 1024
+
+# Bits del hash rodante; cada valor depende de los últimos _BITS_HASH bytes
+_BITS_HASH = 32
+
+# Posiciones candidatas a corte que se evalúan de una vez
+_TAMANO_BLOQUE = 128 * 1024
+
+
+def _id_fragmento(datos):
+    """Hash que identifica un fragmento por su contenido"""
+    return hashlib.blake2b(datos, digest_size=32).hexdigest()
+
+
+def _entero_repetido(valor, cantidad):
+    """Entero con 'valor' repetido en 'cantidad' casillas de 64 bits"""
+    return int.from_bytes(valor.to_bytes(8, "little") * cantidad, "little")
+
+
+class Troceador:
+    """
+    Busca los cortes de fragmento con un hash rodante tipo gear:
+
+        h = ((h << 1) + tabla[byte]) mod 2^32
+
+    y corta tras los bytes en los que los bits_corte bits altos de h son cero. Cada valor
+    depende solo de los últimos 32 bytes, así que una inserción desplaza los cortes
+    siguientes junto con el contenido, también en texto donde pocos bytes se repiten.
+
+    Para no recorrer los datos byte a byte en Python, el hash de un bloque se calcula de
+    golpe con enteros grandes: cada byte ocupa una casilla de 64 bits con su valor de la
+    tabla y la suma de la ventana se obtiene en cinco pasos de desplazar y sumar.
+    """
+
+    def __init__(self, semilla, bits_corte, tamano_minimo, tamano_maximo):
+        if not 0 <= bits_corte <= _BITS_HASH:
+            raise ValueError(f"bits_corte debe estar entre 0 y {_BITS_HASH}: {bits_corte}")
+        self.tamano_minimo = tamano_minimo
+        self.tamano_maximo = tamano_maximo
+
+        # Tabla de 32 bits por byte, repartida en cuatro tablas de translate (una por byte)
+        generador = random.Random(semilla)
+        tabla = [generador.getrandbits(_BITS_HASH) for _ in range(256)]
+        self._planos = [bytes((valor >> (8 * k)) & 0xFF for valor in tabla) for k in range(4)]
+
+        # Máscaras por casilla para el tamaño de bloque más grande
+        casillas = _TAMANO_BLOQUE + _BITS_HASH
+        desplazamiento = _BITS_HASH - bits_corte
+        self._bajos = _entero_repetido((1 << _BITS_HASH) - 1, casillas)
+        self._altos = _entero_repetido(((1 << bits_corte) - 1) << desplazamiento, casillas)
+        # Sumado a los bits altos, deja el bit 32 de la casilla a 1 si alguno no era cero
+        self._suma = _entero_repetido((1 << _BITS_HASH) - (1 << desplazamiento), casillas)
+
+    def _marcas(self, datos):
+        """
+        Calcula el hash rodante de cada byte de datos (empezando desde h = 0).
+
+        Returns:
+            bytes con un 0 en las posiciones donde se puede cortar y un 1 en el resto
+        """
+        casillas = len(datos)
+        valores = bytearray(8 * casillas)
+        for k, plano in enumerate(self._planos):
+            valores[k::8] = datos.translate(plano)
+        h = int.from_bytes(valores, "little")
+
+        bajos, altos, suma = self._bajos, self._altos, self._suma
+        if casillas < _TAMANO_BLOQUE + _BITS_HASH:
+            recorte = (1 << (64 * casillas)) - 1
+            bajos, altos, suma = bajos & recorte, altos & recorte, suma & recorte
+
+        # Tras el paso de anchura w cada casilla suma los 2w bytes anteriores desplazados
+        anchura = 1
+        while anchura < _BITS_HASH:
+            h = (h + (h << (65 * anchura))) & bajos
+            anchura *= 2
+
+        h = (h & altos) + suma
+        return h.to_bytes(8 * casillas, "little")[4::8]
+
+    def buscar_corte(self, datos, fin_archivo):
+        """
+        Busca el final del primer fragmento de datos.
+
+        Args:
+            datos: Datos pendientes de trocear, empezando en el inicio del fragmento
+            fin_archivo: True si no quedan más datos por leer del archivo
+
+        Returns:
+            Posición del corte, o -1 si hacen falta más datos para decidirlo
+        """
+        if len(datos) <= self.tamano_minimo:
+            return len(datos) if fin_archivo else -1
+        limite = min(len(datos), self.tamano_maximo)
+
+        # Un corte en la posición p depende de los 32 bytes anteriores a p
+        posicion = self.tamano_minimo
+        while posicion < limite:
+            final = min(posicion + _TAMANO_BLOQUE, limite)
+            inicio = max(0, posicion - _BITS_HASH)
+            marcas = self._marcas(bytes(datos[inicio:final]))
+            indice = marcas.find(0, posicion - 1 - inicio)
+            if indice >= 0:
+                return inicio + indice + 1
+            posicion = final
+
+        if limite == self.tamano_maximo or fin_archivo:
+            return limite
+        return -1
+
+
+class Almacen:
+    """Repositorio de fragmentos deduplicados y manifiestos de cada ejecución"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.ruta_fragmentos = os.path.join(ruta, CARPETA_FRAGMENTOS)
+        self.ruta_manifiestos = os.path.join(ruta, CARPETA_MANIFIESTOS)
+        self.parametros = dict(PARAMETROS_PREDETERMINADOS)
+        try:
+            with open(os.path.join(ruta, NOMBRE_CONFIGURACION), "r", encoding="utf-8") as f:
+                self.parametros.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        if self.parametros['version'] > VERSION_ALMACEN:
+            raise ValueError(f"El repositorio {ruta} usa un formato más reciente "
+                             f"(versión {self.parametros['version']})")
+        # Los repositorios antiguos conservan sus parámetros; solo cambia la forma de cortar
+        self._actualizar_configuracion = self.parametros['version'] < VERSION_ALMACEN
+        self.parametros['version'] = VERSION_ALMACEN
+        self._troceador = Troceador(self.parametros['semilla'], self.parametros['bits_corte'],
+                                    self.parametros['tamano_minimo'], self.parametros['tamano_maximo'])
+        self._conocidos = set()
+        self._cerrojo = threading.Lock()
+
+    def existe(self):
+        """Indica si la ruta ya contiene un repositorio"""
+        return os.path.isfile(os.path.join(self.ruta, NOMBRE_CONFIGURACION))
+
+    def inicializar(self):
+        """Crea la estructura del repositorio si no existe"""
+        os.makedirs(self.ruta_fragmentos, exist_ok=True)
+        os.makedirs(self.ruta_manifiestos, exist_ok=True)
+        if not self.existe() or self._actualizar_configuracion:
+            with open(os.path.join(self.ruta, NOMBRE_CONFIGURACION), "w", encoding="utf-8") as f:
+                json.dump(self.parametros, f, indent=2)
+            self._actualizar_configuracion = False
+
+    def _ruta_fragmento(self, id_fragmento):
+        return os.path.join(self.ruta_fragmentos, id_fragmento[:2], id_fragmento)
+
+    def guardar_fragmento(self, datos):
+        """
+        Guarda un fragmento si no existe todavía en el repositorio.
+
+        Returns:
+            Tupla (id_fragmento, nuevo)
+        """
+        id_fragmento = _id_fragmento(datos)
+        with self._cerrojo:
+            if id_fragmento in self._conocidos:
+                return (id_fragmento, False)
+            self._conocidos.add(id_fragmento)
+        ruta = self._ruta_fragmento(id_fragmento)
+        if os.path.exists(ruta):
+            return (id_fragmento, False)
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with open(temporal, "wb") as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+        except OSError:
+            with self._cerrojo:
+                self._conocidos.discard(id_fragmento)
+            raise
+        return (id_fragmento, True)
+
+    def leer_fragmento(self, id_fragmento):
+        """Lee un fragmento comprobando que su contenido coincide con su hash"""
+        with open(self._ruta_fragmento(id_fragmento), "rb") as f:
+            datos = f.read()
+        if _id_fragmento(datos) != id_fragmento:
+            raise ValueError(f"Fragmento dañado: {id_fragmento}")
+        return datos
+
+    def guardar_archivo(self, ruta_origen, callback_bytes=None):
+        """
+        Trocea un archivo en fragmentos definidos por su contenido y guarda los nuevos.
+
+        Returns:
+            Tupla (lista_ids, bytes_leidos, bytes_nuevos)
+        """
+        minimo = self.parametros['tamano_minimo']
+        maximo = self.parametros['tamano_maximo']
+        ids = []
+        bytes_leidos = 0
+        bytes_nuevos = 0
+        datos = bytearray()
+        fin = False
+        with open(ruta_origen, "rb") as f:
+            while True:
+                if not fin and len(datos) < maximo:
+                    tramo = f.read(_TAMANO_LECTURA)
+                    if tramo:
+                        datos += tramo
+                        bytes_leidos += len(tramo)
+                        if callback_bytes:
+                            callback_bytes(len(tramo))
+                    else:
+                        fin = True
+                    continue
+                if not datos:
+                    break
+                corte = self._troceador.buscar_corte(datos, fin)
+                if corte < 0:
+                    continue
+                fragmento = bytes(datos[:corte])
+                del datos[:corte]
+                id_fragmento, nuevo = self.guardar_fragmento(fragmento)
+                ids.append(id_fragmento)
+                if nuevo:
+                    bytes_nuevos += len(fragmento)
+        return (ids, bytes_leidos, bytes_nuevos)
+
+    def listar_manifiestos(self):
+        """Devuelve los nombres de los manifiestos ordenados del más antiguo al más reciente"""
+        if not os.path.isdir(self.ruta_manifiestos):
+            return []
+        return sorted(nombre[:-5] for nombre in os.listdir(self.ruta_manifiestos) if nombre.endswith(".json"))
+
+    def cargar_manifiesto(self, nombre=None):
+        """Carga un manifiesto (por defecto el más reciente) o devuelve None si no hay ninguno"""
+        if nombre is None or nombre == "ultimo":
+            manifiestos = self.listar_manifiestos()
+            if not manifiestos:
+                return None
+            nombre = manifiestos[-1]
+        with open(os.path.join(self.ruta_manifiestos, nombre + ".json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def guardar_manifiesto(self, manifiesto):
+        """Escribe el manifiesto de una ejecución de forma atómica"""
+        ruta = os.path.join(self.ruta_manifiestos, manifiesto['nombre'] + ".json")
+        temporal = ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+    def indice_manifiesto(self, manifiesto=None):
+        """
+        Construye un IndiceArbol con el contenido lógico de un manifiesto (por defecto el
+        más reciente) para compararlo con el origen.
+        """
+        if manifiesto is None:
+            manifiesto = self.cargar_manifiesto()
+        indice = IndiceArbol(self.ruta)
+        indice.registrar_carpeta(".")
+        if manifiesto:
+            for carpeta in manifiesto['carpetas']:
+                indice.registrar_carpeta(carpeta)
+            for entrada in manifiesto['archivos']:
+                indice.actualizar_archivo(entrada['ruta'], entrada['tamano'], entrada['mtime'])
+        return indice
+
+    def tamano_en_disco(self):
+        """Tamaño que ocupa el repositorio en el disco"""
+        return escanear_arbol(self.ruta).tamano_total()
+
+    def extraer(self, nombre, destino, rutas=None, callback_progreso=None):
+        """
+        Restaura el contenido de un manifiesto.
+
+        Args:
+            nombre: Nombre del manifiesto o "ultimo"
+            destino: Carpeta donde se restauran los archivos
+            rutas: Lista opcional de rutas relativas (archivos o carpetas) a restaurar
+            callback_progreso: Función para reportar progreso (recibe índice, total, ruta)
+
+        Returns:
+            Lista de elementos restaurados en formato (ruta, tipo, tamaño)
+        """
+        manifiesto = self.cargar_manifiesto(nombre)
+        if manifiesto is None:
+            raise ValueError(f"El repositorio {self.ruta} no tiene manifiestos")
+
+        filtros = [os.path.normpath(r) for r in rutas] if rutas else None
+
+        def incluida(ruta):
+            if filtros is None:
+                return True
+            return any(ruta == f or ruta.startswith(f + os.sep) for f in filtros)
+
+        restaurados = []
+        for carpeta in manifiesto['carpetas']:
+            if incluida(carpeta):
+                os.makedirs(os.path.join(destino, carpeta), exist_ok=True)
+                restaurados.append((carpeta, '[CARPETA]', 0))
+
+        archivos = [e for e in manifiesto['archivos'] if incluida(e['ruta'])]
+        for i, entrada in enumerate(archivos, 1):
+            ruta_destino = os.path.join(destino, entrada['ruta'])
+            os.makedirs(os.path.dirname(ruta_destino), exist_ok=True)
+            with open(ruta_destino, "wb") as f:
+                for id_fragmento in entrada['fragmentos']:
+                    f.write(self.leer_fragmento(id_fragmento))
+            os.utime(ruta_destino, (entrada['mtime'], entrada['mtime']))
+            restaurados.append((entrada['ruta'], '[ARCHIVO]', entrada['tamano']))
+            if callback_progreso:
+                callback_progreso(i, len(archivos), entrada['ruta'])
+        return restaurados
+
+
+def respaldar_en_almacen(origen, destino, elementos_seleccionados, callback_progreso=None, opciones=None,
+                         callback_trabajador=None, indice_origen=None, detalles=None, limitador=None):
+    """
+    Respalda la selección en un repositorio deduplicado en lugar de en una copia espejo.
+    Los archivos sin cambios desde el manifiesto anterior reutilizan sus fragmentos sin releerse.
+
+    Args:
+        origen: Ruta de origen
+        destino: Ruta del repositorio
+        elementos_seleccionados: Lista de elementos a respaldar
+        callback_progreso: Función para reportar progreso (recibe índice, total, ruta)
+        opciones: Diccionario de opciones de respaldo (ver DEFAULT_CONFIG['backup'])
+        callback_trabajador: Función para reportar progreso por hilo
+        indice_origen: Índice ya escaneado del origen
+        detalles: Diccionario opcional que se rellena con 'bytes_escritos' y 'almacen'
+            (con los archivos que no se pudieron guardar en 'errores')
+        limitador: Limitador de bytes y archivos por segundo (ver limitador.py)
+
+    Returns:
+        Lista de elementos procesados (carpetas nuevas y archivos nuevos o modificados)
+        en formato (ruta, tipo, tamaño)
+    """
+    opciones = obtener_opciones_backup(opciones)
+    num_hilos = opciones['num_workers'] if opciones['use_multithreading'] else 1
+    tolerancia = opciones['mtime_tolerance']
+    if indice_origen is None:
+        indice_origen = escanear_arbol(origen)
+
+    almacen = Almacen(destino)
+    almacen.inicializar()
+    anterior = almacen.cargar_manifiesto()
+    indice_anterior = almacen.indice_manifiesto(anterior)
+    entradas_anteriores = {e['ruta']: e for e in anterior['archivos']} if anterior else {}
+
+    # Todo lo seleccionado forma parte del manifiesto; solo se trocean los archivos cambiados
+    carpetas = []
+    entradas = []
+    tareas = []
+    elementos_procesados = []
+    for ruta, tipo, tamaño in planificar_copia(elementos_seleccionados, indice_origen, IndiceArbol(destino), tolerancia):
+        if tipo == '[CARPETA]':
+            carpetas.append(ruta)
+            if not indice_anterior.es_carpeta(ruta):
+                elementos_procesados.append((ruta, '[CARPETA]', 0))
+            continue
+        info_origen = indice_origen.info_archivo(ruta)
+        if not archivo_modificado(info_origen, indice_anterior.info_archivo(ruta), tolerancia):
+            entradas.append(entradas_anteriores[ruta])
+        else:
+            tareas.append((ruta, os.path.join(origen, ruta), None, tamaño))
+
+    sin_cambios = len(entradas)
+
+    def trocear(tarea, callback_bytes):
+        return almacen.guardar_archivo(tarea[1], callback_bytes)
+
+    def tarea_completada(completadas, total, tarea, resultado, error):
+        if error is not None:
+            print(f"Error al guardar archivo {tarea[1]}: {error}")
+        if callback_progreso:
+            callback_progreso(completadas, total, tarea[0])
+
+    bytes_nuevos_total = 0
+    fragmentos = 0
+    errores = []
+    for tarea, resultado, error in ejecutar_en_paralelo(tareas, trocear, num_hilos,
+                                                        callback_trabajador, tarea_completada, limitador):
+        if error is not None:
+            # Como en la copia normal, si no se puede guardar la versión nueva se conserva la anterior
+            errores.append((tarea[0], str(error)))
+            if tarea[0] in entradas_anteriores:
+                entradas.append(entradas_anteriores[tarea[0]])
+            continue
+        ids, bytes_leidos, bytes_nuevos = resultado
+        info_origen = indice_origen.info_archivo(tarea[0])
+        entradas.append({'ruta': tarea[0], 'tamano': bytes_leidos, 'mtime': info_origen[1], 'fragmentos': ids})
+        elementos_procesados.append((tarea[0], '[ARCHIVO]', bytes_leidos))
+        bytes_nuevos_total += bytes_nuevos
+        fragmentos += len(ids)
+
+    entradas.sort(key=lambda e: e['ruta'])
+    nombre = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    existentes = set(almacen.listar_manifiestos())
+    sufijo = 1
+    while nombre in existentes:
+        nombre = f"{nombre[:15]}_{sufijo}"
+        sufijo += 1
+    manifiesto = {
+        'nombre': nombre,
+        'origen': origen,
+        'fecha': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'carpetas': carpetas,
+        'archivos': entradas
+    }
+    almacen.guardar_manifiesto(manifiesto)
+
+    if detalles is not None:
+        detalles['bytes_escritos'] = bytes_nuevos_total
+        detalles['almacen'] = {
+            'manifiesto': manifiesto['nombre'],
+            'archivos': len(entradas),
+            'archivos_sin_cambios': sin_cambios,
+            'bytes_logicos': sum(e['tamano'] for e in entradas),
+            'bytes_procesados': sum(t for _, tipo, t in elementos_procesados if tipo == '[ARCHIVO]'),
+            'bytes_nuevos': bytes_nuevos_total,
+            'fragmentos': fragmentos,
+            'errores': errores
+        }
+    return elementos_procesados
+
+
+def main(argumentos=None):
+    """Punto de entrada de la línea de comandos del almacén"""
+    parser = argparse.ArgumentParser(prog="python -m app.almacen",
+                                     description="Consulta y restauración de repositorios de PyRespaldos")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    listar = subcomandos.add_parser("listar", help="Lista los manifiestos del repositorio")
+    listar.add_argument("repositorio")
+
+    extraer = subcomandos.add_parser("extraer", help="Restaura el contenido de un manifiesto")
+    extraer.add_argument("repositorio")
+    extraer.add_argument("manifiesto", help="Nombre del manifiesto o 'ultimo'")
+    extraer.add_argument("destino")
+    extraer.add_argument("rutas", nargs="*", help="Rutas relativas a restaurar (por defecto todas)")
+
+    args = parser.parse_args(argumentos)
+    almacen = Almacen(args.repositorio)
+    if not almacen.existe():
+        print(f"{args.repositorio} no es un repositorio de PyRespaldos")
+        return 1
+
+    if args.comando == "listar":
+        for nombre in almacen.listar_manifiestos():
+            manifiesto = almacen.cargar_manifiesto(nombre)
+            total = sum(e['tamano'] for e in manifiesto['archivos'])
+            print(f"{nombre}  {len(manifiesto['archivos'])} archivos  {total} bytes  {manifiesto['origen']}")
+        return 0
+
+    try:
+        restaurados = almacen.extraer(args.manifiesto, args.destino, args.rutas)
+    except (OSError, ValueError) as e:
+        print(f"Error al extraer: {e}")
+        return 1
+    print(f"Restaurados {sum(1 for _, tipo, _ in restaurados if tipo == '[ARCHIVO]')} archivos en {args.destino}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,21 +6,15 @@ PyRespaldos - Módulo para operaciones de copia y respaldo
 
 import os
 import subprocess
+import threading
 
-def copiar_archivo_manual(origen, destino):
-    """Copia un archivo de forma manual con verificación"""
-    # Asegurar que el directorio destino existe
-    os.makedirs(os.path.dirname(destino), exist_ok=True)
-    
-    # Copiar el archivo
-    with open(origen, 'rb') as fsrc:
-        contenido = fsrc.read()
-        with open(destino, 'wb') as fdst:
-            fdst.write(contenido)
-    
-    # Verificar que el tamaño coincide
-    if os.path.getsize(origen) != os.path.getsize(destino):
-        raise Exception(f"Error de verificación en la copia de {origen}")
+from app.config import obtener_opciones_backup
+from app.delta import actualizar_con_delta, DeltaNoRentable
+from app.indice import escanear_arbol
+from app.plan_copia import planificar_copia
+from app.motor_copia import copiar_archivo, sincronizar_archivo, sincronizar_carpeta, Sincronizador
+from app.planificador import ejecutar_en_paralelo
+from app.verificacion import Verificador, crear_hash
 
 def copiar_con_robocopy(origen, destino, elementos_seleccionados, opciones_adicionales=""):
     """
@@ -78,7 +72,99 @@ def copiar_con_robocopy(origen, destino, elementos_seleccionados, opciones_adici
     except Exception as e:
         return (False, -1, [], str(e))
 
-def copiar_archivos_manualmente(origen, destino, elementos_seleccionados, callback_progreso=None):
+def _copiar_tarea(tarea, callback_bytes=None, algoritmo_hash=None, opciones=None, limpiar_variantes=False):
+    """
+    Copia una tarea (ruta_relativa, ruta_origen, ruta_destino, tamaño).
+    Si está activada la transferencia delta y ya existe una copia grande en el destino,
+    solo se reescriben los bloques que cambiaron. Si está activada la compresión y el
+    archivo es compresible se guarda comprimido. Con la política de sincronización 'file'
+    el archivo está en disco al volver.
+    
+    Args:
+        limpiar_variantes: Si es True se eliminan las versiones anteriores del archivo
+            guardadas de otra forma (comprimida o sin comprimir)
+    
+    Returns:
+        Tupla (bytes_copiados, hash_origen o None, bytes_escritos, uso_delta, guardado)
+        donde guardado es (ruta_guardada, tamaño_guardado, algoritmo) si se comprimió o None
+    """
+    _, ruta_origen, ruta_destino, tamaño = tarea
+    sincronizar = opciones is not None and opciones['fsync_policy'] == 'file'
+    
+    if (opciones and opciones['delta_transfer'] and tamaño >= opciones['delta_min_size']
+            and os.path.isfile(ruta_destino)):
+        hasher = crear_hash(algoritmo_hash) if algoritmo_hash else None
+        try:
+            copiados, bytes_escritos = actualizar_con_delta(ruta_origen, ruta_destino, opciones['delta_block_size'],
+                                                            callback_bytes, hasher)
+            if sincronizar:
+                sincronizar_archivo(ruta_destino)
+                sincronizar_carpeta(os.path.dirname(ruta_destino))
+            return (copiados, hasher.hexdigest() if hasher is not None else None, bytes_escritos, True, None)
+        except DeltaNoRentable:
+            pass  # Demasiados cambios: copiar el archivo completo
+    
+    hasher = crear_hash(algoritmo_hash) if algoritmo_hash else None
+    algoritmo_compresion = opciones['compression'] if opciones else 'none'
+    if algoritmo_compresion != 'none' and tamaño >= opciones['compression_min_size']:
+        from app.compresion import es_compresible, copiar_comprimido, eliminar_variantes
+        if es_compresible(ruta_origen, tamaño):
+            copiados, ruta_guardada, tamaño_guardado = copiar_comprimido(
+                ruta_origen, ruta_destino, algoritmo_compresion, opciones['compression_level'],
+                callback_bytes, hasher, sincronizar)
+            if limpiar_variantes:
+                eliminar_variantes(ruta_destino, ruta_guardada)
+            return (copiados, hasher.hexdigest() if hasher is not None else None, tamaño_guardado, False,
+                    (ruta_guardada, tamaño_guardado, algoritmo_compresion))
+    
+    copiados = copiar_archivo(ruta_origen, ruta_destino, callback_bytes=callback_bytes, hasher=hasher,
+                              sincronizar=sincronizar)
+    if limpiar_variantes:
+        from app.compresion import eliminar_variantes
+        eliminar_variantes(ruta_destino, ruta_destino)
+    return (copiados, hasher.hexdigest() if hasher is not None else None, copiados, False, None)
+
+def preparar_tareas_copia(origen, destino, plan, indice_destino=None, catalogo=None):
+    """
+    Crea las carpetas del plan en el destino y genera las tareas de copia de sus archivos.
+    
+    Args:
+        origen: Ruta de origen
+        destino: Ruta de destino
+        plan: Plan de copia en formato (ruta, tipo, tamaño) (ver planificar_copia)
+        indice_destino: Índice del destino donde registrar las carpetas creadas
+        catalogo: Catálogo del destino donde registrar las carpetas creadas
+        
+    Returns:
+        Tupla (tareas, carpetas) donde tareas es una lista de
+        (ruta_relativa, ruta_origen, ruta_destino, tamaño) y carpetas la lista de
+        carpetas creadas en formato (ruta, tipo, tamaño)
+    """
+    tareas = []
+    carpetas = []
+    
+    for ruta, tipo, tamaño in plan:
+        ruta_destino_completa = os.path.join(destino, ruta)
+        try:
+            if tipo == '[CARPETA]':
+                os.makedirs(ruta_destino_completa, exist_ok=True)
+                carpetas.append((ruta, '[CARPETA]', 0))
+                if indice_destino is not None:
+                    indice_destino.registrar_carpeta(ruta)
+                if catalogo is not None:
+                    catalogo.registrar_carpeta(ruta)
+            else:
+                # Asegurar que el directorio destino existe
+                os.makedirs(os.path.dirname(ruta_destino_completa), exist_ok=True)
+                tareas.append((ruta, os.path.join(origen, ruta), ruta_destino_completa, tamaño))
+        except Exception as e:
+            print(f"Error al preparar {ruta}: {e}")
+    
+    return tareas, carpetas
+
+def copiar_archivos_manualmente(origen, destino, elementos_seleccionados, callback_progreso=None,
+                                opciones=None, callback_trabajador=None, indice_origen=None, indice_destino=None,
+                                catalogo=None, plan=None, detalles=None, diario=None, limitador=None):
     """
     Realiza la copia de archivos manualmente sin usar robocopy
     
@@ -87,74 +173,215 @@ def copiar_archivos_manualmente(origen, destino, elementos_seleccionados, callba
         destino: Ruta de destino
         elementos_seleccionados: Lista de elementos a copiar
         callback_progreso: Función para reportar progreso (recibe índice, total, ruta)
+        opciones: Diccionario de opciones de respaldo (ver DEFAULT_CONFIG['backup'])
+        callback_trabajador: Función para reportar progreso por hilo
+            (recibe id_trabajador, tarea, bytes_hechos)
+        indice_origen: Índice ya escaneado del origen
+        indice_destino: Índice ya escaneado del destino; se actualiza con los archivos copiados
+        catalogo: Catálogo persistente del destino; se registra cada archivo al terminar su copia
+        plan: Plan de copia ya calculado con comparar_origen_destino; si no se indica se
+            calcula a partir de los elementos seleccionados
+        detalles: Diccionario opcional que se rellena con información adicional de la
+            ejecución para el informe ('verificacion', 'bytes_escritos', 'delta', 'empaquetado',
+            'compresion')
+        diario: DiarioCopia donde se anota cada archivo terminado (para poder reanudar)
+        limitador: Limitador de bytes y archivos por segundo (ver limitador.py)
         
     Returns:
         Lista de elementos copiados en formato (ruta, tipo, tamaño)
     """
-    elementos_copiados = []
-    total_elementos = len(elementos_seleccionados)
+    opciones = obtener_opciones_backup(opciones)
+    if opciones['snapshot_mode']:
+        # En modo instantáneas los archivos sin cambios se enlazan uno a uno desde la
+        # instantánea anterior, así que se guardan tal cual (sin empaquetar ni comprimir)
+        opciones = dict(opciones, pack_small_files=False, compression='none')
+    num_hilos = opciones['num_workers'] if opciones['use_multithreading'] else 1
     
-    for idx, ruta in enumerate(elementos_seleccionados):
-        ruta_origen_completa = os.path.join(origen, ruta)
-        ruta_destino_completa = os.path.join(destino, ruta)
-        
+    if indice_origen is None:
+        indice_origen = escanear_arbol(origen)
+    if indice_destino is None:
+        if catalogo is not None and not catalogo.esta_vacio():
+            indice_destino = catalogo.cargar_indice()
+        else:
+            indice_destino = escanear_arbol(destino)
+    if plan is None:
+        plan = planificar_copia(elementos_seleccionados, indice_origen, indice_destino,
+                                opciones['mtime_tolerance'])
+    
+    tareas, elementos_copiados = preparar_tareas_copia(origen, destino, plan, indice_destino, catalogo)
+    
+    # Los archivos pequeños se guardan en un contenedor por carpeta (una tarea por carpeta)
+    grupos = []
+    if opciones['pack_small_files']:
+        from app.empaquetado import separar_pequenos, rutas_paquete
+        tareas, grupos = separar_pequenos(tareas, opciones['pack_threshold'], indice_destino)
+    
+    # La verificación relee cada destino en su propio grupo de hilos mientras continúa la copia
+    verificador = None
+    if opciones['verify_copy']:
+        verificador = Verificador(opciones['hash_algorithm'], opciones['verify_workers'])
+    algoritmo_hash = verificador.algoritmo if verificador is not None else None
+    rutas_escritas = [tarea[2] for tarea in tareas]
+    for grupo in grupos:
+        rutas_escritas.extend(rutas_paquete(grupo[2]))
+    sincronizador = Sincronizador(opciones['fsync_policy'], rutas_escritas)
+    total_archivos = len(tareas) + sum(len(grupo[1]) for grupo in grupos)
+    # Los callbacks se ejecutan en los hilos de copia: el contador global va con cerrojo
+    completadas_total = [0]
+    cerrojo_completadas = threading.Lock()
+    
+    def contar_completadas(cantidad=1):
+        with cerrojo_completadas:
+            completadas_total[0] += cantidad
+            return completadas_total[0]
+    
+    # Archivos que ya existían en el destino y pueden estar guardados de otra forma
+    # (comprimidos o sin comprimir): al copiarlos se elimina la versión anterior
+    comprimidos_previos = catalogo.rutas_comprimidas() if catalogo is not None else set()
+    limpiar = {tarea[0] for tarea in tareas
+               if (opciones['compression'] != 'none' or tarea[0] in comprimidos_previos)
+               and indice_destino.info_archivo(tarea[0]) is not None}
+    
+    def copiar_tarea(tarea, callback_bytes):
+        return _copiar_tarea(tarea, callback_bytes, algoritmo_hash, opciones, tarea[0] in limpiar)
+    
+    def tarea_completada(completadas, total, tarea, resultado, error):
+        ruta = tarea[0]
+        guardado = resultado[4] if error is None else None
+        sincronizador.archivo_terminado(guardado[0] if guardado else tarea[2], error is None)
+        if error is not None:
+            print(f"Error al copiar archivo {tarea[1]}: {error}")
+        else:
+            copiados, hash_origen = resultado[0], resultado[1]
+            if verificador is not None:
+                if guardado:
+                    verificador.enviar(ruta, guardado[0], hash_origen, codec=guardado[2])
+                else:
+                    verificador.enviar(ruta, tarea[2], hash_origen)
+            if catalogo is not None:
+                info_origen = indice_origen.info_archivo(ruta)
+                catalogo.registrar_archivo(ruta, copiados, info_origen[1] if info_origen else 0, hash_origen,
+                                           guardado[1] if guardado else None)
+            if diario is not None:
+                if guardado:
+                    diario.registrar_hecho(ruta, copiados, hash_origen,
+                                           os.path.relpath(guardado[0], destino), guardado[1])
+                else:
+                    diario.registrar_hecho(ruta, copiados, hash_origen)
         # Reportar progreso si se proporciona callback
+        completadas = contar_completadas()
         if callback_progreso:
-            callback_progreso(idx, total_elementos, ruta)
+            callback_progreso(completadas, total_archivos, ruta)
+    
+    resultados = ejecutar_en_paralelo(tareas, copiar_tarea, num_hilos,
+                                      callback_trabajador, tarea_completada, limitador)
+    
+    # Los archivos que ya existían y se han copiado sueltos salen del contenedor de su
+    # carpeta, si lo tiene (p. ej. porque han crecido por encima del umbral)
+    reemplazados = [tarea[0] for tarea, _, error in resultados
+                    if error is None and indice_destino.info_archivo(tarea[0]) is not None]
+    if reemplazados:
+        from app.empaquetado import retirar_empaquetados
+        retirar_empaquetados(destino, reemplazados)
+    
+    resultados_paquetes = []
+    if grupos:
+        from app.empaquetado import empaquetar_grupo
         
-        try:
-            if os.path.isdir(ruta_origen_completa):
-                # Es un directorio
-                if not os.path.exists(ruta_destino_completa):
-                    os.makedirs(ruta_destino_completa, exist_ok=True)
-                elementos_copiados.append((ruta, '[CARPETA]', 0))
-                
-                # Para cada carpeta, también necesitamos recorrer sus archivos y copiarlos
-                for root, dirs, files in os.walk(ruta_origen_completa):
-                    # Calcular la ruta relativa desde la carpeta origen principal
-                    rel_path = os.path.relpath(root, origen)
-                    
-                    # Crear carpeta destino correspondiente
-                    dest_dir = os.path.join(destino, rel_path)
-                    if not os.path.exists(dest_dir):
-                        os.makedirs(dest_dir, exist_ok=True)
-                    
-                    # Copiar cada archivo en esta carpeta
-                    for file in files:
-                        src_file = os.path.join(root, file)
-                        dst_file = os.path.join(dest_dir, file)
-                        
-                        try:
-                            # Verificar si el archivo ya existe y comparar tamaños
-                            if not os.path.exists(dst_file) or os.path.getsize(src_file) != os.path.getsize(dst_file):
-                                # Crear directorio si no existe
-                                os.makedirs(os.path.dirname(dst_file), exist_ok=True)
-                                
-                                # Copiar archivo
-                                with open(src_file, 'rb') as fsrc:
-                                    with open(dst_file, 'wb') as fdst:
-                                        fdst.write(fsrc.read())
-                                
-                                # Registrar archivo copiado
-                                rel_file_path = os.path.join(rel_path, file)
-                                tamaño = os.path.getsize(src_file)
-                                elementos_copiados.append((rel_file_path, '[ARCHIVO]', tamaño))
-                        except Exception as e:
-                            print(f"Error al copiar archivo {src_file}: {e}")
-                
-            elif os.path.isfile(ruta_origen_completa):
-                # Es un archivo
-                # Asegurar que el directorio destino existe
-                os.makedirs(os.path.dirname(ruta_destino_completa), exist_ok=True)
-                
-                # Copiar archivo
-                with open(ruta_origen_completa, 'rb') as fsrc:
-                    tamano = os.path.getsize(ruta_origen_completa)
-                    with open(ruta_destino_completa, 'wb') as fdst:
-                        fdst.write(fsrc.read())
-                elementos_copiados.append((ruta, '[ARCHIVO]', tamano))
+        def empaquetar(grupo, callback_bytes):
+            return empaquetar_grupo(grupo, callback_bytes, algoritmo_hash, sincronizador.por_archivo)
         
-        except Exception as e:
-            print(f"Error al copiar {ruta}: {e}")
+        def grupo_completado(completadas, total, grupo, resultado, error):
+            # El contenedor cambia de nombre si se ha compactado al añadir el grupo
+            ruta_contenedor = resultado[0] if error is None else rutas_paquete(grupo[2])[0]
+            for ruta_escrita in (ruta_contenedor, rutas_paquete(grupo[2])[1]):
+                sincronizador.archivo_terminado(ruta_escrita, error is None)
+            if error is not None:
+                print(f"Error al empaquetar la carpeta {grupo[0]}: {error}")
+                completadas = contar_completadas(len(grupo[1]))
+                if callback_progreso:
+                    callback_progreso(completadas, total_archivos, grupo[0])
+                return
+            for miembro, copiados, hash_origen, error_miembro, posicion in resultado[1]:
+                ruta = miembro[2]
+                completadas = contar_completadas()
+                if error_miembro is not None:
+                    print(f"Error al copiar archivo {miembro[1]}: {error_miembro}")
+                else:
+                    if verificador is not None:
+                        verificador.enviar(ruta, ruta_contenedor, hash_origen, posicion, copiados)
+                    if catalogo is not None:
+                        info_origen = indice_origen.info_archivo(ruta)
+                        catalogo.registrar_archivo(ruta, copiados, info_origen[1] if info_origen else 0, hash_origen)
+                    if diario is not None:
+                        diario.registrar_hecho(ruta, copiados, hash_origen)
+                if callback_progreso:
+                    callback_progreso(completadas, total_archivos, ruta)
+        
+        resultados_paquetes = ejecutar_en_paralelo(grupos, empaquetar, num_hilos,
+                                                   callback_trabajador, grupo_completado, limitador)
+    # Con la política 'end' todo lo escrito se sincroniza aquí, antes de guardar el catálogo
+    sincronizador.finalizar()
+    
+    if verificador is not None:
+        resultado_verificacion = verificador.finalizar()
+        for ruta, esperado, obtenido in resultado_verificacion['fallidos']:
+            print(f"Error de verificación en {ruta}: esperado {esperado}, obtenido {obtenido}")
+        if detalles is not None:
+            detalles['verificacion'] = resultado_verificacion
+    
+    bytes_escritos_total = 0
+    archivos_delta = []
+    guardados = {}
+    omitidos_compresion = 0
+    for tarea, resultado, error in resultados:
+        if error is None:
+            tamaño, _, bytes_escritos, uso_delta, guardado = resultado
+            bytes_escritos_total += bytes_escritos
+            if uso_delta:
+                archivos_delta.append((tarea[0], tamaño, bytes_escritos))
+            if guardado:
+                guardados[tarea[0]] = (tamaño, guardado[1])
+            elif opciones['compression'] != 'none' and not uso_delta and tamaño >= opciones['compression_min_size']:
+                omitidos_compresion += 1  # Ya comprimido (extensión o entropía alta)
+            # Registrar archivo copiado
+            elementos_copiados.append((tarea[0], '[ARCHIVO]', tamaño))
+            info_origen = indice_origen.info_archivo(tarea[0])
+            indice_destino.actualizar_archivo(tarea[0], tamaño, info_origen[1] if info_origen else 0)
+    
+    archivos_empaquetados = 0
+    for grupo, resultado, error in resultados_paquetes:
+        if error is not None:
+            continue
+        for miembro, tamaño, _, error_miembro, _ in resultado[1]:
+            if error_miembro is None:
+                archivos_empaquetados += 1
+                bytes_escritos_total += tamaño
+                elementos_copiados.append((miembro[2], '[ARCHIVO]', tamaño))
+                info_origen = indice_origen.info_archivo(miembro[2])
+                indice_destino.actualizar_archivo(miembro[2], tamaño, info_origen[1] if info_origen else 0)
+    
+    if detalles is not None:
+        detalles['bytes_escritos'] = bytes_escritos_total
+        if archivos_delta:
+            detalles['delta'] = archivos_delta
+        if opciones['compression'] != 'none':
+            detalles['compresion'] = {
+                'algoritmo': opciones['compression'],
+                'comprimidos': len(guardados),
+                'omitidos': omitidos_compresion,
+                'bytes_originales': sum(t for t, _ in guardados.values()),
+                'bytes_guardados': sum(g for _, g in guardados.values()),
+                'guardados': {ruta: g for ruta, (_, g) in guardados.items()}
+            }
+        if grupos:
+            detalles['empaquetado'] = {
+                'archivos': archivos_empaquetados,
+                'contenedores': sum(1 for _, _, error in resultados_paquetes if error is None),
+                'umbral': opciones['pack_threshold']
+            }
+    
+    if catalogo is not None:
+        catalogo.guardar()
     
     return elementos_copiados
\ No newline at end of file
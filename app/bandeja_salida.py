@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Bandeja de salida de correo en segundo plano
+
+Cada mensaje pendiente se guarda como un JSON en la carpeta de la bandeja, de modo que
+los envíos que fallan (o que quedan pendientes al cerrar la aplicación) se reintentan
+más tarde. Un único hilo envía los mensajes pendientes reutilizando la sesión SMTP.
+"""
+
+import os
+import json
+import time
+import uuid
+import zipfile
+import threading
+
+from app.config import DEFAULT_CONFIG
+from app.email_sender import conectar_smtp, crear_mensaje, crear_texto_informe
+
+CARPETA_FALLIDOS = "fallidos"
+
+
+def comprimir_adjuntos(rutas, ruta_zip):
+    """
+    Comprime archivos y carpetas (p. ej. el informe y sus páginas) en un zip.
+
+    Returns:
+        Ruta del zip generado
+    """
+    with zipfile.ZipFile(ruta_zip, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for ruta in rutas:
+            if os.path.isdir(ruta):
+                base = os.path.dirname(os.path.abspath(ruta))
+                for raiz, _, archivos in os.walk(ruta):
+                    for nombre in archivos:
+                        completa = os.path.join(raiz, nombre)
+                        zf.write(completa, os.path.relpath(completa, base))
+            else:
+                zf.write(ruta, os.path.basename(ruta))
+    return ruta_zip
+
+
+class BandejaSalida:
+    """
+    Cola persistente de correos con reintentos y espera exponencial.
+
+    La configuración SMTP (incluida la contraseña) solo se guarda en memoria; en disco
+    únicamente se guardan los mensajes.
+    """
+
+    def __init__(self, configuracion_smtp, carpeta=None, callback_resultado=None, opciones=None):
+        """
+        Args:
+            configuracion_smtp: Diccionario con 'correo', 'password', 'servidor', 'puerto' y,
+                opcionalmente, 'usar_tls', 'autenticar' y 'timeout' (ver conectar_smtp)
+            carpeta: Carpeta donde se guardan los mensajes pendientes
+            callback_resultado: Función que recibe (id_mensaje, exito, mensaje) tras cada
+                envío o intento fallido; se llama desde el hilo de la bandeja
+            opciones: Diccionario con las claves de DEFAULT_CONFIG['email'] a sobrescribir
+        """
+        self.opciones = dict(DEFAULT_CONFIG['email'])
+        if opciones:
+            self.opciones.update(opciones)
+        self.carpeta = carpeta or self.opciones['outbox_dir']
+        self.callback_resultado = callback_resultado
+        self._configuracion = dict(configuracion_smtp)
+        self._cerrojo = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = False
+        self._hilo = None
+        os.makedirs(os.path.join(self.carpeta, CARPETA_FALLIDOS), exist_ok=True)
+
+    def configurar(self, configuracion_smtp):
+        """Actualiza la configuración SMTP (p. ej. si el usuario cambió el servidor)"""
+        with self._cerrojo:
+            self._configuracion = dict(configuracion_smtp)
+        self._despertar.set()
+
+    # --- Cola persistente ---
+
+    def _ruta_mensaje(self, id_mensaje):
+        return os.path.join(self.carpeta, id_mensaje + ".json")
+
+    def _guardar(self, mensaje):
+        ruta = self._ruta_mensaje(mensaje['id'])
+        with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(mensaje, f, ensure_ascii=False)
+        os.replace(ruta + ".tmp", ruta)
+
+    def pendientes(self):
+        """Devuelve los mensajes pendientes ordenados por antigüedad"""
+        mensajes = []
+        for nombre in sorted(os.listdir(self.carpeta)):
+            if not nombre.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.carpeta, nombre), "r", encoding="utf-8") as f:
+                    mensajes.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"No se pudo leer el mensaje {nombre} de la bandeja de salida: {e}")
+        return mensajes
+
+    def encolar(self, destinatario, asunto, cuerpo, adjuntos=()):
+        """
+        Añade un mensaje a la bandeja.
+
+        Returns:
+            Identificador del mensaje
+        """
+        mensaje = {
+            'id': time.strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:8],
+            'destinatario': destinatario,
+            'asunto': asunto,
+            'cuerpo': cuerpo,
+            'adjuntos': [os.path.abspath(ruta) for ruta in adjuntos],
+            'intentos': 0,
+            'proximo_intento': 0,
+            'ultimo_error': None
+        }
+        self._guardar(mensaje)
+        self._despertar.set()
+        return mensaje['id']
+
+    def encolar_informe(self, ruta_informe, destinatario, origen, destino, manifiesto=None):
+        """
+        Añade a la bandeja el correo con el informe de un respaldo. Si el informe tiene
+        páginas o supera el umbral de compresión, se adjunta comprimido en un zip junto
+        con sus páginas y el manifiesto.
+
+        Returns:
+            Identificador del mensaje
+        """
+        asunto, cuerpo = crear_texto_informe(origen, destino, manifiesto)
+        carpeta_paginas = os.path.splitext(ruta_informe)[0] + "_paginas"
+
+        adjuntos = [ruta_informe]
+        if os.path.isdir(carpeta_paginas) or os.path.getsize(ruta_informe) > self.opciones['compress_threshold']:
+            rutas = [ruta_informe]
+            if os.path.isdir(carpeta_paginas):
+                rutas.append(carpeta_paginas)
+            if manifiesto is not None:
+                rutas.append(manifiesto)
+            nombre_zip = os.path.splitext(os.path.basename(ruta_informe))[0] + ".zip"
+            adjuntos = [comprimir_adjuntos(rutas, os.path.join(self.carpeta, nombre_zip))]
+        return self.encolar(destinatario, asunto, cuerpo, adjuntos)
+
+    # --- Envío ---
+
+    def _programar_reintento(self, mensaje, error):
+        mensaje['intentos'] += 1
+        mensaje['ultimo_error'] = str(error)
+        if mensaje['intentos'] >= self.opciones['max_retries']:
+            # Agotados los reintentos: apartar el mensaje para no reintentarlo indefinidamente
+            self._guardar(mensaje)
+            os.replace(self._ruta_mensaje(mensaje['id']),
+                       os.path.join(self.carpeta, CARPETA_FALLIDOS, mensaje['id'] + ".json"))
+            return False
+        espera = min(self.opciones['retry_delay'] * 2 ** (mensaje['intentos'] - 1), self.opciones['retry_max_delay'])
+        mensaje['proximo_intento'] = time.time() + espera
+        self._guardar(mensaje)
+        return True
+
+    def _notificar(self, id_mensaje, exito, texto):
+        if self.callback_resultado:
+            self.callback_resultado(id_mensaje, exito, texto)
+
+    def procesar_pendientes(self):
+        """
+        Envía en una sola sesión SMTP todos los mensajes cuyo intento ya toca.
+
+        Returns:
+            Tupla (enviados, fallidos) con el número de mensajes de esta pasada
+        """
+        ahora = time.time()
+        listos = [m for m in self.pendientes() if m['proximo_intento'] <= ahora]
+        if not listos:
+            return (0, 0)
+
+        with self._cerrojo:
+            configuracion = dict(self._configuracion)
+
+        enviados = 0
+        fallidos = 0
+        try:
+            server = conectar_smtp(configuracion['correo'], configuracion['password'], configuracion['servidor'],
+                                   configuracion['puerto'], configuracion.get('usar_tls', True),
+                                   configuracion.get('autenticar', True),
+                                   configuracion.get('timeout', self.opciones['timeout']))
+        except Exception as e:
+            # Sin conexión: todos los mensajes listos esperan al siguiente intento
+            for mensaje in listos:
+                reintentar = self._programar_reintento(mensaje, e)
+                self._notificar(mensaje['id'], False, f"No se pudo conectar al servidor SMTP: {e}"
+                                + ("" if reintentar else " (sin más reintentos)"))
+            return (0, len(listos))
+
+        try:
+            for mensaje in listos:
+                try:
+                    msg = crear_mensaje(configuracion['correo'], mensaje['destinatario'], mensaje['asunto'],
+                                        mensaje['cuerpo'], mensaje['adjuntos'])
+                    server.send_message(msg)
+                except Exception as e:
+                    fallidos += 1
+                    reintentar = self._programar_reintento(mensaje, e)
+                    self._notificar(mensaje['id'], False, f"No se pudo enviar el correo: {e}"
+                                    + ("" if reintentar else " (sin más reintentos)"))
+                    if isinstance(e, OSError):
+                        break  # La sesión se ha perdido; el resto espera al siguiente intento
+                else:
+                    enviados += 1
+                    os.remove(self._ruta_mensaje(mensaje['id']))
+                    # Los zips generados por la bandeja ya no se necesitan
+                    for ruta in mensaje['adjuntos']:
+                        if os.path.dirname(ruta) == os.path.abspath(self.carpeta) and os.path.exists(ruta):
+                            os.remove(ruta)
+                    self._notificar(mensaje['id'], True, "Correo enviado correctamente")
+        finally:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        return (enviados, fallidos)
+
+    def _bucle(self):
+        while not self._detener:
+            try:
+                self.procesar_pendientes()
+            except Exception as e:
+                print(f"Error en la bandeja de salida: {e}")
+            # Dormir hasta el próximo reintento o hasta que llegue un mensaje nuevo
+            proximos = [m['proximo_intento'] for m in self.pendientes()]
+            espera = max(1.0, min(proximos) - time.time()) if proximos else None
+            self._despertar.wait(espera)
+            self._despertar.clear()
+
+    def iniciar(self):
+        """Arranca el hilo de envío en segundo plano"""
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener = False
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="bandeja_salida")
+            self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo de envío (los mensajes pendientes se conservan en disco)"""
+        self._detener = True
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join()
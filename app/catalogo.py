@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Catálogo persistente (SQLite) del estado del destino
+"""
+
+import os
+import sqlite3
+import threading
+
+from app.indice import IndiceArbol, escanear_arbol
+
+# Nombre del archivo de catálogo que se guarda en la raíz del destino
+NOMBRE_CATALOGO = ".pyrespaldos_catalogo.db"
+
+# Número de registros pendientes antes de confirmar la transacción
+REGISTROS_POR_TRANSACCION = 500
+
+
+class Catalogo:
+    """
+    Catálogo SQLite con la ruta, tamaño, fecha de modificación y hash opcional
+    de todo lo que la aplicación ha escrito en un destino. Permite conocer el
+    estado del destino sin volver a recorrerlo. Para los archivos comprimidos se
+    guarda además el tamaño que ocupan en el destino (tamano es el tamaño original).
+    """
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.ruta = os.path.join(destino, NOMBRE_CATALOGO)
+        self._cerrojo = threading.Lock()
+        self._pendientes = 0
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS entradas ("
+            " ruta TEXT PRIMARY KEY,"
+            " tipo TEXT NOT NULL,"
+            " tamano INTEGER NOT NULL DEFAULT 0,"
+            " mtime REAL NOT NULL DEFAULT 0,"
+            " hash TEXT,"
+            " tamano_guardado INTEGER)"
+        )
+        # Los catálogos anteriores a la compresión no tienen la columna tamano_guardado
+        columnas = [fila[1] for fila in self._conexion.execute("PRAGMA table_info(entradas)")]
+        if "tamano_guardado" not in columnas:
+            self._conexion.execute("ALTER TABLE entradas ADD COLUMN tamano_guardado INTEGER")
+        self._conexion.commit()
+
+    def esta_vacio(self):
+        """Indica si el catálogo todavía no tiene ninguna entrada"""
+        with self._cerrojo:
+            return self._conexion.execute("SELECT 1 FROM entradas LIMIT 1").fetchone() is None
+
+    def info_archivo(self, ruta):
+        """Devuelve (tamaño, mtime) de un archivo catalogado o None si no existe"""
+        with self._cerrojo:
+            fila = self._conexion.execute(
+                "SELECT tamano, mtime FROM entradas WHERE ruta = ? AND tipo = 'archivo'",
+                (os.path.normpath(ruta),)).fetchone()
+        return tuple(fila) if fila else None
+
+    def es_carpeta(self, ruta):
+        """Indica si la ruta está catalogada como carpeta"""
+        with self._cerrojo:
+            fila = self._conexion.execute(
+                "SELECT 1 FROM entradas WHERE ruta = ? AND tipo = 'carpeta'",
+                (os.path.normpath(ruta),)).fetchone()
+        return fila is not None
+
+    def obtener_hash(self, ruta):
+        """Devuelve el hash registrado de un archivo o None"""
+        with self._cerrojo:
+            fila = self._conexion.execute("SELECT hash FROM entradas WHERE ruta = ?",
+                                          (os.path.normpath(ruta),)).fetchone()
+        return fila[0] if fila else None
+
+    def info_comprimido(self, ruta):
+        """Devuelve (tamaño, tamaño_guardado) de un archivo comprimido o None"""
+        with self._cerrojo:
+            fila = self._conexion.execute(
+                "SELECT tamano, tamano_guardado FROM entradas WHERE ruta = ? AND tamano_guardado IS NOT NULL",
+                (os.path.normpath(ruta),)).fetchone()
+        return tuple(fila) if fila else None
+
+    def rutas_comprimidas(self):
+        """Conjunto de rutas de los archivos guardados comprimidos"""
+        with self._cerrojo:
+            filas = self._conexion.execute("SELECT ruta FROM entradas WHERE tamano_guardado IS NOT NULL")
+            return {fila[0] for fila in filas}
+
+    def _confirmar_si_toca(self):
+        self._pendientes += 1
+        if self._pendientes >= REGISTROS_POR_TRANSACCION:
+            self._conexion.commit()
+            self._pendientes = 0
+
+    def registrar_archivo(self, ruta, tamano, mtime, hash_archivo=None, tamano_guardado=None):
+        """Registra (o actualiza) un archivo escrito en el destino; tamano_guardado si se comprimió"""
+        with self._cerrojo:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO entradas (ruta, tipo, tamano, mtime, hash, tamano_guardado)"
+                " VALUES (?, 'archivo', ?, ?, ?, ?)",
+                (os.path.normpath(ruta), tamano, mtime, hash_archivo, tamano_guardado))
+            self._confirmar_si_toca()
+
+    def registrar_carpeta(self, ruta):
+        """Registra una carpeta creada en el destino"""
+        with self._cerrojo:
+            self._conexion.execute(
+                "INSERT OR IGNORE INTO entradas (ruta, tipo) VALUES (?, 'carpeta')",
+                (os.path.normpath(ruta),))
+            self._confirmar_si_toca()
+
+    def importar_indice(self, indice, guardados=None):
+        """
+        Sustituye el contenido del catálogo por el de un índice escaneado del destino.
+        guardados es un diccionario {ruta: tamaño_guardado} de los archivos comprimidos.
+        """
+        with self._cerrojo:
+            self._conexion.execute("DELETE FROM entradas")
+            self._conexion.executemany(
+                "INSERT INTO entradas (ruta, tipo) VALUES (?, 'carpeta')",
+                ((ruta,) for ruta, _, _, _ in indice.carpetas()))
+            self._conexion.executemany(
+                "INSERT INTO entradas (ruta, tipo, tamano, mtime) VALUES (?, 'archivo', ?, ?)",
+                indice.archivos_bajo("."))
+            if guardados:
+                self._conexion.executemany(
+                    "UPDATE entradas SET tamano_guardado = ? WHERE ruta = ?",
+                    ((tamano, os.path.normpath(ruta)) for ruta, tamano in guardados.items()))
+            self._conexion.commit()
+            self._pendientes = 0
+
+    def cargar_indice(self):
+        """Construye un IndiceArbol del destino a partir del catálogo, sin recorrer el disco"""
+        indice = IndiceArbol(self.destino)
+        with self._cerrojo:
+            filas = self._conexion.execute("SELECT ruta, tipo, tamano, mtime FROM entradas ORDER BY ruta")
+            for ruta, tipo, tamano, mtime in filas:
+                if tipo == "carpeta":
+                    indice.registrar_carpeta(ruta)
+                else:
+                    nodo = indice.registrar_carpeta(os.path.dirname(ruta) or ".")
+                    nodo.archivos[os.path.basename(ruta)] = (tamano, mtime)
+                    nodo.tamano_propio += tamano
+        indice.acumular_tamanos()
+        return indice
+
+    def guardar(self):
+        """Confirma los registros pendientes en disco"""
+        with self._cerrojo:
+            self._conexion.commit()
+            self._pendientes = 0
+
+    def cerrar(self):
+        """Guarda los cambios pendientes y cierra el catálogo"""
+        self.guardar()
+        with self._cerrojo:
+            self._conexion.close()
+
+
+def obtener_indice_destino(destino, usar_catalogo=True):
+    """
+    Obtiene el índice del destino desde el catálogo o, si está vacío o desactivado,
+    escaneando el destino una vez y guardando el resultado en el catálogo.
+
+    Args:
+        destino: Ruta de destino
+        usar_catalogo: Si es False se vuelve a escanear el destino y se reconstruye el catálogo
+
+    Returns:
+        Tupla (indice_destino, catalogo)
+    """
+    catalogo = Catalogo(destino)
+    if usar_catalogo and not catalogo.esta_vacio():
+        return (catalogo.cargar_indice(), catalogo)
+
+    indice = escanear_arbol(destino)
+    # El escaneo no entra en los contenedores de archivos pequeños y ve los archivos
+    # comprimidos con su sufijo y el tamaño que ocupan
+    from app.empaquetado import agregar_paquetes_al_indice
+    from app.compresion import agregar_comprimidos_al_indice
+    agregar_paquetes_al_indice(destino, indice)
+    guardados = agregar_comprimidos_al_indice(destino, indice, catalogo)
+    catalogo.importar_indice(indice, guardados)
+    return (indice, catalogo)
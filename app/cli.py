@@ -0,0 +1,631 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Línea de comandos para respaldos sin interfaz gráfica (cron, systemd)
+
+Uso:
+    python -m app respaldar ORIGEN DESTINO [opciones]
+    python -m app respaldar --trabajo trabajo.json
+    python -m app analizar ORIGEN DESTINO
+    python -m app reanudar DESTINO
+    python -m app limitar DESTINO [--bytes 10M] [--archivos 100]
+    python -m app vigilar ORIGEN DESTINO [--retardo 2] [--sondeo]
+    python -m app encolar ORIGEN DESTINO [--nombre NOMBRE] [opciones]
+    python -m app cola listar|ejecutar|limpiar|quitar [--id ID] [--simultaneos 4]
+    python -m app arranque [--presupuesto-ms 300]
+
+Este módulo no importa tkinter ni customtkinter. Los módulos de copia, informe y
+correo se importan solo cuando el subcomando los necesita.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from app.config import DEFAULT_CONFIG, obtener_opciones_backup
+from app.motor_copia import POLITICAS_FSYNC
+from app.compresion import ALGORITMOS_COMPRESION
+from app.limitador import interpretar_tasa, limitar_copia
+
+# Variable de entorno con la contraseña SMTP (nunca se guarda en el archivo de trabajo)
+VARIABLE_PASSWORD = "PYRESPALDOS_SMTP_PASSWORD"
+
+# Módulos que no deben cargarse al arrancar la línea de comandos
+MODULOS_PESADOS = ("tkinter", "customtkinter", "smtplib", "email.mime", "sqlite3")
+
+# Códigos de salida
+SALIDA_OK = 0
+SALIDA_ERROR = 1
+SALIDA_VERIFICACION = 2
+SALIDA_CORREO_PENDIENTE = 3
+
+# Parámetros de la línea de comandos -> clave de DEFAULT_CONFIG['backup']
+OPCIONES_CLI = {
+    'sin_multihilo': ('use_multithreading', False),
+    'sin_verificar': ('verify_copy', False),
+    'sin_catalogo': ('use_catalog', False),
+    'delta': ('delta_transfer', True),
+    'instantaneas': ('snapshot_mode', True),
+    'almacen': ('repository_mode', True),
+    'comprimir_manifiesto': ('manifest_compress', True),
+    'empaquetar': ('pack_small_files', True),
+    'perfilar': ('profile', True),
+    'memoria': ('trace_memory', True)
+}
+
+
+def cargar_trabajo(ruta):
+    """
+    Lee un archivo de trabajo JSON.
+
+    Claves admitidas: 'origen', 'destino', 'elementos' (rutas relativas; por defecto
+    todo el origen), 'opciones' (claves de DEFAULT_CONFIG['backup']) y 'correo'
+    ('destinatario', 'correo', 'servidor', 'puerto', 'usar_tls', 'autenticar' y
+    'variable_password', la variable de entorno con la contraseña).
+
+    Returns:
+        Diccionario con el trabajo
+    """
+    with open(ruta, "r", encoding="utf-8") as f:
+        trabajo = json.load(f)
+    desconocidas = set(trabajo.get('opciones', {})) - set(DEFAULT_CONFIG['backup'])
+    if desconocidas:
+        raise ValueError(f"Opciones desconocidas en {ruta}: {', '.join(sorted(desconocidas))}")
+    return trabajo
+
+
+def combinar_argumentos(trabajo, args):
+    """Aplica sobre el trabajo los valores indicados en la línea de comandos"""
+    trabajo = dict(trabajo)
+    if getattr(args, 'origen', None):
+        trabajo['origen'] = args.origen
+    if args.destino:
+        trabajo['destino'] = args.destino
+    if getattr(args, 'elemento', None):
+        trabajo['elementos'] = args.elemento
+
+    opciones = dict(trabajo.get('opciones', {}))
+    for atributo, (clave, valor) in OPCIONES_CLI.items():
+        if getattr(args, atributo, False):
+            opciones[clave] = valor
+    if getattr(args, 'algoritmo', None):
+        opciones['hash_algorithm'] = args.algoritmo
+    if getattr(args, 'hilos', None):
+        opciones['num_workers'] = args.hilos
+    if getattr(args, 'comprimir', None):
+        opciones['compression'] = args.comprimir
+    if getattr(args, 'fsync', None):
+        opciones['fsync_policy'] = args.fsync
+    if getattr(args, 'limite_bytes', None) is not None:
+        opciones['throttle_bytes_per_sec'] = args.limite_bytes
+    if getattr(args, 'limite_archivos', None) is not None:
+        opciones['throttle_files_per_sec'] = args.limite_archivos
+    if getattr(args, 'horario', None):
+        opciones['throttle_schedule'] = args.horario
+    trabajo['opciones'] = opciones
+
+    destinatario = getattr(args, 'correo_destinatario', None)
+    if destinatario:
+        correo = dict(trabajo.get('correo', {}))
+        correo['destinatario'] = destinatario
+        trabajo['correo'] = correo
+    return trabajo
+
+
+def _configuracion_correo(correo):
+    """Convierte la sección 'correo' del trabajo en la configuración de BandejaSalida"""
+    variable = correo.get('variable_password', VARIABLE_PASSWORD)
+    return {
+        'correo': correo.get('correo', ''),
+        'password': os.environ.get(variable, ''),
+        'servidor': correo.get('servidor', DEFAULT_CONFIG['email']['smtp_server']),
+        'puerto': correo.get('puerto', DEFAULT_CONFIG['email']['smtp_port']),
+        'usar_tls': correo.get('usar_tls', DEFAULT_CONFIG['email']['use_tls']),
+        'autenticar': correo.get('autenticar', DEFAULT_CONFIG['email']['use_login']),
+        'timeout': correo.get('timeout', DEFAULT_CONFIG['email']['timeout'])
+    }
+
+
+def _preparar(trabajo):
+    """Escanea el origen y calcula el plan de copia del trabajo midiendo cada fase"""
+    from app.indice import escanear_arbol
+    from app.rendimiento import Medidor
+    from app.respaldo import seleccion_completa, preparar_destino, planificar_respaldo, contar_archivos
+
+    origen = trabajo.get('origen')
+    destino = trabajo.get('destino')
+    if not origen or not os.path.isdir(origen):
+        raise ValueError(f"La ruta de origen no es válida: {origen}")
+    if not destino or not os.path.isdir(destino):
+        raise ValueError(f"La ruta de destino no es válida: {destino}")
+
+    opciones = obtener_opciones_backup(trabajo.get('opciones'))
+    medidor = Medidor(opciones['profile'], opciones['trace_memory'])
+    with medidor.fase("escaneo") as fase:
+        indice_origen = escanear_arbol(origen)
+        fase['archivos'] = contar_archivos(indice_origen)
+        fase['bytes'] = indice_origen.tamano_total()
+    elementos_seleccionados = trabajo.get('elementos') or seleccion_completa(indice_origen)
+    with medidor.fase("indice_destino"):
+        indice_destino, catalogo, tamaño_destino_antes = preparar_destino(destino, opciones)
+    with medidor.fase("comparacion") as fase:
+        elementos_a_copiar = planificar_respaldo(origen, elementos_seleccionados, indice_origen, indice_destino,
+                                                 opciones)
+        fase['archivos'] = len(elementos_a_copiar)
+    return {
+        'medidor': medidor,
+        'origen': origen,
+        'destino': destino,
+        'opciones': opciones,
+        'indice_origen': indice_origen,
+        'indice_destino': indice_destino,
+        'catalogo': catalogo,
+        'elementos_seleccionados': elementos_seleccionados,
+        'elementos_a_copiar': elementos_a_copiar,
+        'tamaño_destino_antes': tamaño_destino_antes
+    }
+
+
+def _resumen_plan(elementos_a_copiar):
+    from app.utils import convertir_tamano
+    archivos = sum(1 for e in elementos_a_copiar if e[1] == '[ARCHIVO]')
+    carpetas = len(elementos_a_copiar) - archivos
+    tamano = sum(tamano for _, _, tamano in elementos_a_copiar)
+    return f"{archivos} archivos, {carpetas} carpetas, {convertir_tamano(tamano)}"
+
+
+def analizar(trabajo, mostrar_elementos=False):
+    """
+    Muestra el plan de copia del trabajo sin copiar nada.
+
+    Returns:
+        Código de salida
+    """
+    preparado = _preparar(trabajo)
+    preparado['medidor'].detener()
+    if preparado['catalogo'] is not None:
+        preparado['catalogo'].cerrar()
+    print(f"Plan de copia: {_resumen_plan(preparado['elementos_a_copiar'])}")
+    if mostrar_elementos:
+        for ruta, tipo, tamano in preparado['elementos_a_copiar']:
+            print(f"{tipo} {ruta} ({tamano})")
+    return SALIDA_OK
+
+
+def _mostrar_progreso(canal, hilo, intervalo):
+    """Imprime el estado del canal hasta que termine el hilo de copia"""
+    from app.utils import convertir_tamano
+    ultimo = None
+    while hilo.is_alive() or ultimo is None or not ultimo['terminado']:
+        hilo.join(intervalo)
+        estado = canal.instantanea()
+        if estado is None:
+            continue
+        ultimo = estado
+        if estado['fraccion'] is None:
+            print(f"Copiando: {estado['completadas']}/{estado['total_tareas']} archivos, "
+                  f"{convertir_tamano(estado['bytes_hechos'])} de {convertir_tamano(estado['bytes_totales'])}")
+        elif estado['texto']:
+            print(estado['texto'])
+        for error in estado['errores']:
+            print(error, file=sys.stderr)
+    return ultimo
+
+
+def _ejecutar(ejecutar, canal, medidor, trabajo, silencioso, intervalo):
+    """
+    Ejecuta el respaldo en un hilo mostrando el progreso y, si el trabajo tiene la
+    sección 'correo', envía el informe.
+
+    Returns:
+        Código de salida
+    """
+    import threading
+
+    resultado = {}
+
+    def copiar():
+        try:
+            resultado.update(ejecutar())
+        except Exception as e:
+            canal.error(f"Error durante la copia: {e}")
+        finally:
+            canal.finalizar()
+
+    hilo = threading.Thread(target=copiar, daemon=True)
+    hilo.start()
+    if silencioso:
+        hilo.join()
+        estado = canal.instantanea() or {'errores': []}
+        for error in estado['errores']:
+            print(error, file=sys.stderr)
+    else:
+        _mostrar_progreso(canal, hilo, intervalo)
+
+    if not resultado:
+        medidor.detener()
+        return SALIDA_ERROR
+    print(f"Informe guardado en: {resultado['informe']}")
+    print(f"Manifiesto guardado en: {resultado['manifiesto']}")
+
+    codigo = SALIDA_OK
+    if resultado['detalles'].get('verificacion', {}).get('fallidos'):
+        codigo = SALIDA_VERIFICACION
+
+    correo = trabajo.get('correo')
+    if correo and correo.get('destinatario'):
+        from app.bandeja_salida import BandejaSalida
+        bandeja = BandejaSalida(_configuracion_correo(correo))
+        with medidor.fase("correo"):
+            bandeja.encolar_informe(resultado['informe'], correo['destinatario'], trabajo['origen'],
+                                    trabajo['destino'], resultado['manifiesto'])
+            # Una sola pasada: también se envían los correos pendientes de ejecuciones anteriores
+            enviados, fallidos = bandeja.procesar_pendientes()
+        print(f"Correos enviados: {enviados}")
+        if fallidos or bandeja.pendientes():
+            print(f"Correos pendientes en la bandeja de salida: {len(bandeja.pendientes())}", file=sys.stderr)
+            if codigo == SALIDA_OK:
+                codigo = SALIDA_CORREO_PENDIENTE
+        medidor.guardar(resultado['informe'])
+
+    medidor.detener()
+    for fase in medidor.fases:
+        print(f"  {fase['fase']:<16} {fase['segundos']:8.3f} s")
+    print(f"Tiempos guardados en: {resultado['rendimiento']}")
+    return codigo
+
+
+def reanudar(trabajo, silencioso=False, intervalo=1.0, estado=None):
+    """
+    Reanuda la copia interrumpida del destino del trabajo a partir de su diario.
+
+    Returns:
+        Código de salida (ver respaldar)
+    """
+    from app.progreso import CanalProgreso
+    from app.rendimiento import Medidor
+    from app.respaldo import reanudar_respaldo
+    from app.diario import DiarioCopia
+
+    destino = trabajo.get('destino')
+    if estado is None:
+        diario = DiarioCopia(destino or "")
+        estado = diario.cargar() if diario.existe() else None
+        if estado is None:
+            raise ValueError(f"No hay ninguna copia interrumpida que reanudar en {destino}")
+    trabajo = dict(trabajo, origen=estado['origen'])
+    total = sum(1 for e in estado['plan'] if e[1] == '[ARCHIVO]')
+    print(f"Reanudando la copia del {estado['fecha']}: {len(estado['hechos'])} de {total} archivos ya copiados")
+
+    opciones = obtener_opciones_backup(estado['opciones'])
+    medidor = Medidor(opciones['profile'], opciones['trace_memory'])
+    canal = CanalProgreso()
+    return _ejecutar(lambda: reanudar_respaldo(destino, canal, medidor, estado), canal, medidor, trabajo,
+                     silencioso, intervalo)
+
+
+def respaldar(trabajo, silencioso=False, intervalo=1.0, reanudar_interrumpida=True):
+    """
+    Ejecuta un trabajo completo: análisis, comparación, copia, informe y, si el trabajo
+    tiene la sección 'correo', envío del informe. Los correos que no se pueden enviar
+    quedan en la bandeja de salida y se reintentan en la siguiente ejecución. Si una
+    ejecución anterior del mismo origen y destino se interrumpió, se reanuda.
+
+    Returns:
+        Código de salida (SALIDA_OK, SALIDA_ERROR, SALIDA_VERIFICACION o SALIDA_CORREO_PENDIENTE)
+    """
+    from app.progreso import CanalProgreso
+    from app.respaldo import ejecutar_respaldo, copia_interrumpida
+
+    if reanudar_interrumpida and trabajo.get('origen') and trabajo.get('destino'):
+        estado = copia_interrumpida(trabajo['origen'], trabajo['destino'])
+        if estado is not None:
+            # Los cambios posteriores del origen se recogen en la siguiente ejecución
+            return reanudar(trabajo, silencioso, intervalo, estado)
+
+    preparado = _preparar(trabajo)
+    medidor = preparado['medidor']
+    elementos_a_copiar = preparado['elementos_a_copiar']
+    if not elementos_a_copiar:
+        print("No hay elementos nuevos o modificados que necesiten ser copiados")
+        medidor.detener()
+        if preparado['catalogo'] is not None:
+            preparado['catalogo'].cerrar()
+        return SALIDA_OK
+    print(f"Plan de copia: {_resumen_plan(elementos_a_copiar)}")
+
+    canal = CanalProgreso(sum(tamano for _, _, tamano in elementos_a_copiar))
+
+    def ejecutar():
+        try:
+            return ejecutar_respaldo(
+                preparado['origen'], preparado['destino'], preparado['elementos_seleccionados'],
+                elementos_a_copiar, preparado['tamaño_destino_antes'], preparado['opciones'], canal,
+                preparado['indice_origen'], preparado['indice_destino'], preparado['catalogo'], medidor
+            )
+        finally:
+            if preparado['catalogo'] is not None:
+                preparado['catalogo'].cerrar()
+
+    return _ejecutar(ejecutar, canal, medidor, trabajo, silencioso, intervalo)
+
+
+def vigilar(trabajo, retardo, sondeo=False, intervalo=5.0):
+    """
+    Copia continua: vigila el origen del trabajo y copia los cambios por lotes hasta
+    que se pulse Ctrl+C (ver app.vigilancia).
+
+    Returns:
+        Código de salida (SALIDA_VERIFICACION si algún archivo no superó la verificación)
+    """
+    from app.vigilancia import CopiaContinua
+    from app.utils import convertir_tamano
+
+    origen = trabajo.get('origen')
+    destino = trabajo.get('destino')
+    if not origen or not os.path.isdir(origen):
+        raise ValueError(f"La ruta de origen no es válida: {origen}")
+    if not destino or not os.path.isdir(destino):
+        raise ValueError(f"La ruta de destino no es válida: {destino}")
+
+    copia = CopiaContinua(origen, destino, trabajo.get('elementos'), trabajo.get('opciones'))
+    fallidos = []
+
+    def lote(elementos_copiados, detalles):
+        archivos = [e for e in elementos_copiados if e[1] == '[ARCHIVO]']
+        if archivos:
+            print(f"{time.strftime('%H:%M:%S')} Copiados {len(archivos)} archivos "
+                  f"({convertir_tamano(sum(tamano for _, _, tamano in archivos))})")
+        for ruta, esperado, obtenido in detalles.get('verificacion', {}).get('fallidos', []):
+            print(f"Error de verificación en {ruta}: esperado {esperado}, obtenido {obtenido}", file=sys.stderr)
+            fallidos.append(ruta)
+
+    print(f"Vigilando {origen} (Ctrl+C para terminar)")
+    try:
+        copia.ejecutar(callback_lote=lote, retardo=retardo, sondeo=sondeo, intervalo=intervalo)
+    except KeyboardInterrupt:
+        print("Vigilancia detenida")
+    finally:
+        copia.cerrar()
+    return SALIDA_VERIFICACION if fallidos else SALIDA_OK
+
+
+def encolar(trabajo, nombre=None, ruta_cola=None):
+    """Añade el trabajo a la cola persistente (ver app.trabajos)"""
+    from app.trabajos import ColaTrabajos
+
+    origen = trabajo.get('origen')
+    if not origen or not os.path.isdir(origen):
+        raise ValueError(f"La ruta de origen no es válida: {origen}")
+    nuevo = ColaTrabajos(ruta_cola).agregar(trabajo, nombre)
+    print(f"Trabajo {nuevo['id']} añadido a la cola: {nuevo['nombre']}")
+    return SALIDA_OK
+
+
+def cola(accion, ruta_cola=None, id_trabajo=None, max_simultaneos=None, por_dispositivo=None):
+    """
+    Gestiona la cola de trabajos: listar, ejecutar los pendientes (con el informe
+    resumen), limpiar los terminados o quitar uno.
+
+    Returns:
+        Código de salida (al ejecutar: SALIDA_ERROR si algún trabajo falló y
+        SALIDA_VERIFICACION si algún archivo no superó la verificación)
+    """
+    from app.trabajos import ColaTrabajos, ejecutar_cola
+    from app.utils import convertir_tamano
+
+    trabajos = ColaTrabajos(ruta_cola)
+    if accion == "listar":
+        if not trabajos.trabajos:
+            print("La cola está vacía")
+        for trabajo in trabajos.trabajos:
+            print(f"{trabajo['id']}  {trabajo['estado']:<10}  {trabajo['nombre']}  ({trabajo['origen']} -> {trabajo['destino']})")
+        return SALIDA_OK
+    if accion == "limpiar":
+        print(f"Trabajos terminados quitados de la cola: {trabajos.limpiar()}")
+        return SALIDA_OK
+    if accion == "quitar":
+        if not id_trabajo or not trabajos.quitar(id_trabajo):
+            print(f"Error: no hay ningún trabajo {id_trabajo} que se pueda quitar", file=sys.stderr)
+            return SALIDA_ERROR
+        print(f"Trabajo {id_trabajo} quitado de la cola")
+        return SALIDA_OK
+
+    if not trabajos.pendientes():
+        print("No hay trabajos pendientes en la cola")
+        return SALIDA_OK
+
+    def progreso(trabajo, evento):
+        if evento == 'inicio':
+            print(f"Iniciando {trabajo['nombre']}")
+            return
+        resultado = trabajo['resultado']
+        if trabajo['estado'] == 'error':
+            print(f"Error en {trabajo['nombre']}: {resultado['error']}", file=sys.stderr)
+        else:
+            print(f"Terminado {trabajo['nombre']}: {resultado['archivos']} archivos "
+                  f"({convertir_tamano(resultado['bytes'])}) en {resultado['segundos']:.1f} s")
+
+    ejecutados, segundos = ejecutar_cola(trabajos, max_simultaneos, por_dispositivo, progreso)
+    from app.reporte import generar_resumen_trabajos_html
+    print(f"Resumen guardado en: {generar_resumen_trabajos_html(ejecutados, segundos)}")
+    if any(t['estado'] == 'error' for t in ejecutados):
+        return SALIDA_ERROR
+    if any(t['resultado'].get('fallidos') for t in ejecutados):
+        return SALIDA_VERIFICACION
+    return SALIDA_OK
+
+
+def comprobar_arranque(presupuesto_ms, repeticiones=5):
+    """
+    Mide el tiempo de arranque de la línea de comandos en procesos nuevos y comprueba
+    que no se cargan módulos pesados (MODULOS_PESADOS).
+
+    Returns:
+        Código de salida (SALIDA_OK si se cumple el presupuesto)
+    """
+    import subprocess
+    import statistics
+
+    def medir(comando):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            subprocess.run(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tiempos)
+
+    base = medir([sys.executable, "-c", "pass"])
+    total = medir([sys.executable, "-m", "app", "--help"])
+
+    comprobacion = ("import sys, app.cli; app.cli.construir_parser(); "
+                    "print(' '.join(m for m in app.cli.MODULOS_PESADOS if m in sys.modules))")
+    cargados = subprocess.run([sys.executable, "-c", comprobacion], capture_output=True, text=True,
+                              check=True).stdout.split()
+
+    print(f"Arranque del intérprete: {base:.1f} ms")
+    print(f"Arranque de la línea de comandos: {total:.1f} ms (presupuesto {presupuesto_ms} ms)")
+    codigo = SALIDA_OK
+    if cargados:
+        print(f"Módulos pesados cargados al arrancar: {', '.join(cargados)}", file=sys.stderr)
+        codigo = SALIDA_ERROR
+    if total > presupuesto_ms:
+        print("Se ha superado el presupuesto de arranque", file=sys.stderr)
+        codigo = SALIDA_ERROR
+    return codigo
+
+
+def _entero_positivo(texto):
+    """Tipo de argparse para números enteros mayores o iguales que 1"""
+    try:
+        valor = int(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"no es un número entero: {texto}")
+    if valor < 1:
+        raise argparse.ArgumentTypeError(f"debe ser al menos 1: {valor}")
+    return valor
+
+
+def construir_parser():
+    """Crea el analizador de argumentos de la línea de comandos"""
+    parser = argparse.ArgumentParser(prog="python -m app",
+                                     description="Respaldos selectivos sin interfaz gráfica")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    for nombre, ayuda in (("respaldar", "Copia la selección y genera el informe"),
+                          ("analizar", "Muestra el plan de copia sin copiar nada"),
+                          ("vigilar", "Copia continuamente los cambios del origen"),
+                          ("encolar", "Añade un trabajo a la cola (ver 'cola ejecutar')")):
+        sub = subparsers.add_parser(nombre, help=ayuda)
+        sub.add_argument("origen", nargs="?", help="Carpeta de origen")
+        sub.add_argument("destino", nargs="?", help="Carpeta de destino")
+        sub.add_argument("--trabajo", help="Archivo de trabajo JSON (ver cargar_trabajo)")
+        sub.add_argument("--elemento", action="append",
+                         help="Carpeta o archivo a respaldar, relativo al origen (repetible; por defecto todo)")
+        sub.add_argument("--sin-multihilo", action="store_true", help="Copiar los archivos de uno en uno")
+        sub.add_argument("--hilos", type=int, help="Número de hilos de copia")
+        sub.add_argument("--sin-verificar", action="store_true", help="No verificar los archivos copiados")
+        sub.add_argument("--algoritmo", help="Algoritmo de hash para la verificación")
+        sub.add_argument("--sin-catalogo", action="store_true", help="Reescanear el destino")
+        sub.add_argument("--delta", action="store_true", help="Transferencia delta para archivos grandes")
+        sub.add_argument("--instantaneas", action="store_true", help="Crear una instantánea con enlaces duros")
+        sub.add_argument("--almacen", action="store_true", help="Usar el destino como almacén deduplicado")
+        sub.add_argument("--comprimir-manifiesto", action="store_true", help="Guardar el manifiesto como .jsonl.gz")
+        sub.add_argument("--empaquetar", action="store_true",
+                         help="Guardar los archivos pequeños en un contenedor por carpeta")
+        sub.add_argument("--comprimir", choices=ALGORITMOS_COMPRESION,
+                         help="Guardar los archivos comprimidos (gzip, lzma o bz2)")
+        sub.add_argument("--fsync", choices=POLITICAS_FSYNC,
+                         help="Cuándo forzar la escritura en disco (never, file, directory o end)")
+        sub.add_argument("--limite-bytes", type=interpretar_tasa,
+                         help="Máximo de bytes por segundo (admite K, M y G; 0 = sin límite)")
+        sub.add_argument("--limite-archivos", type=interpretar_tasa,
+                         help="Máximo de archivos por segundo (0 = sin límite)")
+        sub.add_argument("--horario", action="append",
+                         help='Franja en la que se aplican los límites, p. ej. "lun-vie 08:00-18:00" (repetible)')
+        sub.add_argument("--perfilar", action="store_true", help="Guardar un perfil de cProfile junto al informe")
+        sub.add_argument("--memoria", action="store_true", help="Medir el pico de memoria de cada fase")
+        if nombre == "respaldar":
+            sub.add_argument("--correo-destinatario",
+                             help=f"Enviar el informe a esta dirección (contraseña en ${VARIABLE_PASSWORD})")
+            sub.add_argument("--silencioso", action="store_true", help="No mostrar el progreso")
+            sub.add_argument("--sin-reanudar", action="store_true",
+                             help="No reanudar una copia interrumpida; analizar de nuevo")
+        elif nombre == "analizar":
+            sub.add_argument("--listar", action="store_true", help="Mostrar cada elemento del plan")
+        elif nombre == "encolar":
+            sub.add_argument("--nombre", help="Nombre del trabajo en la cola y en el resumen")
+            sub.add_argument("--cola", help="Archivo de la cola (por defecto cola_trabajos.json)")
+        else:
+            sub.add_argument("--retardo", type=float, default=2.0,
+                             help="Segundos sin cambios antes de copiar un lote")
+            sub.add_argument("--sondeo", action="store_true",
+                             help="Comparar instantáneas del origen en lugar de usar inotify")
+            sub.add_argument("--intervalo", type=float, default=5.0,
+                             help="Segundos entre instantáneas en el modo de sondeo")
+
+    sub = subparsers.add_parser("reanudar", help="Reanuda la copia interrumpida de un destino")
+    sub.add_argument("destino", help="Carpeta de destino con el diario de la copia")
+    sub.add_argument("--trabajo", help="Archivo de trabajo JSON (para el envío del correo)")
+    sub.add_argument("--correo-destinatario", help="Enviar el informe a esta dirección")
+    sub.add_argument("--silencioso", action="store_true", help="No mostrar el progreso")
+
+    sub = subparsers.add_parser("limitar", help="Cambia los límites de la copia en curso hacia un destino")
+    sub.add_argument("destino", help="Carpeta de destino de la copia")
+    sub.add_argument("--bytes", type=interpretar_tasa, help="Máximo de bytes por segundo (0 = sin límite)")
+    sub.add_argument("--archivos", type=interpretar_tasa, help="Máximo de archivos por segundo (0 = sin límite)")
+
+    sub = subparsers.add_parser("cola", help="Lista, ejecuta o limpia la cola de trabajos")
+    sub.add_argument("accion", choices=("listar", "ejecutar", "limpiar", "quitar"))
+    sub.add_argument("--cola", help="Archivo de la cola (por defecto cola_trabajos.json)")
+    sub.add_argument("--id", help="Trabajo que se quita con 'quitar'")
+    sub.add_argument("--simultaneos", type=_entero_positivo, help="Trabajos simultáneos como máximo")
+    sub.add_argument("--por-dispositivo", type=_entero_positivo, help="Trabajos simultáneos que pueden usar el mismo disco")
+
+    sub = subparsers.add_parser("arranque", help="Comprueba el presupuesto de tiempo de arranque")
+    sub.add_argument("--presupuesto-ms", type=float, default=300.0, help="Tiempo máximo de arranque en ms")
+    sub.add_argument("--repeticiones", type=int, default=5, help="Número de mediciones (se usa la mediana)")
+    return parser
+
+
+def main(argv=None):
+    """Punto de entrada de python -m app"""
+    args = construir_parser().parse_args(argv)
+
+    if args.comando == "arranque":
+        return comprobar_arranque(args.presupuesto_ms, args.repeticiones)
+    if args.comando == "limitar":
+        if args.bytes is None and args.archivos is None:
+            print("Error: indica --bytes, --archivos o ambos", file=sys.stderr)
+            return SALIDA_ERROR
+        try:
+            ruta = limitar_copia(args.destino, args.bytes, args.archivos)
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return SALIDA_ERROR
+        print(f"Límites guardados en {ruta}; la copia en curso los aplicará en un segundo")
+        return SALIDA_OK
+    if args.comando == "cola":
+        try:
+            return cola(args.accion, args.cola, args.id, args.simultaneos, args.por_dispositivo)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return SALIDA_ERROR
+
+    try:
+        trabajo = cargar_trabajo(args.trabajo) if args.trabajo else {}
+        trabajo = combinar_argumentos(trabajo, args)
+        if args.comando == "analizar":
+            return analizar(trabajo, args.listar)
+        if args.comando == "reanudar":
+            return reanudar(trabajo, args.silencioso)
+        if args.comando == "encolar":
+            return encolar(trabajo, args.nombre, args.cola)
+        if args.comando == "vigilar":
+            return vigilar(trabajo, args.retardo, args.sondeo, args.intervalo)
+        return respaldar(trabajo, args.silencioso, reanudar_interrumpida=not args.sin_reanudar)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return SALIDA_ERROR
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Compresión de los archivos al copiarlos
+
+Con la opción 'compression' (gzip, lzma o bz2) cada archivo se guarda comprimido en el
+destino como <nombre>.pyrespaldos.gz (.xz, .bz2), un archivo estándar que se abre con
+gzip, xz o bzip2. Antes de comprimir se calcula la entropía de unas muestras del
+archivo: los que ya están comprimidos (PNG, JPG, MP4, ZIP...) se copian tal cual para no
+gastar CPU en ellos. Los compresores de la biblioteca estándar liberan el GIL, así que
+la compresión se reparte entre los hilos de copia y se solapa con la E/S de los demás.
+
+Uso desde la línea de comandos:
+    python -m app.compresion extraer <archivo|carpeta> <destino>
+"""
+
+import os
+import sys
+import math
+import argparse
+import collections
+
+from app.motor_copia import (TAMANO_BLOQUE, obtener_buffer, preservar_metadatos, ruta_temporal,
+                             sincronizar_archivo, sincronizar_carpeta)
+
+MARCA_COMPRIMIDO = ".pyrespaldos"
+
+# Algoritmo -> extensión del archivo comprimido
+EXTENSIONES_CODEC = {'gzip': '.gz', 'lzma': '.xz', 'bz2': '.bz2'}
+ALGORITMOS_COMPRESION = ('none',) + tuple(EXTENSIONES_CODEC)
+
+# Formatos que ya vienen comprimidos: se copian sin leer ninguna muestra
+EXTENSIONES_COMPRIMIDAS = frozenset((
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.heic', '.mp3', '.m4a', '.ogg', '.flac', '.mp4',
+    '.mkv', '.avi', '.mov', '.webm', '.zip', '.gz', '.tgz', '.xz', '.bz2', '.7z', '.rar', '.zst',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.jar', '.apk'
+))
+
+# Muestras (inicio, mitad y final) para estimar la entropía
+TAMANO_MUESTRA = 16 * 1024
+# Por encima de esta entropía (bits por byte) el archivo no se comprime
+ENTROPIA_MAXIMA = 7.5
+
+
+def sufijo(algoritmo):
+    """Sufijo que se añade al nombre de un archivo comprimido con el algoritmo"""
+    return MARCA_COMPRIMIDO + EXTENSIONES_CODEC[algoritmo]
+
+
+def nombre_original(nombre):
+    """
+    Devuelve (nombre_sin_sufijo, algoritmo) si el nombre es el de un archivo comprimido
+    por la aplicación, o None en caso contrario.
+    """
+    for algoritmo in EXTENSIONES_CODEC:
+        marca = sufijo(algoritmo)
+        if nombre.endswith(marca) and len(nombre) > len(marca):
+            return (nombre[:-len(marca)], algoritmo)
+    return None
+
+
+def abrir_comprimido(ruta, algoritmo):
+    """Abre para lectura un archivo comprimido (ruta u objeto archivo); devuelve un objeto con read/readinto"""
+    if algoritmo == 'gzip':
+        import gzip
+        return gzip.open(ruta, "rb")
+    if algoritmo == 'lzma':
+        import lzma
+        return lzma.open(ruta, "rb")
+    if algoritmo == 'bz2':
+        import bz2
+        return bz2.open(ruta, "rb")
+    raise ValueError(f"Algoritmo de compresión no admitido: {algoritmo}")
+
+
+def _compresor(archivo, algoritmo, nivel=None):
+    if algoritmo == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=archivo, mode="wb", compresslevel=nivel or 6, filename="", mtime=0)
+    if algoritmo == 'lzma':
+        import lzma
+        return lzma.LZMAFile(archivo, "wb", preset=nivel if nivel is not None else 6)
+    if algoritmo == 'bz2':
+        import bz2
+        return bz2.BZ2File(archivo, "wb", compresslevel=nivel or 9)
+    raise ValueError(f"Algoritmo de compresión no admitido: {algoritmo}")
+
+
+def entropia(datos):
+    """Entropía de Shannon de unos datos en bits por byte (0 a 8)"""
+    if not datos:
+        return 0.0
+    total = len(datos)
+    return -sum(n / total * math.log2(n / total) for n in collections.Counter(datos).values())
+
+
+def es_compresible(ruta, tamano):
+    """
+    Indica si merece la pena comprimir un archivo: no por su extensión si es un formato
+    ya comprimido y, si no, por la entropía de tres muestras (inicio, mitad y final).
+    """
+    if os.path.splitext(ruta)[1].lower() in EXTENSIONES_COMPRIMIDAS:
+        return False
+    posiciones = sorted({0, max(0, (tamano - TAMANO_MUESTRA) // 2), max(0, tamano - TAMANO_MUESTRA)})
+    muestra = bytearray()
+    with open(ruta, "rb") as f:
+        for posicion in posiciones:
+            f.seek(posicion)
+            muestra += f.read(TAMANO_MUESTRA)
+    return entropia(bytes(muestra)) < ENTROPIA_MAXIMA
+
+
+def copiar_comprimido(origen, destino, algoritmo, nivel=None, callback_bytes=None, hasher=None, sincronizar=False):
+    """
+    Copia un archivo comprimiéndolo. Se escribe en un temporal que sustituye al archivo
+    comprimido anterior al terminar, y se conservan las fechas del origen.
+
+    Args:
+        origen: Ruta del archivo de origen
+        destino: Ruta del archivo en el destino (sin el sufijo de compresión)
+        algoritmo: Uno de EXTENSIONES_CODEC
+        nivel: Nivel de compresión (None = el predeterminado del algoritmo)
+        callback_bytes: Función que recibe los bytes leídos del origen
+        hasher: Objeto de hashlib que se actualiza con los datos sin comprimir
+        sincronizar: Si es True el archivo se sincroniza con el disco antes de volver
+
+    Returns:
+        Tupla (bytes_leidos, ruta_guardada, tamano_guardado)
+    """
+    ruta_guardada = destino + sufijo(algoritmo)
+    temporal = ruta_temporal(ruta_guardada)
+    buffer = obtener_buffer(TAMANO_BLOQUE)
+    vista = memoryview(buffer)
+    leidos = 0
+    try:
+        with open(origen, "rb", buffering=0) as fsrc, open(temporal, "wb") as fdst:
+            info_origen = os.fstat(fsrc.fileno())
+            with _compresor(fdst, algoritmo, nivel) as compresor:
+                while True:
+                    n = fsrc.readinto(buffer)
+                    if not n:
+                        break
+                    datos = vista[:n]
+                    if hasher is not None:
+                        hasher.update(datos)
+                    compresor.write(datos)
+                    leidos += n
+                    if callback_bytes:
+                        callback_bytes(n)
+        preservar_metadatos(info_origen, temporal)
+        if sincronizar:
+            sincronizar_archivo(temporal)
+        tamano_guardado = os.stat(temporal).st_size
+        os.replace(temporal, ruta_guardada)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    finally:
+        vista.release()
+
+    if sincronizar:
+        sincronizar_carpeta(os.path.dirname(ruta_guardada))
+    return (leidos, ruta_guardada, tamano_guardado)
+
+
+def eliminar_variantes(ruta_destino, conservar):
+    """
+    Elimina las otras versiones de un archivo en el destino (sin comprimir o comprimida con
+    otro algoritmo) para que solo quede la ruta conservar.
+    """
+    for variante in [ruta_destino] + [ruta_destino + sufijo(a) for a in EXTENSIONES_CODEC]:
+        if variante == conservar:
+            continue
+        try:
+            os.remove(variante)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"No se pudo eliminar la versión anterior {variante}: {e}")
+
+
+def tamano_descomprimido(ruta, algoritmo):
+    """Tamaño original de un archivo comprimido (lo descomprime sin guardar nada)"""
+    total = 0
+    buffer = obtener_buffer(TAMANO_BLOQUE)
+    with abrir_comprimido(ruta, algoritmo) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                return total
+            total += n
+
+
+def agregar_comprimidos_al_indice(destino, indice, catalogo=None):
+    """
+    Sustituye en un índice escaneado del destino los archivos comprimidos por su nombre y
+    tamaño originales. El tamaño original se toma del catálogo si el archivo no ha cambiado
+    desde que se registró; si no, se descomprime para medirlo.
+
+    Returns:
+        Diccionario {ruta: tamaño_guardado} de los archivos comprimidos
+    """
+    guardados = {}
+    for ruta, nodo in indice.nodos.items():
+        for nombre in [n for n in nodo.archivos if MARCA_COMPRIMIDO in n]:
+            original = nombre_original(nombre)
+            if original is None:
+                continue
+            nombre_logico, algoritmo = original
+            tamano_guardado, mtime = nodo.archivos.pop(nombre)
+            nodo.tamano_propio -= tamano_guardado
+            if nombre_logico in nodo.archivos:
+                continue  # La copia sin comprimir es la vigente
+            ruta_logica = nombre_logico if ruta == "." else os.path.join(ruta, nombre_logico)
+            previo = catalogo.info_comprimido(ruta_logica) if catalogo is not None else None
+            if previo is not None and previo[1] == tamano_guardado:
+                tamano = previo[0]
+            else:
+                try:
+                    tamano = tamano_descomprimido(os.path.join(destino, ruta, nombre), algoritmo)
+                except (OSError, EOFError, ValueError) as e:
+                    print(f"Error al leer el archivo comprimido {os.path.join(ruta, nombre)}: {e}")
+                    continue
+            nodo.archivos[nombre_logico] = (tamano, mtime)
+            nodo.tamano_propio += tamano
+            guardados[ruta_logica] = tamano_guardado
+    if guardados:
+        indice.acumular_tamanos()
+    return guardados
+
+
+def extraer(ruta, destino):
+    """
+    Descomprime un archivo (o todos los de una carpeta, recursivamente) en destino con
+    su nombre original y su fecha de modificación.
+
+    Returns:
+        Número de archivos extraídos
+    """
+    if os.path.isdir(ruta):
+        extraidos = 0
+        for raiz, _, nombres in os.walk(ruta):
+            carpeta = os.path.join(destino, os.path.relpath(raiz, ruta))
+            for nombre in nombres:
+                if nombre_original(nombre) is not None:
+                    os.makedirs(carpeta, exist_ok=True)
+                    extraidos += extraer(os.path.join(raiz, nombre), carpeta)
+        return extraidos
+
+    original = nombre_original(os.path.basename(ruta))
+    if original is None:
+        raise ValueError(f"{ruta} no es un archivo comprimido por PyRespaldos")
+    nombre_logico, algoritmo = original
+    ruta_destino = os.path.join(destino, nombre_logico)
+    buffer = obtener_buffer(TAMANO_BLOQUE)
+    vista = memoryview(buffer)
+    try:
+        with abrir_comprimido(ruta, algoritmo) as fsrc, open(ruta_destino, "wb") as fdst:
+            while True:
+                n = fsrc.readinto(buffer)
+                if not n:
+                    break
+                fdst.write(vista[:n])
+    finally:
+        vista.release()
+    info = os.stat(ruta)
+    os.utime(ruta_destino, ns=(info.st_atime_ns, info.st_mtime_ns))
+    return 1
+
+
+def main(argumentos=None):
+    """Punto de entrada de la línea de comandos de la compresión"""
+    parser = argparse.ArgumentParser(prog="python -m app.compresion",
+                                     description="Restauración de archivos comprimidos por PyRespaldos")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    extraer_parser = subcomandos.add_parser("extraer", help="Descomprime un archivo o una carpeta")
+    extraer_parser.add_argument("ruta", help="Archivo comprimido o carpeta del destino")
+    extraer_parser.add_argument("destino")
+
+    args = parser.parse_args(argumentos)
+    os.makedirs(args.destino, exist_ok=True)
+    try:
+        extraidos = extraer(args.ruta, args.destino)
+    except (OSError, EOFError, ValueError) as e:
+        print(f"Error al extraer: {e}")
+        return 1
+    print(f"Extraídos {extraidos} archivos en {args.destino}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
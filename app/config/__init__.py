@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Subpaquete de configuración
+"""
+
+# Valores predeterminados de configuración
+DEFAULT_CONFIG = {
+    'email': {
+        'smtp_server': 'smtp.gmail.com',
+        'smtp_port': 587,
+        'use_tls': True,
+        'use_login': True,
+        'timeout': 30,
+        'outbox_dir': 'bandeja_salida',
+        'compress_threshold': 1024 * 1024,  # Informes mayores se adjuntan comprimidos en zip
+        'max_retries': 5,
+        'retry_delay': 30,  # Segundos; se duplica en cada reintento
+        'retry_max_delay': 3600
+    },
+    'backup': {
+        'use_multithreading': True,
+        'num_workers': 8,
+        'use_catalog': True,
+        'snapshot_mode': False,
+        'repository_mode': False,
+        'mtime_tolerance': 2.0,  # Segundos; FAT/exFAT guardan la fecha con resolución de 2 s
+        'delta_transfer': False,
+        'delta_min_size': 16 * 1024 * 1024,
+        'delta_block_size': 64 * 1024,
+        'verify_copy': True,
+        'hash_algorithm': 'blake2b',
+        'verify_workers': 2,
+        'send_email': False,
+        'manifest_compress': False,
+        'pack_small_files': False,  # Archivos pequeños en un contenedor por carpeta (ver empaquetado.py)
+        'pack_threshold': 64 * 1024,
+        'compression': 'none',  # none, gzip, lzma o bz2 (ver compresion.py)
+        'compression_level': None,  # None = nivel predeterminado del algoritmo
+        'compression_min_size': 4096,
+        'fsync_policy': 'end',  # never, file, directory o end (ver motor_copia.POLITICAS_FSYNC)
+        'throttle_bytes_per_sec': 0,  # 0 = sin límite (ver limitador.py)
+        'throttle_files_per_sec': 0,
+        'throttle_schedule': [],  # Franjas en las que se limita, p. ej. "lun-vie 08:00-18:00"; vacía = siempre
+        'profile': False,  # Perfil de cProfile junto al informe (<informe>_perfil.prof)
+        'trace_memory': False  # Pico de memoria de cada fase con tracemalloc
+    },
+    'jobs': {
+        'queue_file': 'cola_trabajos.json',  # Cola persistente de trabajos (ver trabajos.py)
+        'max_concurrent': 4,  # Trabajos simultáneos como máximo
+        'per_device': 1  # Trabajos simultáneos que pueden usar el mismo disco físico
+    },
+    'ui': {
+        'theme': 'system',
+        'color_theme': 'blue'
+    }
+}
+
+def obtener_opciones_backup(opciones=None):
+    """Combina las opciones de respaldo indicadas con los valores predeterminados"""
+    combinadas = dict(DEFAULT_CONFIG['backup'])
+    if opciones:
+        combinadas.update(opciones)
+    return combinadas
\ No newline at end of file
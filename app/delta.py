@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Transferencia delta (estilo rsync) para archivos grandes modificados
+"""
+
+import os
+import zlib
+import hashlib
+
+from app.motor_copia import TAMANO_BLOQUE, obtener_buffer, preservar_metadatos
+
+# Módulo de la suma de comprobación débil (la misma que usa Adler-32)
+_MODULO = 65521
+
+# Tamaño de cada lectura del origen durante la búsqueda de bloques
+_TAMANO_LECTURA = 8 * 1024 * 1024
+
+# Bloques seguidos recorridos byte a byte sin coincidencias antes de pasar a comprobar
+# solo ventanas alineadas, y número de bloques que se comprueban así antes de volver a rodar
+_BLOQUES_RODANDO_MAXIMO = 4
+_BLOQUES_SALTANDO = 16
+
+# Si tras procesar este volumen más de la mitad son datos nuevos, no compensa el modo delta
+_VOLUMEN_EVALUACION = 16 * 1024 * 1024
+_PROPORCION_LITERAL_MAXIMA = 0.5
+
+
+class DeltaNoRentable(Exception):
+    """El archivo ha cambiado tanto que es más barato copiarlo completo"""
+
+
+def _suma_debil(bloque):
+    """Calcula la suma de comprobación débil (Adler-32, rodante) de un bloque"""
+    return zlib.adler32(bloque)
+
+
+def _suma_fuerte(bloque):
+    """Calcula el hash fuerte de un bloque"""
+    return hashlib.blake2b(bloque, digest_size=16).digest()
+
+
+def calcular_firmas(ruta, tamano_bloque):
+    """
+    Calcula las firmas de los bloques completos de un archivo existente.
+
+    Args:
+        ruta: Ruta del archivo (normalmente la copia anterior en el destino)
+        tamano_bloque: Tamaño de cada bloque
+
+    Returns:
+        Tupla (debiles, fuertes): conjunto de sumas débiles y diccionario
+        hash_fuerte -> índice del bloque
+    """
+    debiles = set()
+    fuertes = {}
+    with open(ruta, "rb") as f:
+        indice = 0
+        while True:
+            bloque = f.read(tamano_bloque)
+            if len(bloque) < tamano_bloque:
+                break
+            debiles.add(_suma_debil(bloque))
+            fuertes.setdefault(_suma_fuerte(bloque), indice)
+            indice += 1
+    return debiles, fuertes
+
+
+def calcular_delta(origen, debiles, fuertes, tamano_bloque, callback_bytes=None, hasher=None):
+    """
+    Recorre el origen con una suma rodante buscando bloques que ya existen en el destino.
+
+    Args:
+        origen: Ruta del archivo de origen
+        debiles, fuertes: Firmas del destino (ver calcular_firmas)
+        tamano_bloque: Tamaño de los bloques de las firmas
+        callback_bytes: Función que recibe los bytes del origen procesados
+        hasher: Objeto de hashlib que se actualiza con todo el origen
+
+    Returns:
+        Lista de operaciones ('bloque', indice_destino, offset_origen) y
+        ('literal', offset_origen, longitud)
+
+    Raises:
+        DeltaNoRentable: Si la mayor parte del origen son datos nuevos
+    """
+    operaciones = []
+    datos = bytearray()
+    base = 0              # Offset en el origen del primer byte de datos
+    p = 0                 # Posición de la ventana dentro de datos
+    inicio_literal = 0    # Offset en el origen donde empieza el literal pendiente
+    bytes_literales = 0
+    fin = False
+    rodando = False
+    rodados = 0
+    bloques_sin_coincidencia = 0
+    saltos_pendientes = 0
+    a = b = 0
+
+    def cerrar_literal(hasta):
+        nonlocal bytes_literales
+        if hasta > inicio_literal:
+            operaciones.append(('literal', inicio_literal, hasta - inicio_literal))
+            bytes_literales += hasta - inicio_literal
+
+    def comprobar_rentabilidad(procesados):
+        literales = bytes_literales + (procesados - inicio_literal)
+        if procesados >= _VOLUMEN_EVALUACION and literales > procesados * _PROPORCION_LITERAL_MAXIMA:
+            raise DeltaNoRentable(origen)
+
+    with open(origen, "rb") as f:
+        while True:
+            disponible = len(datos) - p
+            if disponible <= tamano_bloque and not fin:
+                # Descartar lo ya procesado y leer el siguiente tramo del origen
+                if p >= _TAMANO_LECTURA:
+                    del datos[:p]
+                    base += p
+                    p = 0
+                tramo = f.read(_TAMANO_LECTURA)
+                if not tramo:
+                    fin = True
+                else:
+                    datos += tramo
+                    if hasher is not None:
+                        hasher.update(tramo)
+                    if callback_bytes:
+                        callback_bytes(len(tramo))
+                continue
+            if disponible < tamano_bloque:
+                break
+
+            if not rodando:
+                ventana = datos[p:p + tamano_bloque]
+                indice = fuertes.get(_suma_fuerte(ventana))
+                if indice is None:
+                    if saltos_pendientes > 0:
+                        # Zona con muchos cambios: comprobar solo ventanas alineadas
+                        saltos_pendientes -= 1
+                        p += tamano_bloque
+                        comprobar_rentabilidad(base + p)
+                        continue
+                    suma = _suma_debil(ventana)
+                    a, b = suma & 0xFFFF, suma >> 16
+                    rodando = True
+                    rodados = 0
+            else:
+                indice = None
+                if ((b << 16) | a) in debiles:
+                    indice = fuertes.get(_suma_fuerte(datos[p:p + tamano_bloque]))
+
+            if indice is not None:
+                # Bloque encontrado en el destino: cerrar el literal pendiente y saltar el bloque
+                cerrar_literal(base + p)
+                operaciones.append(('bloque', indice, base + p))
+                p += tamano_bloque
+                inicio_literal = base + p
+                rodando = False
+                bloques_sin_coincidencia = 0
+                continue
+
+            if disponible == tamano_bloque:
+                break
+
+            # Desplazar la ventana un byte actualizando la suma rodante
+            sale = datos[p]
+            entra = datos[p + tamano_bloque]
+            a = (a - sale + entra) % _MODULO
+            b = (b - tamano_bloque * sale + a - 1) % _MODULO
+            p += 1
+            rodados += 1
+            if rodados >= tamano_bloque:
+                # Reintentar con una ventana nueva (hash fuerte directo) cada bloque recorrido
+                rodando = False
+                bloques_sin_coincidencia += 1
+                if bloques_sin_coincidencia >= _BLOQUES_RODANDO_MAXIMO:
+                    bloques_sin_coincidencia = 0
+                    saltos_pendientes = _BLOQUES_SALTANDO
+                comprobar_rentabilidad(base + p)
+
+    cerrar_literal(base + len(datos))
+    return operaciones
+
+
+def _copiar_rango(fsrc, fdst, offset, longitud, offset_destino=None):
+    """Copia un rango de fsrc en fdst (en la posición actual o en offset_destino)"""
+    buffer = obtener_buffer(TAMANO_BLOQUE)
+    vista = memoryview(buffer)
+    try:
+        fsrc.seek(offset)
+        if offset_destino is not None:
+            fdst.seek(offset_destino)
+        restante = longitud
+        while restante > 0:
+            leidos = fsrc.readinto(vista[:min(restante, len(buffer))])
+            if not leidos:
+                break
+            fdst.write(vista[:leidos])
+            restante -= leidos
+    finally:
+        vista.release()
+
+
+def aplicar_delta(origen, destino, operaciones, tamano_bloque):
+    """
+    Reconstruye el destino a partir de las operaciones del delta.
+
+    Si todos los bloques reutilizados conservan su posición, solo se reescriben en el
+    propio archivo los rangos modificados. En caso contrario el nuevo contenido se
+    escribe en un archivo temporal que sustituye al destino al terminar.
+
+    Returns:
+        Bytes escritos en el destino
+    """
+    tamano_origen = os.path.getsize(origen)
+    en_sitio = all(op[1] * tamano_bloque == op[2] for op in operaciones if op[0] == 'bloque')
+
+    if en_sitio:
+        bytes_escritos = 0
+        with open(origen, "rb") as fsrc, open(destino, "r+b") as fdst:
+            for op in operaciones:
+                if op[0] == 'literal':
+                    _copiar_rango(fsrc, fdst, op[1], op[2], op[1])
+                    bytes_escritos += op[2]
+            fdst.truncate(tamano_origen)
+        return bytes_escritos
+
+    temporal = os.path.join(os.path.dirname(destino), f".pyrespaldos_delta_{os.path.basename(destino)}.tmp")
+    try:
+        with open(origen, "rb") as fsrc, open(destino, "rb") as fanterior, open(temporal, "wb") as ftmp:
+            for op in operaciones:
+                if op[0] == 'bloque':
+                    _copiar_rango(fanterior, ftmp, op[1] * tamano_bloque, tamano_bloque)
+                else:
+                    _copiar_rango(fsrc, ftmp, op[1], op[2])
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return tamano_origen
+
+
+def actualizar_con_delta(origen, destino, tamano_bloque=64 * 1024, callback_bytes=None, hasher=None,
+                         conservar_metadatos=True):
+    """
+    Actualiza una copia existente reescribiendo solo los bloques que cambiaron.
+
+    Args:
+        origen: Ruta del archivo de origen
+        destino: Ruta de la copia anterior que se va a actualizar
+        tamano_bloque: Tamaño de los bloques comparados
+        callback_bytes: Función que recibe los bytes del origen procesados
+        hasher: Objeto de hashlib que se actualiza con todo el origen
+        conservar_metadatos: Si es True se conservan fechas y permisos del origen
+
+    Returns:
+        Tupla (tamaño_origen, bytes_escritos)
+
+    Raises:
+        DeltaNoRentable: Si conviene copiar el archivo completo
+    """
+    debiles, fuertes = calcular_firmas(destino, tamano_bloque)
+    if not fuertes:
+        raise DeltaNoRentable(origen)
+
+    info_origen = os.stat(origen)
+    operaciones = calcular_delta(origen, debiles, fuertes, tamano_bloque, callback_bytes, hasher)
+    bytes_escritos = aplicar_delta(origen, destino, operaciones, tamano_bloque)
+
+    if conservar_metadatos:
+        preservar_metadatos(info_origen, destino)
+    return (info_origen.st_size, bytes_escritos)
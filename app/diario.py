@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Diario de copia (write-ahead) para reanudar respaldos interrumpidos
+
+Antes de copiar se escribe en el destino el plan completo de la ejecución; después,
+cada archivo terminado añade una línea. Si la copia se interrumpe, la siguiente
+ejecución lee el diario y copia solo lo que faltaba, sin analizar ni comparar de nuevo.
+Los archivos sin línea de terminado (posiblemente escritos a medias) se vuelven a copiar.
+
+Formato (JSON Lines):
+    {"tipo": "inicio", "origen", "destino", "fecha", "elementos", "opciones", "tamano_destino_antes"}
+    {"tipo": "plan", "ruta", "clase", "tamano", "mtime"}      (una por elemento del plan)
+    {"tipo": "plan_completo", "total"}
+    {"tipo": "hecho", "ruta", "tamano", "hash"[, "ruta_guardada", "tamano_guardado"]}
+                                                              (una por archivo copiado; las dos
+                                                              últimas si se guardó comprimido)
+"""
+
+import os
+import json
+import datetime
+import threading
+
+from app.indice import IndiceArbol, PREFIJO_INTERNO
+from app.motor_copia import ruta_temporal
+
+NOMBRE_DIARIO = PREFIJO_INTERNO + "_diario.jsonl"
+
+# Opciones que se guardan en el diario para reanudar con la misma configuración
+OPCIONES_DIARIO = ('use_multithreading', 'num_workers', 'verify_copy', 'hash_algorithm', 'verify_workers',
+                   'delta_transfer', 'delta_min_size', 'delta_block_size', 'mtime_tolerance', 'manifest_compress',
+                   'fsync_policy', 'pack_small_files', 'pack_threshold', 'compression', 'compression_level',
+                   'compression_min_size', 'throttle_bytes_per_sec', 'throttle_files_per_sec',
+                   'throttle_schedule')
+
+
+class DiarioCopia:
+    """Diario de una copia en curso, guardado en la raíz del destino"""
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.ruta = os.path.join(destino, NOMBRE_DIARIO)
+        self._cerrojo = threading.Lock()
+        self._archivo = None
+
+    def existe(self):
+        """Indica si hay una copia interrumpida en el destino"""
+        return os.path.isfile(self.ruta)
+
+    def _escribir(self, registro):
+        self._archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    def _sincronizar(self):
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+
+    def iniciar(self, origen, elementos_seleccionados, plan, indice_origen, opciones, tamaño_destino_antes=0):
+        """
+        Escribe el plan de la ejecución (sustituye cualquier diario anterior).
+
+        Args:
+            origen: Ruta de origen
+            elementos_seleccionados: Selección de la ejecución (rutas relativas)
+            plan: Plan de copia en formato (ruta, tipo, tamaño)
+            indice_origen: IndiceArbol del origen (para guardar la fecha de cada archivo)
+            opciones: Opciones de respaldo de la ejecución
+            tamaño_destino_antes: Tamaño del destino antes de la copia (para el informe)
+        """
+        with self._cerrojo:
+            self._archivo = open(self.ruta, "w", encoding="utf-8")
+            self._escribir({
+                'tipo': 'inicio',
+                'origen': os.path.abspath(origen),
+                'destino': os.path.abspath(self.destino),
+                'fecha': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'elementos': list(elementos_seleccionados),
+                'opciones': {clave: opciones[clave] for clave in OPCIONES_DIARIO if clave in opciones},
+                'tamano_destino_antes': tamaño_destino_antes
+            })
+            for ruta, tipo, tamano in plan:
+                mtime = 0
+                if tipo == '[ARCHIVO]':
+                    info = indice_origen.info_archivo(ruta)
+                    mtime = info[1] if info else 0
+                self._escribir({'tipo': 'plan', 'ruta': ruta,
+                                'clase': 'archivo' if tipo == '[ARCHIVO]' else 'carpeta',
+                                'tamano': tamano, 'mtime': mtime})
+            self._escribir({'tipo': 'plan_completo', 'total': len(plan)})
+            # El plan debe estar en disco antes de empezar a escribir archivos
+            self._sincronizar()
+
+    def continuar(self):
+        """Abre el diario existente para seguir añadiendo archivos terminados"""
+        with self._cerrojo:
+            self._archivo = open(self.ruta, "a", encoding="utf-8")
+
+    def registrar_hecho(self, ruta, tamano, hash_archivo=None, ruta_guardada=None, tamano_guardado=None):
+        """
+        Anota un archivo copiado por completo (seguro entre hilos). Si se guardó comprimido
+        se indica la ruta relativa del archivo comprimido y su tamaño.
+        """
+        registro = {'tipo': 'hecho', 'ruta': ruta, 'tamano': tamano, 'hash': hash_archivo}
+        if ruta_guardada is not None:
+            registro['ruta_guardada'] = ruta_guardada
+            registro['tamano_guardado'] = tamano_guardado
+        with self._cerrojo:
+            if self._archivo is None:
+                return
+            self._escribir(registro)
+            self._archivo.flush()
+
+    def cerrar(self):
+        """Cierra el diario conservándolo en disco (la copia no ha terminado)"""
+        with self._cerrojo:
+            if self._archivo is not None:
+                self._sincronizar()
+                self._archivo.close()
+                self._archivo = None
+
+    def finalizar(self):
+        """Elimina el diario: la ejecución terminó y ya no hay nada que reanudar"""
+        self.cerrar()
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+    def cargar(self):
+        """
+        Lee el diario. Se ignoran las líneas incompletas del final (escritura interrumpida).
+
+        Returns:
+            Diccionario con 'origen', 'destino', 'fecha', 'elementos', 'opciones',
+            'tamano_destino_antes', 'plan' (lista (ruta, tipo, tamaño)), 'mtimes'
+            ({ruta: mtime}) y 'hechos' ({ruta: (tamaño, hash, ruta_guardada, tamaño_guardado)}),
+            o None si el plan no llegó a escribirse completo
+        """
+        estado = None
+        plan_completo = False
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    break
+                tipo = registro.get('tipo')
+                if tipo == 'inicio':
+                    estado = {'origen': registro['origen'], 'destino': registro['destino'],
+                              'fecha': registro['fecha'], 'elementos': registro['elementos'],
+                              'opciones': registro['opciones'],
+                              'tamano_destino_antes': registro.get('tamano_destino_antes', 0),
+                              'plan': [], 'mtimes': {}, 'hechos': {}}
+                elif estado is None:
+                    break
+                elif tipo == 'plan':
+                    clase = '[ARCHIVO]' if registro['clase'] == 'archivo' else '[CARPETA]'
+                    estado['plan'].append((registro['ruta'], clase, registro['tamano']))
+                    estado['mtimes'][registro['ruta']] = registro['mtime']
+                elif tipo == 'plan_completo':
+                    plan_completo = True
+                elif tipo == 'hecho':
+                    estado['hechos'][registro['ruta']] = (registro['tamano'], registro.get('hash'),
+                                                          registro.get('ruta_guardada'),
+                                                          registro.get('tamano_guardado'))
+        return estado if plan_completo else None
+
+
+def pendientes_diario(estado, destino):
+    """
+    Separa el plan del diario en lo que ya está copiado y lo que falta.
+    Un archivo anotado como hecho se vuelve a copiar si su tamaño en el destino no
+    coincide (p. ej. si la escritura no llegó al disco antes de un corte de corriente).
+    Se eliminan los archivos temporales que dejaron a medias los archivos pendientes.
+
+    Returns:
+        Tupla (pendientes, copiados) en formato (ruta, tipo, tamaño); pendientes incluye
+        todas las carpetas del plan (crearlas de nuevo no cuesta nada)
+    """
+    pendientes = []
+    copiados = []
+    paquetes = {}
+    # Temporales de los archivos comprimidos (solo si la copia usaba compresión)
+    sufijos = []
+    if estado['opciones'].get('compression', 'none') != 'none':
+        from app.compresion import sufijo
+        sufijos = [sufijo(estado['opciones']['compression'])]
+    for ruta, tipo, tamano in estado['plan']:
+        if tipo == '[CARPETA]':
+            pendientes.append((ruta, tipo, tamano))
+            continue
+        hecho = estado['hechos'].get(ruta)
+        try:
+            if hecho is not None and hecho[2] is not None:
+                # Guardado comprimido: se comprueba el tamaño del archivo comprimido
+                completo = os.stat(os.path.join(destino, hecho[2])).st_size == hecho[3]
+            else:
+                completo = hecho is not None and os.stat(os.path.join(destino, ruta)).st_size == hecho[0]
+        except OSError:
+            # Los archivos pequeños pudieron guardarse en el contenedor de su carpeta
+            completo = hecho is not None and _tamano_empaquetado(paquetes, destino, ruta) == hecho[0]
+        if completo:
+            copiados.append((ruta, tipo, hecho[0]))
+        else:
+            pendientes.append((ruta, tipo, tamano))
+            ruta_destino = os.path.join(destino, ruta)
+            for temporal in [ruta_temporal(ruta_destino)] + [ruta_temporal(ruta_destino + s) for s in sufijos]:
+                if os.path.exists(temporal):
+                    try:
+                        os.remove(temporal)
+                    except OSError as e:
+                        print(f"No se pudo eliminar el archivo temporal {temporal}: {e}")
+    return (pendientes, copiados)
+
+
+def _tamano_empaquetado(paquetes, destino, ruta):
+    """Tamaño de un archivo guardado en un contenedor (ver empaquetado.py) o None"""
+    carpeta = os.path.join(destino, os.path.dirname(ruta))
+    if carpeta not in paquetes:
+        from app.empaquetado import Paquete
+        paquete = Paquete(carpeta)
+        try:
+            paquetes[carpeta] = paquete.archivos() if paquete.existe() else {}
+        except (OSError, ValueError):
+            paquetes[carpeta] = {}
+    info = paquetes[carpeta].get(os.path.basename(ruta))
+    return info[1] if info is not None else None
+
+
+def indice_origen_diario(estado):
+    """
+    Reconstruye un índice parcial del origen con los elementos del plan (tamaño y fecha
+    guardados en el diario), suficiente para copiar e informar sin volver a escanear.
+    """
+    indice = IndiceArbol(estado['origen'])
+    indice.registrar_carpeta(".")
+    for ruta, tipo, tamano in estado['plan']:
+        if tipo == '[CARPETA]':
+            indice.registrar_carpeta(ruta)
+        else:
+            nodo = indice.registrar_carpeta(os.path.dirname(ruta) or ".")
+            nodo.archivos[os.path.basename(ruta)] = (tamano, estado['mtimes'].get(ruta, 0))
+            nodo.tamano_propio += tamano
+    indice.acumular_tamanos()
+    return indice
@@ -5,14 +5,45 @@ PyRespaldos - Módulo para envío de correos electrónicos
 """
 
 import os
-import re
 import datetime
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 
-def probar_conexion_smtp(correo, password, servidor, puerto):
+from app.utils import convertir_tamano
+from app.manifiesto import leer_resumen
+
+def conectar_smtp(correo, password, servidor, puerto, usar_tls=True, autenticar=True, timeout=30):
+    """
+    Abre una sesión SMTP lista para enviar mensajes.
+    
+    Args:
+        correo: Dirección de correo
+        password: Contraseña
+        servidor: Servidor SMTP
+        puerto: Puerto del servidor
+        usar_tls: Si es True se negocia STARTTLS
+        autenticar: Si es False no se inicia sesión (servidores locales o de pruebas)
+        timeout: Segundos máximos de espera de cada operación de red
+        
+    Returns:
+        Objeto smtplib.SMTP conectado (el llamador debe cerrarlo con quit())
+    """
+    server = smtplib.SMTP(servidor, int(puerto), timeout=timeout)
+    try:
+        server.ehlo()
+        if usar_tls:
+            server.starttls()
+            server.ehlo()
+        if autenticar:
+            server.login(correo, password)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+def probar_conexion_smtp(correo, password, servidor, puerto, usar_tls=True, autenticar=True, timeout=30):
     """
     Prueba la conexión al servidor SMTP
     
@@ -21,98 +52,66 @@ def probar_conexion_smtp(correo, password, servidor, puerto):
         password: Contraseña
         servidor: Servidor SMTP
         puerto: Puerto del servidor
+        usar_tls, autenticar, timeout: Ver conectar_smtp
         
     Returns:
         Tupla (exito, mensaje)
     """
     try:
         # Intentar conectar al servidor SMTP
-        server = smtplib.SMTP(servidor, int(puerto))
-        server.ehlo()
-        server.starttls()
-        server.login(correo, password)
+        server = conectar_smtp(correo, password, servidor, puerto, usar_tls, autenticar, timeout)
         server.quit()
         
         return (True, "Conexión al servidor SMTP establecida correctamente")
     except Exception as e:
         return (False, f"No se pudo conectar al servidor SMTP: {str(e)}")
 
-def enviar_informe_por_correo(ruta_informe, correo, password, destinatario, servidor, puerto, origen, destino):
+def crear_texto_informe(origen, destino, manifiesto=None):
     """
-    Envía el informe por correo electrónico
+    Genera el asunto y el cuerpo del correo de un respaldo.
     
     Args:
-        ruta_informe: Ruta al archivo de informe HTML
-        correo: Dirección de correo del remitente
-        password: Contraseña
-        destinatario: Correo del destinatario
-        servidor: Servidor SMTP
-        puerto: Puerto del servidor
         origen: Ruta de origen del respaldo
         destino: Ruta de destino del respaldo
+        manifiesto: Ruta del manifiesto de la ejecución del que se leen los totales
         
     Returns:
-        Tupla (exito, mensaje)
+        Tupla (asunto, cuerpo)
     """
-    try:
-        # Obtener estadísticas para el cuerpo del mensaje
-        total_archivos = 0
-        total_carpetas = 0
-        total_tamano = "0 B"
-        
-        # Leer el archivo HTML para extraer estadísticas
-        with open(ruta_informe, 'r', encoding='utf-8') as f:
-            contenido = f.read()
-            # Extraer estadísticas usando búsqueda de texto simple
-            
-            # Buscar totales en el HTML
-            patron_archivos = r'Total de Archivos:</span>\s*(\d+)'
-            patron_carpetas = r'Total de Carpetas:</span>\s*(\d+)'
-            patron_tamano = r'Tamaño Total:</span>\s*([\d\.]+ [KMGT]?B)'
-            
-            match_archivos = re.search(patron_archivos, contenido)
-            match_carpetas = re.search(patron_carpetas, contenido)
-            match_tamano = re.search(patron_tamano, contenido)
-            
-            if match_archivos:
-                total_archivos = match_archivos.group(1)
-            if match_carpetas:
-                total_carpetas = match_carpetas.group(1)
-            if match_tamano:
-                total_tamano = match_tamano.group(1)
-        
-        # Crear mensaje
-        msg = MIMEMultipart()
-        msg['From'] = correo
-        msg['To'] = destinatario
-        msg['Subject'] = f"Informe de Respaldo - {os.path.basename(origen)} - {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"
-        
-        # Cuerpo del mensaje
-        cuerpo = "Se adjunta el informe del respaldo realizado.\n\n"
-        cuerpo += f"Origen: {origen}\n"
-        cuerpo += f"Destino: {destino}\n"
-        cuerpo += f"Fecha: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        cuerpo += f"Resumen del respaldo:\n"
-        cuerpo += f"- Total de archivos: {total_archivos}\n"
-        cuerpo += f"- Total de carpetas: {total_carpetas}\n"
-        cuerpo += f"- Tamaño total: {total_tamano}\n"
-        
-        msg.attach(MIMEText(cuerpo, 'plain'))
-        
-        # Adjuntar informe HTML
-        with open(ruta_informe, "rb") as f:
+    # Obtener estadísticas para el cuerpo del mensaje (solo la línea de resumen del manifiesto)
+    total_archivos = 0
+    total_carpetas = 0
+    total_tamano = 0
+    if manifiesto is not None:
+        resumen = leer_resumen(manifiesto)
+        total_archivos = resumen['total_archivos']
+        total_carpetas = resumen['total_carpetas']
+        total_tamano = resumen['total_tamano']
+    
+    asunto = f"Informe de Respaldo - {os.path.basename(origen)} - {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    
+    # Cuerpo del mensaje
+    cuerpo = "Se adjunta el informe del respaldo realizado.\n\n"
+    cuerpo += f"Origen: {origen}\n"
+    cuerpo += f"Destino: {destino}\n"
+    cuerpo += f"Fecha: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    cuerpo += f"Resumen del respaldo:\n"
+    cuerpo += f"- Total de archivos: {total_archivos}\n"
+    cuerpo += f"- Total de carpetas: {total_carpetas}\n"
+    cuerpo += f"- Tamaño total: {convertir_tamano(total_tamano)}\n"
+    return (asunto, cuerpo)
+
+def crear_mensaje(remitente, destinatario, asunto, cuerpo, adjuntos=()):
+    """Crea un mensaje MIME con cuerpo de texto y los archivos adjuntos indicados"""
+    msg = MIMEMultipart()
+    msg['From'] = remitente
+    msg['To'] = destinatario
+    msg['Subject'] = asunto
+    msg.attach(MIMEText(cuerpo, 'plain'))
+    
+    for ruta in adjuntos:
+        with open(ruta, "rb") as f:
             attachment = MIMEApplication(f.read())
-            attachment.add_header('Content-Disposition', 'attachment', filename=os.path.basename(ruta_informe))
-            msg.attach(attachment)
-        
-        # Conectar y enviar
-        server = smtplib.SMTP(servidor, int(puerto))
-        server.ehlo()
-        server.starttls()
-        server.login(correo, password)
-        server.send_message(msg)
-        server.quit()
-        
-        return (True, "Correo enviado correctamente")
-    except Exception as e:
-        return (False, f"No se pudo enviar el informe por correo: {str(e)}")
\ No newline at end of file
+        attachment.add_header('Content-Disposition', 'attachment', filename=os.path.basename(ruta))
+        msg.attach(attachment)
+    return msg
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Empaquetado de archivos pequeños en contenedores del destino
+
+Copiar miles de archivos pequeños cuesta una creación, una escritura y un cierre por
+archivo, y en destinos SMB o USB ese coste domina la copia. Con la opción
+'pack_small_files' los archivos por debajo de 'pack_threshold' se guardan en un
+contenedor por carpeta del destino; los grandes se siguen copiando como archivos normales:
+    <carpeta>/.pyrespaldos_paquete.tar    Datos (tar estándar, se puede abrir con cualquier herramienta)
+    <carpeta>/.pyrespaldos_paquete.json   Índice: contenedor vigente y posición, tamaño, fecha, hash
+                                          y cabecera de cada archivo
+
+El índice es la referencia: los archivos nuevos se añaden al final del tar y solo
+cuentan cuando se reescribe el índice, así que una copia interrumpida nunca deja el
+índice apuntando a datos incompletos. Si un archivo cambia se añade de nuevo y la versión
+anterior queda como espacio muerto, que se recupera compactando el contenedor. La
+compactación escribe un contenedor nuevo (.pyrespaldos_paquete.<n>.tar) y el cambio se
+hace al sustituir el índice, que pasa a nombrarlo; el contenedor anterior se borra después.
+
+Uso desde la línea de comandos:
+    python -m app.empaquetado listar <carpeta>
+    python -m app.empaquetado extraer <carpeta> <destino> [nombres...]
+"""
+
+import os
+import sys
+import json
+import stat
+import tarfile
+import argparse
+
+from app.indice import PREFIJO_INTERNO
+from app.motor_copia import TAMANO_BLOQUE, sincronizar_carpeta
+from app.verificacion import crear_hash
+
+NOMBRE_PAQUETE = PREFIJO_INTERNO + "_paquete.tar"
+NOMBRE_INDICE_PAQUETE = PREFIJO_INTERNO + "_paquete.json"
+
+# Se compacta el contenedor cuando el espacio muerto supera esta fracción
+FRACCION_COMPACTAR = 0.5
+
+
+def _nombre_contenedor(generacion):
+    """Nombre del contenedor de cada generación (la 0 es el de antes de compactar por primera vez)"""
+    if generacion == 0:
+        return NOMBRE_PAQUETE
+    return f"{PREFIJO_INTERNO}_paquete.{generacion}.tar"
+
+
+def _bloques(tamano):
+    """Bytes que ocupan los datos de un miembro en el tar (múltiplo de 512)"""
+    return -(-tamano // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+class _LectorOrigen:
+    """Archivo de origen que calcula el hash y publica los bytes a medida que tarfile lo lee"""
+
+    def __init__(self, archivo, hasher=None, callback_bytes=None):
+        self._archivo = archivo
+        self._hasher = hasher
+        self._callback_bytes = callback_bytes
+
+    def read(self, tamano=-1):
+        datos = self._archivo.read(tamano)
+        if datos:
+            if self._hasher is not None:
+                self._hasher.update(datos)
+            if self._callback_bytes:
+                self._callback_bytes(len(datos))
+        return datos
+
+
+class Paquete:
+    """Contenedor de los archivos pequeños de una carpeta del destino"""
+
+    def __init__(self, carpeta):
+        """
+        Args:
+            carpeta: Ruta absoluta de la carpeta del destino
+        """
+        self.carpeta = carpeta
+        self.ruta_indice = rutas_paquete(carpeta)[1]
+        self._indice = None
+
+    @property
+    def ruta(self):
+        """Ruta del contenedor al que apunta el índice"""
+        return os.path.join(self.carpeta, _nombre_contenedor(self._cargar().get('generacion', 0)))
+
+    def existe(self):
+        """Indica si la carpeta tiene un contenedor con índice"""
+        return os.path.isfile(self.ruta_indice)
+
+    def _cargar(self):
+        if self._indice is None:
+            if self.existe():
+                with open(self.ruta_indice, "r", encoding="utf-8") as f:
+                    self._indice = json.load(f)
+            else:
+                self._indice = {'version': 1, 'generacion': 0, 'fin': 0, 'archivos': {}}
+        return self._indice
+
+    def archivos(self):
+        """Diccionario {nombre: (posición, tamaño, mtime, hash)} de los archivos del contenedor"""
+        return {nombre: tuple(datos[:4]) for nombre, datos in self._cargar()['archivos'].items()}
+
+    def info(self, nombre):
+        """Devuelve (posición, tamaño, mtime, hash) de un archivo o None si no está"""
+        datos = self._cargar()['archivos'].get(nombre)
+        return tuple(datos[:4]) if datos is not None else None
+
+    def _guardar_indice(self, sincronizar=False):
+        temporal = self.ruta_indice + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self._indice, f, ensure_ascii=False)
+            if sincronizar:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_indice)
+
+    def espacio_muerto(self):
+        """Bytes del tar ocupados por versiones sustituidas o retiradas (aproximado)"""
+        indice = self._cargar()
+        vivos = sum(datos[4] + _bloques(datos[1]) for datos in indice['archivos'].values())
+        return max(0, indice['fin'] - vivos)
+
+    def agregar(self, miembros, callback_bytes=None, algoritmo_hash=None, sincronizar=False):
+        """
+        Añade archivos al final del contenedor (los que ya estaban se sustituyen) y guarda
+        el índice. Un archivo de origen que no se puede abrir se omite; un error a mitad de
+        la escritura descarta todo el grupo (el índice anterior sigue siendo válido).
+
+        Args:
+            miembros: Lista de (nombre, ruta_origen)
+            callback_bytes: Función que recibe los bytes leídos
+            algoritmo_hash: Algoritmo para calcular el hash de cada archivo en la misma pasada
+            sincronizar: Si es True el contenedor y su índice se sincronizan con el disco
+
+        Returns:
+            Lista de (nombre, tamaño, hash o None, error o None)
+        """
+        indice = self._cargar()
+        if indice['fin'] and self.espacio_muerto() > indice['fin'] * FRACCION_COMPACTAR:
+            self.compactar(sincronizar)
+
+        resultados = []
+        nuevos = {}
+        with open(self.ruta, "r+b" if os.path.exists(self.ruta) else "wb") as f:
+            f.seek(indice['fin'])
+            with tarfile.open(fileobj=f, mode="w", format=tarfile.GNU_FORMAT) as tar:
+                for nombre, ruta_origen in miembros:
+                    try:
+                        fsrc = open(ruta_origen, "rb")
+                    except OSError as e:
+                        resultados.append((nombre, 0, None, e))
+                        continue
+                    with fsrc:
+                        info_origen = os.fstat(fsrc.fileno())
+                        info = tarfile.TarInfo(nombre)
+                        info.size = info_origen.st_size
+                        info.mtime = int(info_origen.st_mtime)
+                        info.mode = stat.S_IMODE(info_origen.st_mode)
+                        hasher = crear_hash(algoritmo_hash) if algoritmo_hash else None
+                        inicio = tar.offset
+                        tar.addfile(info, _LectorOrigen(fsrc, hasher, callback_bytes))
+                    hash_archivo = hasher.hexdigest() if hasher is not None else None
+                    posicion = tar.offset - _bloques(info.size)
+                    nuevos[nombre] = [posicion, info.size, info_origen.st_mtime, hash_archivo, posicion - inicio]
+                    resultados.append((nombre, info.size, hash_archivo, None))
+                fin = tar.offset
+            f.truncate()
+            if sincronizar:
+                f.flush()
+                os.fsync(f.fileno())
+
+        indice['archivos'].update(nuevos)
+        indice['fin'] = fin
+        self._guardar_indice(sincronizar)
+        if sincronizar:
+            sincronizar_carpeta(self.carpeta)
+        return resultados
+
+    def retirar(self, nombres):
+        """Quita archivos del índice (p. ej. porque ahora se copian sueltos); sus datos quedan como espacio muerto"""
+        indice = self._cargar()
+        retirados = [nombre for nombre in nombres if indice['archivos'].pop(nombre, None) is not None]
+        if retirados:
+            self._guardar_indice()
+        return retirados
+
+    def compactar(self, sincronizar=False):
+        """
+        Reescribe el contenedor solo con las versiones vigentes de cada archivo. Los datos
+        van a un contenedor de la generación siguiente y el índice se sustituye al final,
+        así que tras un corte el índice apunta al contenedor antiguo o al nuevo completo.
+        """
+        indice = self._cargar()
+        anterior = self.ruta
+        generacion = indice.get('generacion', 0) + 1
+        nuevo = os.path.join(self.carpeta, _nombre_contenedor(generacion))
+        compactados = {}
+        with open(anterior, "rb") as fsrc, open(nuevo, "wb") as fdst:
+            with tarfile.open(fileobj=fdst, mode="w", format=tarfile.GNU_FORMAT) as tar:
+                for nombre, datos in sorted(indice['archivos'].items()):
+                    posicion, tamano, mtime, hash_archivo = datos[:4]
+                    fsrc.seek(posicion)
+                    info = tarfile.TarInfo(nombre)
+                    info.size = tamano
+                    info.mtime = int(mtime)
+                    inicio = tar.offset
+                    tar.addfile(info, fsrc)
+                    nueva = tar.offset - _bloques(tamano)
+                    compactados[nombre] = [nueva, tamano, mtime, hash_archivo, nueva - inicio]
+                fin = tar.offset
+            if sincronizar:
+                fdst.flush()
+                os.fsync(fdst.fileno())
+        indice['archivos'] = compactados
+        indice['fin'] = fin
+        indice['generacion'] = generacion
+        self._guardar_indice(sincronizar)
+        if sincronizar:
+            sincronizar_carpeta(self.carpeta)
+        self._borrar_contenedores_antiguos()
+
+    def _borrar_contenedores_antiguos(self):
+        """Borra los contenedores que el índice ya no usa (también los que dejó una compactación cortada)"""
+        vigente = os.path.basename(self.ruta)
+        prefijo = PREFIJO_INTERNO + "_paquete."
+        try:
+            with os.scandir(self.carpeta) as entradas:
+                antiguos = [entrada.path for entrada in entradas
+                            if entrada.name.startswith(prefijo) and entrada.name.endswith(".tar")
+                            and entrada.name != vigente]
+        except OSError as e:
+            print(f"No se pudo revisar la carpeta {self.carpeta}: {e}")
+            return
+        for ruta in antiguos:
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"No se pudo eliminar el contenedor antiguo {ruta}: {e}")
+
+    def leer(self, nombre):
+        """Devuelve el contenido de un archivo del contenedor"""
+        info = self.info(nombre)
+        if info is None:
+            raise KeyError(nombre)
+        with open(self.ruta, "rb") as f:
+            f.seek(info[0])
+            return f.read(info[1])
+
+    def extraer(self, nombre, ruta_destino):
+        """Copia un archivo del contenedor a ruta_destino conservando su fecha de modificación"""
+        info = self.info(nombre)
+        if info is None:
+            raise KeyError(nombre)
+        posicion, tamano, mtime, _ = info
+        with open(self.ruta, "rb") as fsrc, open(ruta_destino, "wb") as fdst:
+            fsrc.seek(posicion)
+            restantes = tamano
+            while restantes > 0:
+                datos = fsrc.read(min(TAMANO_BLOQUE, restantes))
+                if not datos:
+                    raise OSError(f"Contenedor truncado: {self.ruta}")
+                fdst.write(datos)
+                restantes -= len(datos)
+        os.utime(ruta_destino, (mtime, mtime))
+
+
+def rutas_paquete(carpeta):
+    """
+    Rutas iniciales del contenedor y de su índice en una carpeta del destino (tras
+    compactarlo el contenedor cambia de nombre; la ruta vigente es Paquete.ruta)
+    """
+    return (os.path.join(carpeta, NOMBRE_PAQUETE), os.path.join(carpeta, NOMBRE_INDICE_PAQUETE))
+
+
+def separar_pequenos(tareas, umbral, indice_destino=None):
+    """
+    Separa las tareas de copia en archivos sueltos y grupos a empaquetar (uno por carpeta).
+
+    Args:
+        tareas: Tareas en formato (ruta_relativa, ruta_origen, ruta_destino, tamaño)
+        umbral: Tamaño por debajo del cual un archivo se empaqueta
+        indice_destino: Índice del destino, para saber qué archivos ya existían
+
+    Returns:
+        Tupla (sueltas, grupos); cada grupo es una tarea (carpeta_relativa, miembros,
+        carpeta_destino, tamaño_total) con miembros en formato
+        (nombre, ruta_origen, ruta_relativa, tamaño, existia)
+    """
+    sueltas = []
+    por_carpeta = {}
+    for tarea in tareas:
+        ruta, ruta_origen, ruta_destino, tamano = tarea
+        if tamano >= umbral:
+            sueltas.append(tarea)
+            continue
+        existia = indice_destino is not None and indice_destino.info_archivo(ruta) is not None
+        carpeta = os.path.dirname(ruta_destino)
+        grupo = por_carpeta.setdefault(carpeta, (os.path.dirname(ruta) or ".", []))
+        grupo[1].append((os.path.basename(ruta), ruta_origen, ruta, tamano, existia))
+    grupos = [(carpeta_relativa, miembros, carpeta, sum(m[3] for m in miembros))
+              for carpeta, (carpeta_relativa, miembros) in por_carpeta.items()]
+    return (sueltas, grupos)
+
+
+def empaquetar_grupo(grupo, callback_bytes=None, algoritmo_hash=None, sincronizar=False):
+    """
+    Añade un grupo de archivos pequeños al contenedor de su carpeta. Las copias sueltas
+    anteriores de esos archivos se eliminan para que el destino no tenga dos versiones.
+
+    Returns:
+        Tupla (ruta_contenedor, resultados) con resultados en formato
+        (miembro, tamaño, hash o None, error o None, posición en el contenedor)
+    """
+    _, miembros, carpeta, _ = grupo
+    paquete = Paquete(carpeta)
+    resultados = paquete.agregar([(m[0], m[1]) for m in miembros], callback_bytes, algoritmo_hash, sincronizar)
+    por_nombre = {m[0]: m for m in miembros}
+    salida = []
+    for nombre, tamano, hash_archivo, error in resultados:
+        miembro = por_nombre[nombre]
+        posicion = paquete.info(nombre)[0] if error is None else None
+        if error is None and miembro[4]:
+            try:
+                os.remove(os.path.join(carpeta, nombre))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"No se pudo eliminar la copia suelta de {miembro[2]}: {e}")
+        salida.append((miembro, tamano, hash_archivo, error, posicion))
+    return (paquete.ruta, salida)
+
+
+def retirar_empaquetados(destino, rutas):
+    """
+    Quita de los contenedores los archivos que se acaban de copiar sueltos (solo se
+    consulta el índice de las carpetas que tienen contenedor).
+
+    Args:
+        destino: Ruta de destino
+        rutas: Rutas relativas de los archivos copiados sueltos
+    """
+    por_carpeta = {}
+    for ruta in rutas:
+        por_carpeta.setdefault(os.path.dirname(ruta), []).append(os.path.basename(ruta))
+    for carpeta, nombres in por_carpeta.items():
+        paquete = Paquete(os.path.join(destino, carpeta))
+        if paquete.existe():
+            try:
+                paquete.retirar(nombres)
+            except (OSError, ValueError) as e:
+                print(f"Error al actualizar el contenedor de {paquete.carpeta}: {e}")
+
+
+def agregar_paquetes_al_indice(destino, indice):
+    """
+    Incorpora a un índice escaneado del destino los archivos guardados en contenedores
+    (el escaneo no entra en los archivos internos).
+    """
+    agregados = False
+    for ruta, nodo in indice.nodos.items():
+        paquete = Paquete(destino if ruta == "." else os.path.join(destino, ruta))
+        if not paquete.existe():
+            continue
+        try:
+            archivos = paquete.archivos()
+        except (OSError, ValueError) as e:
+            print(f"Error al leer el contenedor de {paquete.carpeta}: {e}")
+            continue
+        for nombre, (_, tamano, mtime, _) in archivos.items():
+            if nombre not in nodo.archivos:
+                nodo.archivos[nombre] = (tamano, mtime)
+                nodo.tamano_propio += tamano
+                agregados = True
+    if agregados:
+        indice.acumular_tamanos()
+    return indice
+
+
+def main(argumentos=None):
+    """Punto de entrada de la línea de comandos del empaquetado"""
+    parser = argparse.ArgumentParser(prog="python -m app.empaquetado",
+                                     description="Consulta y extracción de los contenedores de archivos pequeños")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    listar = subcomandos.add_parser("listar", help="Lista los archivos del contenedor de una carpeta")
+    listar.add_argument("carpeta")
+
+    extraer = subcomandos.add_parser("extraer", help="Extrae archivos del contenedor de una carpeta")
+    extraer.add_argument("carpeta")
+    extraer.add_argument("destino")
+    extraer.add_argument("nombres", nargs="*", help="Archivos a extraer (por defecto todos)")
+
+    args = parser.parse_args(argumentos)
+    paquete = Paquete(args.carpeta)
+    if not paquete.existe():
+        print(f"{args.carpeta} no tiene un contenedor de PyRespaldos")
+        return 1
+
+    archivos = paquete.archivos()
+    if args.comando == "listar":
+        for nombre, (_, tamano, _, _) in sorted(archivos.items()):
+            print(f"{tamano:>12}  {nombre}")
+        return 0
+
+    nombres = args.nombres or sorted(archivos)
+    os.makedirs(args.destino, exist_ok=True)
+    try:
+        for nombre in nombres:
+            paquete.extraer(nombre, os.path.join(args.destino, nombre))
+    except (OSError, KeyError) as e:
+        print(f"Error al extraer: {e}")
+        return 1
+    print(f"Extraídos {len(nombres)} archivos en {args.destino}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
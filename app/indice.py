@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Índice en memoria de un árbol de directorios
+"""
+
+import os
+import time
+
+# Los archivos internos de la aplicación en el destino (catálogo, diarios...) empiezan por este prefijo
+PREFIJO_INTERNO = ".pyrespaldos"
+
+
+class NodoCarpeta:
+    """Carpeta del índice con sus archivos y tamaños acumulados"""
+    __slots__ = ("ruta", "profundidad", "padre", "archivos", "subcarpetas", "tamano_propio", "tamano_total")
+
+    def __init__(self, ruta, profundidad, padre):
+        self.ruta = ruta                # Ruta relativa a la raíz ('.' para la raíz)
+        self.profundidad = profundidad  # 0 para la raíz, 1 para sus hijas...
+        self.padre = padre              # Ruta relativa de la carpeta padre (None en la raíz)
+        self.archivos = {}              # nombre -> (tamaño, mtime)
+        self.subcarpetas = []           # Nombres de las subcarpetas
+        self.tamano_propio = 0          # Suma de los archivos directamente contenidos
+        self.tamano_total = 0           # Suma de todo el subárbol
+
+
+class IndiceArbol:
+    """
+    Índice en memoria de un árbol de directorios. Se construye con una sola pasada
+    de os.scandir (ver escanear_arbol) y responde a las consultas de tamaño,
+    existencia y contenido sin volver a recorrer el disco.
+    """
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+        self.nodos = {}   # ruta relativa -> NodoCarpeta
+        self.orden = []   # Rutas relativas de las carpetas en orden de descubrimiento (preorden)
+
+    def _relativa(self, ruta):
+        """Convierte una ruta absoluta o relativa en la clave usada por el índice"""
+        if os.path.isabs(ruta):
+            ruta = os.path.relpath(ruta, self.raiz)
+        return os.path.normpath(ruta)
+
+    def _agregar_nodo(self, ruta, profundidad, padre):
+        nodo = NodoCarpeta(ruta, profundidad, padre)
+        self.nodos[ruta] = nodo
+        self.orden.append(ruta)
+        return nodo
+
+    def acumular_tamanos(self):
+        """Propaga los tamaños de abajo hacia arriba en tiempo lineal"""
+        for nodo in self.nodos.values():
+            nodo.tamano_total = nodo.tamano_propio
+        # En preorden cada hija aparece después de su padre, así que basta recorrer al revés
+        for ruta in reversed(self.orden):
+            nodo = self.nodos[ruta]
+            if nodo.padre is not None:
+                self.nodos[nodo.padre].tamano_total += nodo.tamano_total
+
+    def es_carpeta(self, ruta):
+        """Indica si la ruta corresponde a una carpeta del índice"""
+        return self._relativa(ruta) in self.nodos
+
+    def info_archivo(self, ruta):
+        """Devuelve (tamaño, mtime) de un archivo del índice o None si no existe"""
+        ruta = self._relativa(ruta)
+        nodo = self.nodos.get(os.path.dirname(ruta) or ".")
+        if nodo is None:
+            return None
+        return nodo.archivos.get(os.path.basename(ruta))
+
+    def existe(self, ruta):
+        """Indica si la ruta existe en el índice como carpeta o como archivo"""
+        return self.es_carpeta(ruta) or self.info_archivo(ruta) is not None
+
+    def tamano_total(self, ruta="."):
+        """Devuelve el tamaño acumulado de una carpeta o de un archivo (0 si no existe)"""
+        ruta = self._relativa(ruta)
+        nodo = self.nodos.get(ruta)
+        if nodo is not None:
+            return nodo.tamano_total
+        info = self.info_archivo(ruta)
+        return info[0] if info else 0
+
+    def carpetas(self):
+        """Genera (ruta_relativa, profundidad, tamano_propio, tamano_total) en preorden, sin la raíz"""
+        for ruta in self.orden:
+            nodo = self.nodos[ruta]
+            if nodo.padre is not None:
+                yield (ruta, nodo.profundidad, nodo.tamano_propio, nodo.tamano_total)
+
+    def carpetas_bajo(self, ruta="."):
+        """Genera las rutas relativas de una carpeta y de todas sus subcarpetas en preorden"""
+        pila = [self._relativa(ruta)]
+        while pila:
+            actual = pila.pop()
+            nodo = self.nodos.get(actual)
+            if nodo is None:
+                continue
+            yield actual
+            for nombre in reversed(nodo.subcarpetas):
+                pila.append(os.path.normpath(os.path.join(actual, nombre)))
+
+    def archivos_bajo(self, ruta="."):
+        """Genera (ruta_relativa, tamaño, mtime) de todos los archivos bajo una carpeta"""
+        for carpeta in self.carpetas_bajo(ruta):
+            for nombre, (tamano, mtime) in self.nodos[carpeta].archivos.items():
+                yield (os.path.normpath(os.path.join(carpeta, nombre)), tamano, mtime)
+
+    def arbol_hasta_nivel(self, nivel_max=2):
+        """
+        Devuelve {ruta_absoluta: tamaño de los archivos directamente contenidos}
+        para las carpetas hasta el nivel indicado (la raíz es el nivel 0).
+        """
+        arbol = {}
+        for ruta in self.orden:
+            nodo = self.nodos[ruta]
+            if nodo.profundidad <= nivel_max:
+                ruta_abs = self.raiz if ruta == "." else os.path.join(self.raiz, ruta)
+                arbol[ruta_abs] = nodo.tamano_propio
+        return arbol
+
+    def registrar_carpeta(self, ruta):
+        """Añade una carpeta (y sus padres) al índice si no existía y devuelve su nodo"""
+        ruta = self._relativa(ruta)
+        nodo = self.nodos.get(ruta)
+        if nodo is not None:
+            return nodo
+        if ruta == ".":
+            return self._agregar_nodo(ruta, 0, None)
+        padre = os.path.dirname(ruta) or "."
+        nodo_padre = self.registrar_carpeta(padre)
+        nodo_padre.subcarpetas.append(os.path.basename(ruta))
+        return self._agregar_nodo(ruta, nodo_padre.profundidad + 1, padre)
+
+    def actualizar_archivo(self, ruta, tamano, mtime):
+        """Registra un archivo escrito o modificado y ajusta los tamaños acumulados"""
+        ruta = self._relativa(ruta)
+        nodo = self.registrar_carpeta(os.path.dirname(ruta) or ".")
+        nombre = os.path.basename(ruta)
+        anterior = nodo.archivos.get(nombre)
+        diferencia = tamano - (anterior[0] if anterior else 0)
+        nodo.archivos[nombre] = (tamano, mtime)
+        nodo.tamano_propio += diferencia
+        while nodo is not None:
+            nodo.tamano_total += diferencia
+            nodo = self.nodos[nodo.padre] if nodo.padre is not None else None
+
+
+def escanear_arbol(raiz, callback_lote=None, tamano_lote=500, intervalo_lote=0.25):
+    """
+    Recorre un árbol de directorios una sola vez con os.scandir y construye su índice.
+
+    Args:
+        raiz: Ruta de la carpeta a escanear
+        callback_lote: Función que recibe cada lote de carpetas descubiertas como
+            lista de (ruta_relativa, profundidad, tamano_propio) y el total descubierto hasta ahora
+        tamano_lote: Número máximo de carpetas por lote
+        intervalo_lote: Segundos máximos entre lotes aunque no se haya llenado
+
+    Returns:
+        IndiceArbol con los archivos, carpetas y tamaños acumulados
+    """
+    indice = IndiceArbol(raiz)
+    pila = [(".", 0, None)]
+    lote = []
+    ultimo_envio = time.monotonic()
+
+    while pila:
+        ruta, profundidad, padre = pila.pop()
+        nodo = indice._agregar_nodo(ruta, profundidad, padre)
+        ruta_abs = raiz if ruta == "." else os.path.join(raiz, ruta)
+
+        try:
+            with os.scandir(ruta_abs) as entradas:
+                for entrada in entradas:
+                    if entrada.name.startswith(PREFIJO_INTERNO):
+                        continue
+                    try:
+                        if entrada.is_dir(follow_symlinks=False):
+                            nodo.subcarpetas.append(entrada.name)
+                        elif entrada.is_file():
+                            info = entrada.stat()
+                            nodo.archivos[entrada.name] = (info.st_size, info.st_mtime)
+                            nodo.tamano_propio += info.st_size
+                    except OSError as e:
+                        print(f"Error al obtener información de {entrada.path}: {e}")
+        except OSError as e:
+            print(f"Error al leer la carpeta {ruta_abs}: {e}")
+
+        # Apilar al revés para visitar las subcarpetas en el orden en que se listaron
+        for nombre in reversed(nodo.subcarpetas):
+            hija = nombre if ruta == "." else os.path.join(ruta, nombre)
+            pila.append((hija, profundidad + 1, ruta))
+
+        # Publicar las carpetas por lotes a medida que se descubren
+        if callback_lote and padre is not None:
+            lote.append((ruta, profundidad, nodo.tamano_propio))
+            if len(lote) >= tamano_lote or time.monotonic() - ultimo_envio >= intervalo_lote:
+                callback_lote(lote, len(indice.orden) - 1)
+                lote = []
+                ultimo_envio = time.monotonic()
+
+    if callback_lote and lote:
+        callback_lote(lote, len(indice.orden) - 1)
+
+    indice.acumular_tamanos()
+    return indice
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Instantáneas versionadas con enlaces duros (estilo link-dest)
+"""
+
+import os
+import re
+import json
+import datetime
+
+from app.config import obtener_opciones_backup
+from app.indice import IndiceArbol, PREFIJO_INTERNO, escanear_arbol
+from app.catalogo import Catalogo, obtener_indice_destino
+from app.plan_copia import planificar_copia, archivo_modificado
+from app.backup import copiar_archivos_manualmente
+
+# Las instantáneas se guardan en carpetas con nombre AAAAMMDD_HHMMSS dentro del destino
+_PATRON_INSTANTANEA = re.compile(r"^\d{8}_\d{6}$")
+
+# Archivo con el resumen de cada instantánea
+NOMBRE_METADATOS = PREFIJO_INTERNO + "_instantanea.json"
+
+
+def listar_instantaneas(destino):
+    """Devuelve los nombres de las instantáneas del destino ordenados de la más antigua a la más reciente"""
+    if not os.path.isdir(destino):
+        return []
+    return sorted(nombre for nombre in os.listdir(destino)
+                  if _PATRON_INSTANTANEA.match(nombre) and os.path.isdir(os.path.join(destino, nombre)))
+
+
+def leer_metadatos(ruta_instantanea):
+    """Lee el resumen de una instantánea o devuelve None si no existe"""
+    try:
+        with open(os.path.join(ruta_instantanea, NOMBRE_METADATOS), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def historial_instantaneas(destino):
+    """Devuelve el resumen de todas las instantáneas del destino que lo tengan"""
+    historial = []
+    for nombre in listar_instantaneas(destino):
+        metadatos = leer_metadatos(os.path.join(destino, nombre))
+        if metadatos:
+            historial.append(metadatos)
+    return historial
+
+
+def indice_ultima_instantanea(destino, usar_catalogo=True):
+    """
+    Obtiene el índice de la instantánea más reciente del destino.
+
+    Returns:
+        Tupla (nombre_instantanea o None, indice). Si no hay instantáneas el índice está vacío.
+    """
+    instantaneas = listar_instantaneas(destino)
+    if not instantaneas:
+        return (None, IndiceArbol(destino))
+    anterior = instantaneas[-1]
+    indice, catalogo = obtener_indice_destino(os.path.join(destino, anterior), usar_catalogo)
+    catalogo.cerrar()
+    return (anterior, indice)
+
+
+def crear_instantanea(origen, destino, elementos_seleccionados, callback_progreso=None, opciones=None,
+                      callback_trabajador=None, indice_origen=None, detalles=None, limitador=None):
+    """
+    Crea una nueva instantánea completa de la selección. Los archivos que no cambiaron
+    desde la instantánea anterior se enlazan (enlace duro) en lugar de copiarse.
+
+    Args:
+        origen: Ruta de origen
+        destino: Carpeta que contiene las instantáneas
+        elementos_seleccionados: Lista de elementos a respaldar
+        callback_progreso: Función para reportar progreso (recibe índice, total, ruta)
+        opciones: Diccionario de opciones de respaldo (ver DEFAULT_CONFIG['backup'])
+        callback_trabajador: Función para reportar progreso por hilo
+        indice_origen: Índice ya escaneado del origen
+        detalles: Diccionario opcional que se rellena con información para el informe
+            (además de las claves de copiar_archivos_manualmente, 'instantanea' e 'instantaneas')
+        limitador: Limitador de bytes y archivos por segundo (ver limitador.py)
+
+    Returns:
+        Tupla (ruta_instantanea, elementos_copiados, indice_instantanea)
+    """
+    opciones = obtener_opciones_backup(opciones)
+    tolerancia = opciones['mtime_tolerance']
+    if indice_origen is None:
+        indice_origen = escanear_arbol(origen)
+
+    anterior, indice_anterior = indice_ultima_instantanea(destino, opciones['use_catalog'])
+    ruta_anterior = os.path.join(destino, anterior) if anterior else None
+    catalogo_anterior = Catalogo(ruta_anterior) if anterior else None
+
+    nombre = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    ruta_instantanea = os.path.join(destino, nombre)
+    os.makedirs(ruta_instantanea, exist_ok=False)
+
+    indice_nuevo = IndiceArbol(ruta_instantanea)
+    indice_nuevo.registrar_carpeta(".")
+    catalogo = Catalogo(ruta_instantanea)
+
+    # Plan completo de la instantánea: los archivos sin cambios se enlazan y el resto se copia
+    plan = []
+    bytes_enlazados = 0
+    archivos_enlazados = 0
+    for ruta, tipo, tamaño in planificar_copia(elementos_seleccionados, indice_origen, indice_nuevo, tolerancia):
+        if tipo == '[ARCHIVO]' and anterior:
+            info_origen = indice_origen.info_archivo(ruta)
+            info_anterior = indice_anterior.info_archivo(ruta)
+            if not archivo_modificado(info_origen, info_anterior, tolerancia):
+                ruta_nueva = os.path.join(ruta_instantanea, ruta)
+                try:
+                    os.makedirs(os.path.dirname(ruta_nueva), exist_ok=True)
+                    os.link(os.path.join(ruta_anterior, ruta), ruta_nueva)
+                except OSError as e:
+                    # Sistemas de archivos sin enlaces duros (FAT, algunos SMB): copiar
+                    print(f"No se pudo enlazar {ruta}, se copiará: {e}")
+                else:
+                    indice_nuevo.actualizar_archivo(ruta, info_anterior[0], info_anterior[1])
+                    catalogo.registrar_archivo(ruta, info_anterior[0], info_anterior[1],
+                                               catalogo_anterior.obtener_hash(ruta))
+                    bytes_enlazados += info_anterior[0]
+                    archivos_enlazados += 1
+                    continue
+        plan.append((ruta, tipo, tamaño))
+
+    if catalogo_anterior is not None:
+        catalogo_anterior.cerrar()
+
+    detalles_copia = {} if detalles is None else detalles
+    try:
+        elementos_copiados = copiar_archivos_manualmente(
+            origen, ruta_instantanea, elementos_seleccionados, callback_progreso, opciones,
+            callback_trabajador, indice_origen, indice_nuevo, catalogo, plan=plan, detalles=detalles_copia,
+            limitador=limitador
+        )
+    finally:
+        catalogo.cerrar()
+
+    # Guardar el resumen de la instantánea para el informe y las siguientes ejecuciones
+    metadatos = {
+        'nombre': nombre,
+        'anterior': anterior,
+        'fecha': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'archivos_copiados': sum(1 for _, tipo, _ in elementos_copiados if tipo == '[ARCHIVO]'),
+        'bytes_copiados': sum(t for _, tipo, t in elementos_copiados if tipo == '[ARCHIVO]'),
+        'bytes_escritos': detalles_copia.get('bytes_escritos', 0),
+        'archivos_enlazados': archivos_enlazados,
+        'bytes_enlazados': bytes_enlazados,
+        'tamano_total': indice_nuevo.tamano_total()
+    }
+    with open(os.path.join(ruta_instantanea, NOMBRE_METADATOS), "w", encoding="utf-8") as f:
+        json.dump(metadatos, f, ensure_ascii=False, indent=2)
+
+    if detalles is not None:
+        detalles['instantanea'] = metadatos
+        detalles['instantaneas'] = historial_instantaneas(destino)
+
+    return (ruta_instantanea, elementos_copiados, indice_nuevo)
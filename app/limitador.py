@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Limitación del ancho de banda y de los archivos por segundo de la copia
+
+Un cubo de fichas para los bytes y otro para los archivos, compartidos por todos los
+hilos de copia (o por el único hilo de la copia secuencial). Cada hilo reserva fichas
+antes de seguir y, si el cubo está en números rojos, duerme lo necesario fuera del
+cerrojo. Los límites se pueden cambiar durante la copia: desde la interfaz, con un
+horario (p. ej. limitado en horario de oficina y sin límite de noche) o, en la línea
+de comandos, con "python -m app limitar <destino>", que deja un archivo de control
+en el destino que la copia en curso relee cada segundo.
+
+Formato del horario (opción 'throttle_schedule'): lista de franjas "HH:MM-HH:MM",
+opcionalmente precedidas por los días ("lun-vie 08:00-18:00", "sab,dom 10:00-14:00").
+Los límites solo se aplican dentro de las franjas; con la lista vacía, siempre.
+"""
+
+import os
+import json
+import time
+import datetime
+import threading
+
+from app.indice import PREFIJO_INTERNO
+
+NOMBRE_CONTROL = PREFIJO_INTERNO + "_limites.json"
+
+DIAS_SEMANA = ('lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom')
+
+# Segundos mínimos entre revisiones del horario y del archivo de control
+INTERVALO_REVISION = 1.0
+
+_MULTIPLICADORES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def interpretar_tasa(texto):
+    """
+    Convierte una tasa como "10M", "512K" o "2000" en un número (0 = sin límite).
+    Los sufijos K, M y G son múltiplos de 1024.
+    """
+    texto = str(texto).strip().upper().rstrip("B/S").rstrip("I")
+    if not texto:
+        return 0
+    multiplicador = _MULTIPLICADORES.get(texto[-1], 1)
+    if texto[-1] in _MULTIPLICADORES:
+        texto = texto[:-1]
+    valor = float(texto) * multiplicador
+    if valor < 0:
+        raise ValueError(f"Tasa negativa: {texto}")
+    return int(valor)
+
+
+def _interpretar_hora(texto):
+    horas, minutos = texto.split(":")
+    return int(horas) * 60 + int(minutos)
+
+
+def interpretar_franja(texto):
+    """
+    Interpreta una franja del horario.
+
+    Returns:
+        Tupla (dias, desde, hasta) con los días (0 = lunes) y las horas en minutos
+    """
+    partes = texto.split()
+    dias = set(range(7))
+    if len(partes) == 2:
+        dias = set()
+        for grupo in partes[0].lower().split(","):
+            if "-" in grupo:
+                inicio, fin = (DIAS_SEMANA.index(d) for d in grupo.split("-"))
+                dias.update(range(inicio, fin + 1) if inicio <= fin else list(range(inicio, 7)) + list(range(fin + 1)))
+            else:
+                dias.add(DIAS_SEMANA.index(grupo))
+    elif len(partes) != 1:
+        raise ValueError(f"Franja no válida: {texto}")
+    desde, hasta = (_interpretar_hora(h) for h in partes[-1].split("-"))
+    return (dias, desde, hasta)
+
+
+def en_franja(franja, momento):
+    """Indica si un datetime cae dentro de una franja (admite franjas que cruzan la medianoche)"""
+    dias, desde, hasta = franja
+    minuto = momento.hour * 60 + momento.minute
+    if desde <= hasta:
+        return momento.weekday() in dias and desde <= minuto < hasta
+    # Franja nocturna: la parte de después de medianoche pertenece al día anterior
+    if minuto >= desde:
+        return momento.weekday() in dias
+    return minuto < hasta and (momento.weekday() - 1) % 7 in dias
+
+
+class CuboFichas:
+    """Cubo de fichas seguro entre hilos: ráfagas de hasta un segundo a la tasa indicada"""
+
+    def __init__(self, tasa=0):
+        self._cerrojo = threading.Lock()
+        self.tasa = 0
+        self._fichas = 0.0
+        self._ultimo = time.monotonic()
+        self.establecer_tasa(tasa)
+
+    def establecer_tasa(self, tasa):
+        """Cambia la tasa (fichas por segundo; 0 = sin límite) sin perder la deuda pendiente"""
+        with self._cerrojo:
+            if tasa == self.tasa:
+                return
+            if self.tasa <= 0:
+                self._fichas = float(tasa)  # Al activar el límite se empieza con el cubo lleno
+            self.tasa = tasa
+            self._fichas = min(self._fichas, float(tasa))
+            self._ultimo = time.monotonic()
+
+    def reservar(self, cantidad):
+        """
+        Reserva fichas (el cubo puede quedar en negativo).
+
+        Returns:
+            Segundos que hay que esperar antes de continuar (0 si hay fichas o no hay límite)
+        """
+        with self._cerrojo:
+            if self.tasa <= 0:
+                return 0.0
+            ahora = time.monotonic()
+            self._fichas = min(float(self.tasa), self._fichas + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+            self._fichas -= cantidad
+            return -self._fichas / self.tasa if self._fichas < 0 else 0.0
+
+
+class Limitador:
+    """Limita los bytes y archivos por segundo de una copia (ver el encabezado del módulo)"""
+
+    def __init__(self, bytes_por_segundo=0, archivos_por_segundo=0, horario=None, ruta_control=None):
+        """
+        Args:
+            bytes_por_segundo: Límite de bytes por segundo (0 = sin límite)
+            archivos_por_segundo: Límite de archivos por segundo (0 = sin límite)
+            horario: Lista de franjas en las que se aplican los límites (vacía = siempre)
+            ruta_control: Archivo de control que se relee durante la copia (ver limitar_copia)
+        """
+        self._cerrojo = threading.Lock()
+        self._bytes = CuboFichas()
+        self._archivos = CuboFichas()
+        self.bytes_por_segundo = bytes_por_segundo
+        self.archivos_por_segundo = archivos_por_segundo
+        self.horario = [interpretar_franja(franja) for franja in horario or []]
+        self.ruta_control = ruta_control
+        # Un archivo de control anterior a la copia no cambia los límites configurados
+        self._mtime_control = self._leer_mtime_control()
+        self._ultima_revision = time.monotonic()
+        self._aplicar()
+
+    def _leer_mtime_control(self):
+        if self.ruta_control is None:
+            return None
+        try:
+            return os.stat(self.ruta_control).st_mtime_ns
+        except OSError:
+            return None
+
+    def en_horario(self, momento=None):
+        """Indica si los límites se aplican en este momento"""
+        if not self.horario:
+            return True
+        momento = momento or datetime.datetime.now()
+        return any(en_franja(franja, momento) for franja in self.horario)
+
+    def _aplicar(self):
+        activo = self.en_horario()
+        self._bytes.establecer_tasa(self.bytes_por_segundo if activo else 0)
+        self._archivos.establecer_tasa(self.archivos_por_segundo if activo else 0)
+
+    def establecer_limites(self, bytes_por_segundo=None, archivos_por_segundo=None):
+        """Cambia los límites durante la copia (None = mantener el actual)"""
+        with self._cerrojo:
+            if bytes_por_segundo is not None:
+                self.bytes_por_segundo = bytes_por_segundo
+            if archivos_por_segundo is not None:
+                self.archivos_por_segundo = archivos_por_segundo
+            self._aplicar()
+
+    def _revisar(self):
+        """Relee el archivo de control y comprueba el horario como mucho una vez por segundo"""
+        ahora = time.monotonic()
+        if ahora - self._ultima_revision < INTERVALO_REVISION:
+            return
+        with self._cerrojo:
+            if ahora - self._ultima_revision < INTERVALO_REVISION:
+                return
+            self._ultima_revision = ahora
+            mtime = self._leer_mtime_control()
+            if mtime is not None and mtime != self._mtime_control:
+                self._mtime_control = mtime
+                try:
+                    with open(self.ruta_control, "r", encoding="utf-8") as f:
+                        control = json.load(f)
+                    self.bytes_por_segundo = int(control.get('bytes_por_segundo', self.bytes_por_segundo))
+                    self.archivos_por_segundo = int(control.get('archivos_por_segundo', self.archivos_por_segundo))
+                except (OSError, ValueError) as e:
+                    print(f"Error al leer el archivo de límites {self.ruta_control}: {e}")
+            self._aplicar()
+
+    def esperar_bytes(self, cantidad):
+        """Registra bytes copiados y duerme si se ha superado el límite"""
+        self._revisar()
+        espera = self._bytes.reservar(cantidad)
+        if espera > 0:
+            time.sleep(espera)
+
+    def esperar_archivo(self):
+        """Registra el comienzo de un archivo y duerme si se ha superado el límite"""
+        self._revisar()
+        espera = self._archivos.reservar(1)
+        if espera > 0:
+            time.sleep(espera)
+
+
+def crear_limitador(opciones, destino=None):
+    """Crea el limitador de una copia a partir de las opciones de respaldo"""
+    return Limitador(opciones['throttle_bytes_per_sec'], opciones['throttle_files_per_sec'],
+                     opciones['throttle_schedule'],
+                     os.path.join(destino, NOMBRE_CONTROL) if destino else None)
+
+
+def limitar_copia(destino, bytes_por_segundo=None, archivos_por_segundo=None):
+    """
+    Cambia los límites de la copia en curso hacia destino escribiendo su archivo de control.
+
+    Returns:
+        Ruta del archivo de control
+    """
+    ruta = os.path.join(destino, NOMBRE_CONTROL)
+    control = {}
+    if bytes_por_segundo is not None:
+        control['bytes_por_segundo'] = bytes_por_segundo
+    if archivos_por_segundo is not None:
+        control['archivos_por_segundo'] = archivos_por_segundo
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(control, f)
+    os.replace(temporal, ruta)
+    return ruta
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Manifiesto de ejecución en JSON Lines (opcionalmente comprimido con gzip)
+
+La primera línea es el resumen de la ejecución ({"tipo": "resumen", ...}) y cada línea
+siguiente describe un elemento copiado ({"tipo": "entrada", "ruta", "clase", "tamano"}),
+de modo que los totales se leen sin recorrer el resto del archivo.
+"""
+
+import os
+import gzip
+import json
+import datetime
+
+from app.utils import reservar_nombre
+
+
+def _abrir(ruta, modo):
+    """Abre el manifiesto en modo texto, comprimido si la ruta termina en .gz"""
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, modo + "t", encoding="utf-8")
+    return open(ruta, modo, encoding="utf-8")
+
+
+def calcular_totales(archivos_copiados):
+    """
+    Calcula los totales de una lista de elementos copiados en una sola pasada.
+
+    Returns:
+        Diccionario con 'total_archivos', 'total_carpetas' y 'total_tamano'
+    """
+    total_archivos = 0
+    total_carpetas = 0
+    total_tamano = 0
+    for _, tipo, tamano in archivos_copiados:
+        if tipo == '[ARCHIVO]':
+            total_archivos += 1
+            total_tamano += tamano
+        else:
+            total_carpetas += 1
+    return {'total_archivos': total_archivos, 'total_carpetas': total_carpetas, 'total_tamano': total_tamano}
+
+
+def escribir_manifiesto(origen, destino, archivos_copiados, tamaño_destino_antes=0, tamaño_destino_despues=0,
+                        detalles=None, comprimir=False):
+    """
+    Escribe el manifiesto de una ejecución en el directorio actual.
+
+    Args:
+        origen: Ruta de origen
+        destino: Ruta de destino
+        archivos_copiados: Lista de elementos copiados en formato (ruta, tipo, tamaño)
+        tamaño_destino_antes: Tamaño del destino antes de la copia
+        tamaño_destino_despues: Tamaño del destino después de la copia
+        detalles: Información adicional de la ejecución (ver copiar_archivos_manualmente)
+        comprimir: Si es True se comprime con gzip (.jsonl.gz)
+
+    Returns:
+        Ruta del manifiesto generado
+    """
+    detalles = detalles or {}
+    nombre_fecha = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+    ruta = reservar_nombre(f"manifiesto_copia_{os.path.basename(origen)}_{nombre_fecha}",
+                           ".jsonl" + (".gz" if comprimir else ""))
+
+    resumen = {
+        'tipo': 'resumen',
+        'origen': origen,
+        'destino': destino,
+        'fecha': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'tamano_destino_antes': tamaño_destino_antes,
+        'tamano_destino_despues': tamaño_destino_despues,
+        'bytes_escritos': detalles.get('bytes_escritos')
+    }
+    resumen.update(calcular_totales(archivos_copiados))
+    verificacion = detalles.get('verificacion')
+    if verificacion:
+        resumen['verificados'] = verificacion['verificados']
+        resumen['verificacion_fallidos'] = len(verificacion['fallidos'])
+    if detalles.get('delta'):
+        resumen['archivos_delta'] = len(detalles['delta'])
+    compresion = detalles.get('compresion')
+    if compresion:
+        resumen['compresion'] = compresion['algoritmo']
+        resumen['archivos_comprimidos'] = compresion['comprimidos']
+        resumen['bytes_guardados_comprimidos'] = compresion['bytes_guardados']
+    guardados = compresion['guardados'] if compresion else {}
+    if detalles.get('empaquetado'):
+        resumen['archivos_empaquetados'] = detalles['empaquetado']['archivos']
+    if detalles.get('instantanea'):
+        resumen['instantanea'] = detalles['instantanea']['nombre']
+    if detalles.get('almacen'):
+        resumen['manifiesto_almacen'] = detalles['almacen']['manifiesto']
+
+    with _abrir(ruta, "w") as f:
+        f.write(json.dumps(resumen, ensure_ascii=False) + "\n")
+        for ruta_elemento, tipo, tamano in archivos_copiados:
+            entrada = {'tipo': 'entrada', 'ruta': ruta_elemento,
+                       'clase': 'archivo' if tipo == '[ARCHIVO]' else 'carpeta', 'tamano': tamano}
+            if ruta_elemento in guardados:
+                entrada['tamano_guardado'] = guardados[ruta_elemento]
+            f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+    return ruta
+
+
+def leer_resumen(ruta):
+    """Lee solo la primera línea del manifiesto (el resumen de la ejecución)"""
+    with _abrir(ruta, "r") as f:
+        return json.loads(f.readline())
+
+
+def leer_entradas(ruta):
+    """
+    Recorre los elementos del manifiesto sin cargarlo completo en memoria.
+
+    Yields:
+        Tuplas (ruta, tipo, tamaño) con tipo '[ARCHIVO]' o '[CARPETA]'
+    """
+    with _abrir(ruta, "r") as f:
+        f.readline()  # Resumen
+        for linea in f:
+            entrada = json.loads(linea)
+            yield (entrada['ruta'], '[ARCHIVO]' if entrada['clase'] == 'archivo' else '[CARPETA]', entrada['tamano'])
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Motor de copia de archivos por bloques
+"""
+
+import os
+import sys
+import stat
+import errno
+import hashlib
+import threading
+
+# Tamaño del bloque usado en cada lectura/escritura (1 MiB)
+TAMANO_BLOQUE = 1024 * 1024
+
+# Errores que indican que la llamada al núcleo no es aplicable a este par de archivos
+_ERRORES_NO_SOPORTADO = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP,
+                         errno.ENOTSUP, errno.EBADF, errno.EPERM}
+
+# Disponibilidad de las llamadas de copia del núcleo (solo Linux)
+_ES_LINUX = sys.platform.startswith("linux")
+_usar_copy_file_range = _ES_LINUX and hasattr(os, "copy_file_range")
+_usar_sendfile = _ES_LINUX and hasattr(os, "sendfile")
+
+# Un búfer reutilizable por hilo para la copia en espacio de usuario
+_local = threading.local()
+
+# Los archivos se escriben con este prefijo y se renombran al terminar (el escaneo los ignora)
+PREFIJO_TEMPORAL = ".pyrespaldos_copia_"
+LONGITUD_MAXIMA_NOMBRE = 255
+
+# Políticas de sincronización con el disco (opción 'fsync_policy'):
+#   never: el sistema operativo decide cuándo escribir (más rápido, menos seguro)
+#   file: cada archivo (y su carpeta) se sincroniza antes de darlo por copiado
+#   directory: se sincronizan juntos los archivos de una carpeta cuando termina la carpeta
+#   end: se sincroniza todo lo escrito al terminar la ejecución
+POLITICAS_FSYNC = ('never', 'file', 'directory', 'end')
+
+
+def obtener_buffer(tamano_bloque):
+    """Devuelve el búfer del hilo actual, creándolo si no existe o cambió de tamaño"""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None or len(buffer) != tamano_bloque:
+        buffer = bytearray(tamano_bloque)
+        _local.buffer = buffer
+    return buffer
+
+
+def _copiar_con_nucleo(fd_origen, fd_destino, tamano_bloque, callback_bytes=None):
+    """
+    Copia usando copy_file_range o sendfile desde la posición actual de ambos descriptores.
+
+    Args:
+        fd_origen: Descriptor del archivo de origen
+        fd_destino: Descriptor del archivo de destino
+        tamano_bloque: Máximo de bytes por llamada
+        callback_bytes: Función que recibe los bytes copiados en cada llamada
+
+    Returns:
+        Tupla (bytes_copiados, completo). Si completo es False, el resto debe
+        copiarse en espacio de usuario a partir de las posiciones actuales.
+    """
+    global _usar_copy_file_range, _usar_sendfile
+    copiados = 0
+
+    if _usar_copy_file_range:
+        try:
+            while True:
+                n = os.copy_file_range(fd_origen, fd_destino, tamano_bloque)
+                if n == 0:
+                    return (copiados, True)
+                copiados += n
+                if callback_bytes:
+                    callback_bytes(n)
+        except OSError as e:
+            if e.errno not in _ERRORES_NO_SOPORTADO:
+                raise
+            if e.errno == errno.ENOSYS:
+                _usar_copy_file_range = False
+
+    if _usar_sendfile:
+        try:
+            while True:
+                n = os.sendfile(fd_destino, fd_origen, None, tamano_bloque)
+                if n == 0:
+                    return (copiados, True)
+                copiados += n
+                if callback_bytes:
+                    callback_bytes(n)
+        except OSError as e:
+            if e.errno not in _ERRORES_NO_SOPORTADO:
+                raise
+            if e.errno == errno.ENOSYS:
+                _usar_sendfile = False
+
+    return (copiados, False)
+
+
+def _copiar_por_bloques(fsrc, fdst, tamano_bloque, callback_bytes=None, hasher=None):
+    """Copia el resto de fsrc en fdst reutilizando un único búfer por hilo"""
+    buffer = obtener_buffer(tamano_bloque)
+    vista = memoryview(buffer)
+    copiados = 0
+    try:
+        while True:
+            leidos = fsrc.readinto(buffer)
+            if not leidos:
+                break
+            escritos = 0
+            while escritos < leidos:
+                escritos += fdst.write(vista[escritos:leidos])
+            if hasher is not None:
+                hasher.update(vista[:leidos])
+            copiados += leidos
+            if callback_bytes:
+                callback_bytes(leidos)
+    finally:
+        vista.release()
+    return copiados
+
+
+def preservar_metadatos(info_origen, destino):
+    """Copia las fechas de acceso/modificación y los permisos del origen al destino"""
+    os.utime(destino, ns=(info_origen.st_atime_ns, info_origen.st_mtime_ns))
+    try:
+        os.chmod(destino, stat.S_IMODE(info_origen.st_mode))
+    except OSError:
+        pass  # Algunos destinos (FAT, SMB) no admiten permisos POSIX
+
+
+def ruta_temporal(destino):
+    """Ruta temporal (en la misma carpeta, para poder renombrarla) donde se escribe un archivo"""
+    nombre = os.path.basename(destino)
+    if len(PREFIJO_TEMPORAL) + len(nombre) + 4 > LONGITUD_MAXIMA_NOMBRE:
+        nombre = hashlib.sha1(nombre.encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(os.path.dirname(destino), PREFIJO_TEMPORAL + nombre + ".tmp")
+
+
+def sincronizar_archivo(ruta):
+    """Fuerza la escritura en disco de los datos y metadatos de un archivo"""
+    # En Windows FlushFileBuffers necesita un descriptor con permiso de escritura
+    fd = os.open(ruta, os.O_RDONLY if os.name == "posix" else os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sincronizar_carpeta(ruta):
+    """Fuerza la escritura en disco de las entradas de una carpeta (renombrados); solo POSIX"""
+    if os.name != "posix":
+        return
+    fd = os.open(ruta or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Sincronizador:
+    """
+    Aplica la política de sincronización (POLITICAS_FSYNC) a los archivos de una copia.
+    Con 'directory' se sincronizan los archivos de una carpeta cuando termina su última
+    tarea; con 'end', todos en finalizar(). Con 'file' la sincronización la hace
+    copiar_archivo y con 'never' no se hace nada.
+    """
+
+    def __init__(self, politica, rutas_destino=()):
+        """
+        Args:
+            politica: Uno de POLITICAS_FSYNC
+            rutas_destino: Rutas de destino de todas las tareas (para saber cuándo
+                termina cada carpeta con la política 'directory')
+        """
+        if politica not in POLITICAS_FSYNC:
+            raise ValueError(f"Política de sincronización desconocida: {politica}")
+        self.politica = politica
+        self._cerrojo = threading.Lock()
+        self._pendientes = {}
+        self._escritos = {}
+        for ruta in rutas_destino:
+            carpeta = os.path.dirname(ruta)
+            self._pendientes[carpeta] = self._pendientes.get(carpeta, 0) + 1
+
+    @property
+    def por_archivo(self):
+        """Indica si cada archivo debe sincronizarse al copiarlo"""
+        return self.politica == 'file'
+
+    def archivo_terminado(self, ruta, escrito=True):
+        """
+        Registra una tarea terminada.
+
+        Args:
+            ruta: Ruta de destino del archivo
+            escrito: False si la copia falló (la tarea cuenta para cerrar la carpeta)
+        """
+        if self.politica in ('never', 'file'):
+            return
+        carpeta = os.path.dirname(ruta)
+        with self._cerrojo:
+            if escrito:
+                self._escritos.setdefault(carpeta, []).append(ruta)
+            self._pendientes[carpeta] = self._pendientes.get(carpeta, 1) - 1
+            archivos = None
+            if self.politica == 'directory' and self._pendientes[carpeta] <= 0:
+                archivos = self._escritos.pop(carpeta, [])
+        if archivos:
+            self._sincronizar(carpeta, archivos)
+
+    def _sincronizar(self, carpeta, archivos):
+        try:
+            for ruta in archivos:
+                sincronizar_archivo(ruta)
+            sincronizar_carpeta(carpeta)
+        except OSError as e:
+            print(f"Error al sincronizar con el disco la carpeta {carpeta}: {e}")
+
+    def finalizar(self):
+        """Sincroniza lo que quede pendiente (todo lo escrito con la política 'end')"""
+        with self._cerrojo:
+            pendientes = self._escritos
+            self._escritos = {}
+        for carpeta, archivos in pendientes.items():
+            self._sincronizar(carpeta, archivos)
+
+
+def copiar_archivo(origen, destino, tamano_bloque=TAMANO_BLOQUE, callback_bytes=None, conservar_metadatos=True,
+                   hasher=None, atomico=True, sincronizar=False):
+    """
+    Copia un archivo por bloques de tamaño fijo sin cargarlo completo en memoria.
+    En Linux delega la copia en el núcleo cuando es posible.
+
+    Args:
+        origen: Ruta del archivo de origen
+        destino: Ruta del archivo de destino (se sobrescribe si existe)
+        tamano_bloque: Tamaño de cada bloque en bytes
+        callback_bytes: Función que recibe los bytes copiados en cada bloque
+        conservar_metadatos: Si es True se conservan fechas y permisos del origen
+        hasher: Objeto de hashlib que se actualiza con los datos leídos en la misma
+            pasada (desactiva la copia en el núcleo, que no pasa por espacio de usuario)
+        atomico: Si es True se escribe en un archivo temporal que sustituye al destino
+            al terminar, de modo que una interrupción nunca deja el destino a medias
+        sincronizar: Si es True el archivo (y su carpeta) se sincronizan con el disco
+            antes de volver
+
+    Returns:
+        Número de bytes copiados
+    """
+    escritura = ruta_temporal(destino) if atomico else destino
+    try:
+        with open(origen, "rb", buffering=0) as fsrc, open(escritura, "wb", buffering=0) as fdst:
+            info_origen = os.fstat(fsrc.fileno())
+            copiados = 0
+            completo = False
+            if hasher is None and (_usar_copy_file_range or _usar_sendfile):
+                copiados, completo = _copiar_con_nucleo(fsrc.fileno(), fdst.fileno(), tamano_bloque, callback_bytes)
+            if not completo:
+                copiados += _copiar_por_bloques(fsrc, fdst, tamano_bloque, callback_bytes, hasher)
+
+        if conservar_metadatos:
+            preservar_metadatos(info_origen, escritura)
+        if sincronizar:
+            sincronizar_archivo(escritura)
+        if atomico:
+            os.replace(escritura, destino)
+    except BaseException:
+        if atomico and os.path.exists(escritura):
+            os.remove(escritura)
+        raise
+
+    if sincronizar:
+        sincronizar_carpeta(os.path.dirname(destino))
+    return copiados
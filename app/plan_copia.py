@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Planificación de la copia a nivel de archivo (comprobación rápida)
+"""
+
+import os
+
+
+def archivo_modificado(info_origen, info_destino, tolerancia_mtime=2.0):
+    """
+    Indica si un archivo debe copiarse comparando tamaño y fecha de modificación.
+
+    Args:
+        info_origen: Tupla (tamaño, mtime) del archivo en el origen
+        info_destino: Tupla (tamaño, mtime) del archivo en el destino o None si no existe
+        tolerancia_mtime: Diferencia máxima en segundos para considerar iguales las fechas
+            (FAT/exFAT guardan la fecha con una resolución de 2 segundos)
+
+    Returns:
+        True si el archivo es nuevo o ha cambiado
+    """
+    if info_destino is None:
+        return True
+    if info_origen[0] != info_destino[0]:
+        return True
+    return abs(info_origen[1] - info_destino[1]) > tolerancia_mtime
+
+
+def planificar_copia(elementos_seleccionados, indice_origen, estado_destino, tolerancia_mtime=2.0):
+    """
+    Genera el plan exacto de copia archivo por archivo para la selección.
+
+    Args:
+        elementos_seleccionados: Lista de carpetas y archivos seleccionados (rutas relativas)
+        indice_origen: IndiceArbol del origen
+        estado_destino: IndiceArbol o Catalogo del destino (cualquier objeto con
+            info_archivo y es_carpeta)
+        tolerancia_mtime: Diferencia máxima en segundos entre fechas de modificación
+
+    Returns:
+        Lista en formato (ruta, tipo, tamaño) con las carpetas que faltan en el destino
+        ('[CARPETA]') y los archivos nuevos o modificados ('[ARCHIVO]')
+    """
+    plan = []
+    vistos = set()
+
+    def agregar_archivo(ruta, info_origen):
+        if ruta in vistos:
+            return
+        vistos.add(ruta)
+        if archivo_modificado(info_origen, estado_destino.info_archivo(ruta), tolerancia_mtime):
+            plan.append((ruta, '[ARCHIVO]', info_origen[0]))
+
+    for elemento in elementos_seleccionados:
+        elemento = os.path.normpath(elemento)
+        if indice_origen.es_carpeta(elemento):
+            for carpeta in indice_origen.carpetas_bajo(elemento):
+                if carpeta not in vistos:
+                    vistos.add(carpeta)
+                    if not estado_destino.es_carpeta(carpeta):
+                        plan.append((carpeta, '[CARPETA]', 0))
+            for ruta, tamano, mtime in indice_origen.archivos_bajo(elemento):
+                agregar_archivo(ruta, (tamano, mtime))
+        else:
+            info_origen = indice_origen.info_archivo(elemento)
+            if info_origen is not None:
+                agregar_archivo(elemento, info_origen)
+
+    return plan
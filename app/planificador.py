@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Planificador de copias en paralelo
+"""
+
+import queue
+import threading
+
+
+def ordenar_tareas(tareas):
+    """
+    Ordena las tareas de mayor a menor tamaño para que los archivos grandes
+    empiecen primero y los pequeños rellenen los huecos de los hilos libres.
+
+    Args:
+        tareas: Lista de tareas en formato (ruta_relativa, ruta_origen, ruta_destino, tamaño)
+
+    Returns:
+        Nueva lista ordenada
+    """
+    return sorted(tareas, key=lambda tarea: tarea[3], reverse=True)
+
+
+def ejecutar_en_paralelo(tareas, funcion, num_hilos=1, callback_trabajador=None, callback_completado=None,
+                         limitador=None):
+    """
+    Ejecuta una función sobre cada tarea usando un grupo de hilos trabajadores.
+
+    Args:
+        tareas: Lista de tareas en formato (ruta_relativa, ruta_origen, ruta_destino, tamaño)
+        funcion: Función que recibe (tarea, callback_bytes) y devuelve un resultado
+        num_hilos: Número de hilos trabajadores (1 = copia secuencial)
+        callback_trabajador: Función para reportar progreso por hilo
+            (recibe id_trabajador, tarea, bytes_hechos)
+        callback_completado: Función para reportar cada tarea terminada
+            (recibe completadas, total, tarea, resultado, error)
+        limitador: Limitador de bytes y archivos por segundo compartido por todos los
+            hilos (ver limitador.py)
+
+    Returns:
+        Lista de tuplas (tarea, resultado, error) en orden de finalización
+    """
+    pendientes = queue.Queue()
+    for tarea in ordenar_tareas(tareas):
+        pendientes.put(tarea)
+
+    total = pendientes.qsize()
+    resultados = []
+    cerrojo = threading.Lock()
+
+    def trabajador(id_trabajador):
+        while True:
+            try:
+                tarea = pendientes.get_nowait()
+            except queue.Empty:
+                return
+
+            bytes_hechos = [0]
+
+            def callback_bytes(n, tarea=tarea, bytes_hechos=bytes_hechos):
+                bytes_hechos[0] += n
+                if callback_trabajador:
+                    callback_trabajador(id_trabajador, tarea, bytes_hechos[0])
+                if limitador is not None:
+                    limitador.esperar_bytes(n)
+
+            if callback_trabajador:
+                callback_trabajador(id_trabajador, tarea, 0)
+            if limitador is not None:
+                limitador.esperar_archivo()
+
+            resultado, error = None, None
+            try:
+                resultado = funcion(tarea, callback_bytes)
+            except Exception as e:
+                error = e
+
+            with cerrojo:
+                resultados.append((tarea, resultado, error))
+                completadas = len(resultados)
+            if callback_completado:
+                callback_completado(completadas, total, tarea, resultado, error)
+
+    num_hilos = max(1, min(int(num_hilos), total))
+    if num_hilos == 1:
+        trabajador(0)
+        return resultados
+
+    hilos = [threading.Thread(target=trabajador, args=(i,), daemon=True) for i in range(num_hilos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    return resultados
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Canal de progreso entre los hilos de trabajo y la interfaz
+"""
+
+import threading
+
+# Frecuencia con la que la interfaz consulta el canal
+FOTOGRAMAS_POR_SEGUNDO = 10
+INTERVALO_MS = 1000 // FOTOGRAMAS_POR_SEGUNDO
+
+
+class CanalProgreso:
+    """
+    Estado de progreso compartido. Los hilos de trabajo lo actualizan en cada evento
+    (bytes, archivo actual, errores) y la interfaz lo consulta a intervalos fijos con
+    instantanea(), de modo que miles de eventos se reducen a una sola actualización
+    por fotograma en lugar de saturar la cola de eventos de Tk.
+    """
+
+    def __init__(self, bytes_totales=0):
+        self._cerrojo = threading.Lock()
+        self._version = 0
+        self._version_leida = -1
+        self.bytes_totales = bytes_totales
+        self.bytes_hechos = 0
+        self.completadas = 0
+        self.total_tareas = 0
+        self.archivo_actual = ""
+        self.texto = ""
+        self.fraccion = None  # Progreso fijado explícitamente por una fase (p. ej. el informe)
+        self.trabajadores = {}  # id -> (ruta, bytes_hechos, tamaño)
+        self.errores = []
+        self.terminado = False
+
+    def establecer_total(self, bytes_totales):
+        """Fija el número de bytes que se espera procesar"""
+        with self._cerrojo:
+            self.bytes_totales = bytes_totales
+            self._version += 1
+
+    def estado(self, texto, fraccion=None):
+        """Publica un mensaje de estado y, opcionalmente, un progreso fijo entre 0 y 1"""
+        with self._cerrojo:
+            self.texto = texto
+            self.fraccion = fraccion
+            self._version += 1
+
+    def trabajador(self, id_trabajador, tarea, bytes_hechos):
+        """
+        Registra los bytes procesados por un hilo en su tarea actual (misma firma que
+        callback_trabajador de ejecutar_en_paralelo) y acumula la diferencia al total.
+        """
+        ruta = tarea[0]
+        with self._cerrojo:
+            anterior = self.trabajadores.get(id_trabajador)
+            previos = anterior[1] if anterior is not None and anterior[0] == ruta else 0
+            self.bytes_hechos += bytes_hechos - previos
+            self.trabajadores[id_trabajador] = (ruta, bytes_hechos, tarea[3])
+            self.archivo_actual = ruta
+            self.fraccion = None
+            self._version += 1
+
+    def tarea_completada(self, completadas, total, ruta):
+        """Registra una tarea terminada (misma firma que callback_progreso)"""
+        with self._cerrojo:
+            self.completadas = completadas
+            self.total_tareas = total
+            self.archivo_actual = ruta
+            self._version += 1
+
+    def error(self, mensaje):
+        """Añade un error para que la interfaz lo muestre"""
+        with self._cerrojo:
+            self.errores.append(mensaje)
+            self._version += 1
+
+    def finalizar(self):
+        """Indica que no habrá más eventos"""
+        with self._cerrojo:
+            self.terminado = True
+            self._version += 1
+
+    def instantanea(self):
+        """
+        Devuelve el estado acumulado desde la última lectura, o None si no hubo eventos.
+        Los errores se entregan una sola vez.
+
+        Returns:
+            Diccionario con 'texto', 'archivo', 'fraccion' (fijada por estado() o None durante
+            la copia), 'fraccion_bytes', 'bytes_hechos', 'bytes_totales',
+            'completadas', 'total_tareas', 'trabajadores', 'errores' y 'terminado'
+        """
+        with self._cerrojo:
+            if self._version == self._version_leida:
+                return None
+            self._version_leida = self._version
+            fraccion_bytes = min(1.0, self.bytes_hechos / self.bytes_totales) if self.bytes_totales else 0.0
+            errores = self.errores
+            self.errores = []
+            return {
+                'texto': self.texto,
+                'archivo': self.archivo_actual,
+                'fraccion': self.fraccion,
+                'fraccion_bytes': fraccion_bytes,
+                'bytes_hechos': self.bytes_hechos,
+                'bytes_totales': self.bytes_totales,
+                'completadas': self.completadas,
+                'total_tareas': self.total_tareas,
+                'trabajadores': dict(self.trabajadores),
+                'errores': errores,
+                'terminado': self.terminado
+            }
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Medición del rendimiento por fases de un respaldo
+
+Cada fase (escaneo, comparación, copia, tamaños, informe, correo...) registra su tiempo
+real y de CPU, los archivos y bytes procesados y, en Linux, las llamadas al sistema de
+lectura y escritura del proceso (/proc/self/io). Opcionalmente se captura un perfil de
+cProfile y el pico de memoria con tracemalloc.
+"""
+
+import os
+import json
+import time
+import datetime
+import contextlib
+
+RUTA_CONTADORES_ES = "/proc/self/io"
+
+# Contadores de /proc/self/io -> nombre usado en el resumen
+CONTADORES_ES = {
+    'syscr': 'llamadas_lectura',
+    'syscw': 'llamadas_escritura',
+    'rchar': 'bytes_leidos',
+    'wchar': 'bytes_escritos'
+}
+
+
+def leer_contadores_es():
+    """
+    Lee los contadores de E/S del proceso (todos los hilos).
+
+    Returns:
+        Diccionario con las claves de CONTADORES_ES o None si el sistema no los ofrece
+    """
+    try:
+        with open(RUTA_CONTADORES_ES, "r") as f:
+            valores = dict(linea.split(":", 1) for linea in f if ":" in linea)
+        return {clave: int(valores[clave]) for clave in CONTADORES_ES}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+class Medidor:
+    """
+    Registro de las fases de una ejecución. Uso:
+
+        medidor = Medidor()
+        with medidor.fase("copia") as fase:
+            ...
+            fase['archivos'] = 10
+            fase['bytes'] = 1024
+    """
+
+    def __init__(self, perfilar=False, memoria=False):
+        """
+        Args:
+            perfilar: Si es True se captura un perfil de cProfile de las fases (solo del
+                hilo que las ejecuta; los hilos de copia no se incluyen)
+            memoria: Si es True se mide el pico de memoria de cada fase con tracemalloc
+        """
+        self.fases = []
+        self.perfil = None
+        if perfilar:
+            import cProfile
+            self.perfil = cProfile.Profile()
+        self.memoria = memoria
+        self._memoria_propia = False
+        if memoria:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._memoria_propia = True
+
+    def _activar_perfil(self):
+        try:
+            self.perfil.enable()
+            return True
+        except ValueError as e:
+            # Solo puede haber un perfilador activo a la vez
+            print(f"No se pudo activar el perfil: {e}")
+            return False
+
+    @contextlib.contextmanager
+    def fase(self, nombre, archivos=0, bytes_procesados=0):
+        """
+        Mide una fase. El diccionario devuelto admite 'archivos' y 'bytes' para indicar
+        lo procesado durante la fase.
+        """
+        entrada = {'fase': nombre, 'archivos': archivos, 'bytes': bytes_procesados}
+        if self.memoria:
+            import tracemalloc
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+        perfil_activo = self.perfil is not None and self._activar_perfil()
+        contadores = leer_contadores_es()
+        cpu = time.process_time()
+        inicio = time.perf_counter()
+        try:
+            yield entrada
+        finally:
+            entrada['segundos'] = time.perf_counter() - inicio
+            entrada['cpu'] = time.process_time() - cpu
+            if perfil_activo:
+                self.perfil.disable()
+            finales = leer_contadores_es()
+            if contadores is not None and finales is not None:
+                for clave, nombre_contador in CONTADORES_ES.items():
+                    entrada[nombre_contador] = finales[clave] - contadores[clave]
+            if self.memoria:
+                import tracemalloc
+                entrada['memoria_pico'] = tracemalloc.get_traced_memory()[1]
+            entrada['rendimiento'] = entrada['bytes'] / entrada['segundos'] if entrada['segundos'] > 0 else 0
+            self.fases.append(entrada)
+
+    def agregar(self, fases):
+        """Incorpora fases medidas por otro medidor (p. ej. el escaneo del análisis)"""
+        self.fases.extend(fases)
+
+    def total(self):
+        """Tiempo total de las fases en segundos"""
+        return sum(entrada['segundos'] for entrada in self.fases)
+
+    def guardar(self, ruta_informe):
+        """
+        Guarda los tiempos junto al informe (<informe>_rendimiento.json) y, si se
+        capturó, el perfil (<informe>_perfil.prof y un resumen en <informe>_perfil.txt).
+
+        Returns:
+            Ruta del archivo de tiempos
+        """
+        base = os.path.splitext(ruta_informe)[0]
+        datos = {
+            'fecha': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'informe': ruta_informe,
+            'total_segundos': self.total(),
+            'fases': self.fases
+        }
+        if self.perfil is not None:
+            import pstats
+            ruta_perfil = base + "_perfil.prof"
+            self.perfil.dump_stats(ruta_perfil)
+            with open(base + "_perfil.txt", "w", encoding="utf-8") as f:
+                pstats.Stats(ruta_perfil, stream=f).sort_stats("cumulative").print_stats(40)
+            datos['perfil'] = ruta_perfil
+
+        ruta = base + "_rendimiento.json"
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+        return ruta
+
+    def detener(self):
+        """Detiene tracemalloc si lo inició este medidor"""
+        if self._memoria_propia:
+            import tracemalloc
+            tracemalloc.stop()
+            self._memoria_propia = False
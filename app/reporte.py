@@ -5,113 +5,415 @@ PyRespaldos - Módulo para generación de informes
 """
 
 import os
+import html
 import datetime
-from app.utils import convertir_tamano, obtener_arbol_con_tamanos_nivel_2
+from itertools import islice
+from functools import lru_cache
+from app.utils import convertir_tamano, obtener_arbol_con_tamanos_nivel_2, reservar_nombre
+from app.manifiesto import calcular_totales, leer_resumen, leer_entradas
 
-def generar_reporte_html(origen, destino, archivos_copiados, tamaño_destino_antes=0, tamaño_destino_despues=0, tamaño_diferencia=0):
+# Filas de la tabla de archivos copiados a partir de las cuales el informe se divide en páginas
+FILAS_POR_PAGINA = 5000
+
+# Los tamaños se repiten mucho (archivos pequeños, carpetas vacías): formatear cada valor una vez
+_tamano = lru_cache(maxsize=65536)(convertir_tamano)
+
+_ESTILOS = """
+        <style>
+            body { font-family: Arial, sans-serif; margin: 20px; }
+            table { border-collapse: collapse; width: 100%; margin-bottom: 20px; }
+            th, td { padding: 8px; text-align: left; }
+            th { background-color: #f2f2f2; }
+            tr:nth-child(even) { background-color: #f9f9f9; }
+            h1, h2 { color: #333; }
+            .summary {
+                background-color: #e8f5e9;
+                border: 1px solid #a5d6a7;
+                padding: 15px;
+                border-radius: 5px;
+                margin: 20px 0;
+            }
+            .total { font-weight: bold; }
+            .error {
+                background-color: #ffebee;
+                border: 1px solid #ef9a9a;
+                padding: 15px;
+                border-radius: 5px;
+                margin: 20px 0;
+            }
+            .comparison {
+                background-color: #e3f2fd;
+                border: 1px solid #90caf9;
+                padding: 15px;
+                border-radius: 5px;
+                margin: 20px 0;
+            }
+        </style>
+"""
+
+
+def _esc(texto):
+    """Escapa un texto (rutas, nombres) para insertarlo en el HTML"""
+    return html.escape(str(texto))
+
+
+def _escribir_cabecera(f, titulo):
+    f.write(f"""
+    <html>
+    <head>
+        <title>{_esc(titulo)}</title>
+        <meta charset="UTF-8">{_ESTILOS}    </head>
+    <body>
+""")
+
+
+def _escribir_pie(f):
+    f.write("""
+    </body>
+    </html>
+""")
+
+
+def _cabecera_copiados(guardados=None):
+    """Fila de encabezado de la tabla de archivos copiados (con el tamaño guardado si hay compresión)"""
+    if guardados is None:
+        return "<tr><th>Tipo</th><th>Ruta</th><th>Tamaño</th></tr>\n"
+    return "<tr><th>Tipo</th><th>Ruta</th><th>Tamaño</th><th>Guardado</th></tr>\n"
+
+
+def _escribir_filas_copiados(f, archivos_copiados, guardados=None):
+    """
+    Escribe las filas de la tabla de archivos copiados una a una. guardados es el
+    diccionario {ruta: tamaño_guardado} de los archivos comprimidos, si hay compresión.
+    """
+    for ruta, tipo, tamano in archivos_copiados:
+        if guardados is None:
+            f.write(f"<tr><td>{tipo}</td><td>{_esc(ruta)}</td><td>{_tamano(tamano)}</td></tr>\n")
+        else:
+            guardado = _tamano(guardados.get(ruta, tamano)) if tipo == '[ARCHIVO]' else ""
+            f.write(f"<tr><td>{tipo}</td><td>{_esc(ruta)}</td><td>{_tamano(tamano)}</td><td>{guardado}</td></tr>\n")
+
+
+def _escribir_paginas(f, archivos_copiados, total_elementos, nombre_informe, titulo, guardados=None):
+    """
+    Escribe la tabla de archivos copiados en páginas separadas y un índice de páginas
+    en el informe principal, para que el navegador no tenga que abrir un único HTML enorme.
+    archivos_copiados puede ser cualquier iterable (p. ej. las entradas del manifiesto).
+    """
+    carpeta_paginas = os.path.splitext(nombre_informe)[0] + "_paginas"
+    os.makedirs(carpeta_paginas, exist_ok=True)
+    total_paginas = (total_elementos + FILAS_POR_PAGINA - 1) // FILAS_POR_PAGINA
+    elementos = iter(archivos_copiados)
+
+    f.write("<table border='1'>\n<tr><th>Página</th><th>Desde</th><th>Hasta</th><th>Elementos</th></tr>\n")
+    for numero in range(1, total_paginas + 1):
+        pagina = list(islice(elementos, FILAS_POR_PAGINA))
+        if not pagina:
+            break
+        nombre_pagina = f"pagina_{numero:04d}.html"
+        enlace = f"{os.path.basename(carpeta_paginas)}/{nombre_pagina}"
+
+        with open(os.path.join(carpeta_paginas, nombre_pagina), "w", encoding="utf-8") as fp:
+            _escribir_cabecera(fp, f"{titulo} - Página {numero}")
+            fp.write(f"<h1>{_esc(titulo)} - Página {numero} de {total_paginas}</h1>\n")
+            fp.write(f"<p><a href='../{_esc(os.path.basename(nombre_informe))}'>Volver al resumen</a></p>\n")
+            fp.write("<table border='1'>\n" + _cabecera_copiados(guardados))
+            _escribir_filas_copiados(fp, pagina, guardados)
+            fp.write("</table>\n")
+            _escribir_pie(fp)
+
+        f.write(f"<tr><td><a href='{_esc(enlace)}'>{numero}</a></td><td>{_esc(pagina[0][0])}</td>"
+                f"<td>{_esc(pagina[-1][0])}</td><td>{len(pagina)}</td></tr>\n")
+    f.write("</table>\n")
+
+
+def _escribir_secciones_detalles(f, detalles):
+    """Escribe las secciones opcionales (verificación, instantáneas, almacén, rendimiento, delta)"""
+    # Sección de verificación de integridad (si se verificó la copia)
+    verificacion = detalles.get('verificacion')
+    if verificacion:
+        fallidos = verificacion['fallidos']
+        f.write(f"""
+        <div class="{'error' if fallidos else 'comparison'}">
+            <h2>Verificación de Integridad</h2>
+            <p><span class="total">Algoritmo:</span> {verificacion['algoritmo']}</p>
+            <p><span class="total">Archivos verificados:</span> {verificacion['verificados']}</p>
+            <p><span class="total">Archivos con errores:</span> {len(fallidos)}</p>
+""")
+        if fallidos:
+            f.write('<table border="1"><tr><th>Ruta</th><th>Hash origen</th><th>Hash destino</th></tr>\n')
+            for ruta, esperado, obtenido in fallidos:
+                f.write(f"<tr><td>{_esc(ruta)}</td><td>{_esc(esperado)}</td><td>{_esc(obtenido)}</td></tr>\n")
+            f.write("</table>\n")
+        f.write("        </div>\n")
+
+    # Sección de instantáneas (bytes nuevos y enlazados de cada versión del destino)
+    instantaneas = detalles.get('instantaneas')
+    if instantaneas:
+        actual = detalles.get('instantanea', {}).get('nombre')
+        f.write("""
+        <h2>Instantáneas</h2>
+        <table border='1'>
+            <tr><th>Instantánea</th><th>Fecha</th><th>Archivos copiados</th><th>Bytes nuevos</th><th>Archivos enlazados</th><th>Bytes enlazados</th><th>Tamaño total</th></tr>
+""")
+        for i in instantaneas:
+            clase = " class='total'" if i['nombre'] == actual else ""
+            f.write(f"<tr{clase}><td>{_esc(i['nombre'])}</td><td>{_esc(i['fecha'])}</td><td>{i['archivos_copiados']}</td>"
+                    f"<td>{_tamano(i['bytes_escritos'])}</td><td>{i['archivos_enlazados']}</td>"
+                    f"<td>{_tamano(i['bytes_enlazados'])}</td><td>{_tamano(i['tamano_total'])}</td></tr>\n")
+        f.write("        </table>\n")
+
+    # Sección del almacén deduplicado (bytes lógicos frente a bytes nuevos guardados)
+    almacen = detalles.get('almacen')
+    if almacen:
+        errores = almacen.get('errores', [])
+        f.write(f"""
+        <div class="{'error' if errores else 'comparison'}">
+            <h2>Almacén Deduplicado</h2>
+            <p><span class="total">Manifiesto:</span> {_esc(almacen['manifiesto'])}</p>
+            <p><span class="total">Archivos en el manifiesto:</span> {almacen['archivos']} ({almacen['archivos_sin_cambios']} sin cambios)</p>
+            <p><span class="total">Tamaño lógico:</span> {_tamano(almacen['bytes_logicos'])}</p>
+            <p><span class="total">Datos procesados:</span> {_tamano(almacen['bytes_procesados'])} en {almacen['fragmentos']} fragmentos</p>
+            <p><span class="total">Datos nuevos guardados:</span> {_tamano(almacen['bytes_nuevos'])}</p>
+""")
+        if errores:
+            f.write(f'<p><span class="total">Archivos no guardados (se conserva la versión anterior):</span> {len(errores)}</p>\n')
+            f.write('<table border="1"><tr><th>Ruta</th><th>Error</th></tr>\n')
+            for ruta, mensaje in errores:
+                f.write(f"<tr><td>{_esc(ruta)}</td><td>{_esc(mensaje)}</td></tr>\n")
+            f.write("</table>\n")
+        f.write("        </div>\n")
+
+    # Sección de compresión (tamaño original frente a tamaño guardado)
+    compresion = detalles.get('compresion')
+    if compresion:
+        originales = compresion['bytes_originales']
+        proporcion = f" ({compresion['bytes_guardados'] / originales:.0%} del original)" if originales else ""
+        f.write(f"""
+        <div class="comparison">
+            <h2>Compresión ({_esc(compresion['algoritmo'])})</h2>
+            <p><span class="total">Archivos comprimidos:</span> {compresion['comprimidos']}</p>
+            <p><span class="total">Archivos ya comprimidos (copiados tal cual):</span> {compresion['omitidos']}</p>
+            <p><span class="total">Tamaño original:</span> {_tamano(originales)}</p>
+            <p><span class="total">Tamaño guardado:</span> {_tamano(compresion['bytes_guardados'])}{proporcion}</p>
+        </div>
+""")
+
+    # Sección de empaquetado (archivos pequeños guardados en contenedores por carpeta)
+    empaquetado = detalles.get('empaquetado')
+    if empaquetado:
+        f.write(f"""
+        <div class="comparison">
+            <h2>Archivos Empaquetados</h2>
+            <p><span class="total">Archivos de menos de {_tamano(empaquetado['umbral'])}:</span> {empaquetado['archivos']} en {empaquetado['contenedores']} contenedores</p>
+            <p>Para recuperarlos: <code>python -m app.empaquetado extraer &lt;carpeta&gt; &lt;destino&gt;</code></p>
+        </div>
+""")
+
+    # Sección de rendimiento (tiempo, datos y llamadas al sistema de cada fase)
+    rendimiento = detalles.get('rendimiento')
+    if rendimiento:
+        f.write("""
+        <h2>Rendimiento</h2>
+        <table border='1'>
+            <tr><th>Fase</th><th>Tiempo</th><th>CPU</th><th>Archivos</th><th>Datos</th><th>Velocidad</th><th>Lecturas (llamadas)</th><th>Escrituras (llamadas)</th><th>Memoria pico</th></tr>
+""")
+        for fase in rendimiento:
+            velocidad = f"{_tamano(fase['rendimiento'])}/s" if fase['bytes'] else ""
+            memoria = _tamano(fase['memoria_pico']) if 'memoria_pico' in fase else ""
+            f.write(f"<tr><td>{_esc(fase['fase'])}</td><td>{fase['segundos']:.3f} s</td><td>{fase['cpu']:.3f} s</td>"
+                    f"<td>{fase['archivos']}</td><td>{_tamano(fase['bytes'])}</td><td>{velocidad}</td>"
+                    f"<td>{fase.get('llamadas_lectura', '')}</td><td>{fase.get('llamadas_escritura', '')}</td>"
+                    f"<td>{memoria}</td></tr>\n")
+        f.write("""        </table>
+        <p>La generación de este informe y el envío del correo se registran en el archivo <code>_rendimiento.json</code> que acompaña al informe.</p>
+""")
+
+    # Sección de transferencia delta (archivos actualizados reescribiendo solo los bloques modificados)
+    archivos_delta = detalles.get('delta')
+    if archivos_delta:
+        f.write("""
+        <h2>Transferencia Delta</h2>
+        <table border='1'>
+            <tr><th>Ruta</th><th>Tamaño</th><th>Bytes escritos</th></tr>
+""")
+        for ruta, tamano, escritos in archivos_delta:
+            f.write(f"<tr><td>{_esc(ruta)}</td><td>{_tamano(tamano)}</td><td>{_tamano(escritos)}</td></tr>\n")
+        f.write("        </table>\n")
+
+
+def _escribir_arbol(f, titulo, arbol):
+    f.write(f"""
+        <h2>{titulo}</h2>
+        <table border='1'>
+            <tr><th>Carpeta</th><th>Tamaño</th></tr>
+""")
+    for carpeta, tamano in arbol.items():
+        f.write(f"<tr><td>{_esc(carpeta)}</td><td>{_tamano(tamano)}</td></tr>\n")
+    f.write("        </table>\n")
+
+
+def generar_reporte_html(origen, destino, archivos_copiados, tamaño_destino_antes=0, tamaño_destino_despues=0, tamaño_diferencia=0,
+                         indice_origen=None, indice_destino=None, detalles=None, manifiesto=None):
     """
     Genera un informe HTML con los archivos copiados y estadísticas de tamaño.
-    
+    Las filas se escriben directamente en el archivo; si hay más de FILAS_POR_PAGINA
+    elementos copiados, su tabla se divide en páginas enlazadas desde el informe principal.
+    Si se indica el manifiesto de la ejecución, los totales y los elementos se leen de él.
+
     Args:
         origen: Ruta de origen
         destino: Ruta de destino
         archivos_copiados: Lista de archivos copiados en formato (ruta, tipo, tamaño)
+            (se ignora si se indica manifiesto)
         tamaño_destino_antes: Tamaño del directorio destino antes de la copia
         tamaño_destino_despues: Tamaño del directorio destino después de la copia
         tamaño_diferencia: Diferencia de tamaño (después - antes)
-    
+        indice_origen: Índice ya escaneado del origen (evita volver a recorrerlo)
+        indice_destino: Índice ya escaneado del destino (evita volver a recorrerlo)
+        detalles: Información adicional de la ejecución (ver copiar_archivos_manualmente)
+        manifiesto: Ruta del manifiesto de la ejecución (ver escribir_manifiesto)
+
     Returns:
         Ruta al archivo HTML generado
     """
     # Obtener información de la estructura del origen y destino
-    arbol_origen = obtener_arbol_con_tamanos_nivel_2(origen)
-    arbol_destino = obtener_arbol_con_tamanos_nivel_2(destino)
+    arbol_origen = obtener_arbol_con_tamanos_nivel_2(origen, indice_origen)
+    arbol_destino = obtener_arbol_con_tamanos_nivel_2(destino, indice_destino)
     fecha = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
+
     # Obtener solo el nombre del directorio de origen (sin la ruta completa)
     nombre_carpeta_origen = os.path.basename(origen)
-    
-    # Calcular estadísticas del respaldo
-    total_archivos = sum(1 for _, tipo, _ in archivos_copiados if tipo == '[ARCHIVO]')
-    total_carpetas = sum(1 for _, tipo, _ in archivos_copiados if tipo == '[CARPETA]')
-    total_tamano = sum(tamano for _, tipo, tamano in archivos_copiados if tipo == '[ARCHIVO]')
+    titulo = f"Informe de Copia - {nombre_carpeta_origen}"
+
+    # Estadísticas del respaldo: del manifiesto si existe o de la lista de elementos
+    if manifiesto is not None:
+        totales = leer_resumen(manifiesto)
+        archivos_copiados = leer_entradas(manifiesto)
+    else:
+        totales = calcular_totales(archivos_copiados)
+    total_archivos = totales['total_archivos']
+    total_carpetas = totales['total_carpetas']
+    total_tamano = totales['total_tamano']
+    total_elementos = total_archivos + total_carpetas
+    detalles = detalles or {}
+
+    # Generar nombre de archivo que incluya el directorio de origen
+    nombre_fecha = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+    nombre_informe = reservar_nombre(f"informe_copia_{nombre_carpeta_origen}_{nombre_fecha}", ".html")
+
+    with open(nombre_informe, "w", encoding="utf-8") as f:
+        _escribir_cabecera(f, titulo)
+        f.write(f"""
+        <h1>{_esc(titulo)} - {fecha}</h1>
 
-    html = f"""
-    <html>
-    <head>
-        <title>Informe de Copia - {nombre_carpeta_origen}</title>
-        <meta charset="UTF-8">
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; }}
-            table {{ border-collapse: collapse; width: 100%; margin-bottom: 20px; }}
-            th, td {{ padding: 8px; text-align: left; }}
-            th {{ background-color: #f2f2f2; }}
-            tr:nth-child(even) {{ background-color: #f9f9f9; }}
-            h1, h2 {{ color: #333; }}
-            .summary {{ 
-                background-color: #e8f5e9; 
-                border: 1px solid #a5d6a7; 
-                padding: 15px; 
-                border-radius: 5px;
-                margin: 20px 0;
-            }}
-            .total {{ font-weight: bold; }}
-            .comparison {{ 
-                background-color: #e3f2fd; 
-                border: 1px solid #90caf9; 
-                padding: 15px; 
-                border-radius: 5px;
-                margin: 20px 0;
-            }}
-        </style>
-    </head>
-    <body>
-        <h1>Informe de Copia - {nombre_carpeta_origen} - {fecha}</h1>
-        
         <div class="summary">
             <h2>Resumen del Respaldo</h2>
-            <p><span class="total">Carpeta origen:</span> {origen}</p>
-            <p><span class="total">Carpeta destino:</span> {destino}</p>
+            <p><span class="total">Carpeta origen:</span> {_esc(origen)}</p>
+            <p><span class="total">Carpeta destino:</span> {_esc(destino)}</p>
             <p><span class="total">Total de Archivos:</span> {total_archivos}</p>
             <p><span class="total">Total de Carpetas:</span> {total_carpetas}</p>
-            <p><span class="total">Tamaño Total Copiado:</span> {convertir_tamano(total_tamano)}</p>
-        </div>
-        
+            <p><span class="total">Tamaño Total Copiado:</span> {_tamano(total_tamano)}</p>
+""")
+        if 'bytes_escritos' in detalles:
+            f.write(f'            <p><span class="total">Bytes Escritos en Destino:</span> {_tamano(detalles["bytes_escritos"])}</p>\n')
+        f.write(f"""        </div>
+
         <div class="comparison">
             <h2>Comparación de Tamaño Antes y Después</h2>
-            <p><span class="total">Tamaño del destino antes de la copia:</span> {convertir_tamano(tamaño_destino_antes)}</p>
-            <p><span class="total">Tamaño del destino después de la copia:</span> {convertir_tamano(tamaño_destino_despues)}</p>
+            <p><span class="total">Tamaño del destino antes de la copia:</span> {_tamano(tamaño_destino_antes)}</p>
+            <p><span class="total">Tamaño del destino después de la copia:</span> {_tamano(tamaño_destino_despues)}</p>
             <p><span class="total">Diferencia de tamaño:</span> {convertir_tamano(tamaño_diferencia)}</p>
         </div>
-        
-        <h2>Archivos Copiados</h2>
-        <table border='1'>
-            <tr><th>Tipo</th><th>Ruta</th><th>Tamaño</th></tr>
-            {''.join(f'<tr><td>{tipo}</td><td>{ruta}</td><td>{convertir_tamano(tamano)}</td></tr>' for ruta, tipo, tamano in archivos_copiados)}
-            <tr class="total">
+""")
+        _escribir_secciones_detalles(f, detalles)
+
+        guardados = detalles['compresion']['guardados'] if detalles.get('compresion') else None
+        f.write("\n        <h2>Archivos Copiados</h2>\n")
+        if total_elementos > FILAS_POR_PAGINA:
+            _escribir_paginas(f, archivos_copiados, total_elementos, nombre_informe, titulo, guardados)
+            f.write(f"<p><span class='total'>Total:</span> {_tamano(total_tamano)}</p>\n")
+        else:
+            f.write("<table border='1'>\n" + _cabecera_copiados(guardados))
+            _escribir_filas_copiados(f, archivos_copiados, guardados)
+            f.write(f"""<tr class="total">
                 <td colspan="2">Total</td>
-                <td>{convertir_tamano(total_tamano)}</td>
+                <td>{_tamano(total_tamano)}</td>
             </tr>
         </table>
-        
-        <h2>Árbol de Archivos en Origen</h2>
-        <table border='1'>
-            <tr><th>Carpeta</th><th>Tamaño</th></tr>
-            {''.join(f'<tr><td>{carp}</td><td>{convertir_tamano(tamano)}</td></tr>' for carp, tamano in arbol_origen.items())}
-        </table>
-        
-        <h2>Árbol de Archivos en Destino</h2>
-        <table border='1'>
-            <tr><th>Carpeta</th><th>Tamaño</th></tr>
-            {''.join(f'<tr><td>{carp}</td><td>{convertir_tamano(tamano)}</td></tr>' for carp, tamano in arbol_destino.items())}
-        </table>
-    </body>
-    </html>
+""")
+
+        _escribir_arbol(f, "Árbol de Archivos en Origen", arbol_origen)
+        _escribir_arbol(f, "Árbol de Archivos en Destino", arbol_destino)
+        _escribir_pie(f)
+    return nombre_informe
+
+
+def _formatear_duracion(segundos):
+    minutos, segundos = divmod(int(round(segundos)), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}:{minutos:02d}:{segundos:02d}"
+
+
+def generar_resumen_trabajos_html(trabajos, segundos_total):
     """
-    # Generar nombre de archivo que incluya el directorio de origen
-    nombre_fecha = datetime.datetime.now().strftime("%Y%m%d_%H%M")
-    nombre_informe = f"informe_copia_{nombre_carpeta_origen}_{nombre_fecha}.html"
-    
-    with open(nombre_informe, "w", encoding="utf-8") as f:
-        f.write(html)
-    return nombre_informe
\ No newline at end of file
+    Genera el informe resumen de una ejecución de la cola de trabajos, con una fila por
+    trabajo enlazada a su propio informe.
+
+    Args:
+        trabajos: Trabajos ejecutados con su 'estado' y 'resultado' (ver trabajos.ejecutar_cola)
+        segundos_total: Duración total de la ejecución de la cola
+
+    Returns:
+        Ruta al archivo HTML generado
+    """
+    fecha = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    titulo = "Resumen de Trabajos"
+    nombre_resumen = reservar_nombre(f"resumen_trabajos_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}", ".html")
+
+    resultados = [t.get('resultado') or {} for t in trabajos]
+    completados = sum(1 for t in trabajos if t['estado'] == 'completado')
+    total_archivos = sum(r.get('archivos', 0) for r in resultados)
+    total_bytes = sum(r.get('bytes', 0) for r in resultados)
+    suma_segundos = sum(r.get('segundos', 0) for r in resultados)
+
+    with open(nombre_resumen, "w", encoding="utf-8") as f:
+        _escribir_cabecera(f, titulo)
+        f.write(f"""
+        <h1>{titulo} - {fecha}</h1>
+
+        <div class="summary">
+            <h2>Resumen</h2>
+            <p><span class="total">Trabajos completados:</span> {completados} de {len(trabajos)}</p>
+            <p><span class="total">Total de Archivos Copiados:</span> {total_archivos}</p>
+            <p><span class="total">Tamaño Total Copiado:</span> {_tamano(total_bytes)}</p>
+            <p><span class="total">Duración total:</span> {_formatear_duracion(segundos_total)}
+               (suma de los trabajos: {_formatear_duracion(suma_segundos)})</p>
+        </div>
+""")
+        errores = [t for t in trabajos if t['estado'] == 'error']
+        if errores:
+            f.write('\n        <div class="error">\n            <h2>Trabajos con Error</h2>\n')
+            for trabajo in errores:
+                f.write(f"            <p><span class='total'>{_esc(trabajo['nombre'])}:</span> "
+                        f"{_esc(trabajo['resultado'].get('error', ''))}</p>\n")
+            f.write("        </div>\n")
+
+        f.write("""
+        <h2>Trabajos</h2>
+        <table border='1'>
+<tr><th>Trabajo</th><th>Origen</th><th>Destino</th><th>Discos</th><th>Inicio</th><th>Duración</th><th>Estado</th><th>Archivos</th><th>Tamaño</th><th>Verificación</th><th>Informe</th></tr>
+""")
+        for trabajo, resultado in zip(trabajos, resultados):
+            informe = resultado.get('informe')
+            enlace = f"<a href='{_esc(informe)}'>{_esc(os.path.basename(informe))}</a>" if informe else ""
+            fallidos = resultado.get('fallidos', 0)
+            verificacion = f"{fallidos} fallidos" if fallidos else ("Correcta" if trabajo['estado'] == 'completado' else "")
+            f.write(f"<tr><td>{_esc(trabajo['nombre'])}</td><td>{_esc(trabajo['origen'])}</td>"
+                    f"<td>{_esc(trabajo['destino'])}</td><td>{_esc(', '.join(resultado.get('dispositivos', [])))}</td>"
+                    f"<td>{_esc(resultado.get('inicio', ''))}</td><td>{_formatear_duracion(resultado.get('segundos', 0))}</td>"
+                    f"<td>{_esc(trabajo['estado'])}</td><td>{resultado.get('archivos', 0)}</td>"
+                    f"<td>{_tamano(resultado.get('bytes', 0))}</td><td>{verificacion}</td><td>{enlace}</td></tr>\n")
+        f.write("        </table>\n")
+        _escribir_pie(f)
+    return nombre_resumen
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Ejecución de un respaldo completo (copia, manifiesto e informe)
+
+Lo usan tanto la ventana principal como la línea de comandos, por lo que este módulo
+no importa nada de la interfaz. Los módulos que solo necesita un modo concreto
+(instantáneas, almacén, informe) se importan al usarse para que el arranque sea rápido.
+"""
+
+import os
+
+from app.config import obtener_opciones_backup
+from app.utils import comparar_origen_destino
+from app.indice import escanear_arbol
+from app.catalogo import obtener_indice_destino
+from app.backup import copiar_con_robocopy, copiar_archivos_manualmente
+from app.manifiesto import escribir_manifiesto
+from app.rendimiento import Medidor
+from app.diario import DiarioCopia, pendientes_diario, indice_origen_diario
+from app.limitador import crear_limitador
+
+
+def contar_archivos(indice):
+    """Número de archivos de un IndiceArbol"""
+    return sum(len(nodo.archivos) for nodo in indice.nodos.values())
+
+
+def seleccion_completa(indice_origen):
+    """Devuelve la selección equivalente a marcar todo: las carpetas y archivos de la raíz"""
+    raiz = indice_origen.nodos["."]
+    return list(raiz.subcarpetas) + sorted(raiz.archivos)
+
+
+def preparar_destino(destino, opciones):
+    """
+    Obtiene el estado del destino según el modo de respaldo (del catálogo o escaneándolo
+    una sola vez) para comparar con el origen.
+
+    Returns:
+        Tupla (indice_destino, catalogo, tamaño_destino_antes); catalogo es None en los
+        modos instantáneas y almacén
+    """
+    catalogo = None
+    if opciones['repository_mode']:
+        # En modo almacén se compara con el último manifiesto del repositorio
+        from app.almacen import Almacen
+        almacen = Almacen(destino)
+        return (almacen.indice_manifiesto(), None, almacen.tamano_en_disco())
+    if opciones['snapshot_mode']:
+        # En modo instantáneas se compara con la última versión guardada en el destino
+        from app.instantaneas import indice_ultima_instantanea
+        _, indice_destino = indice_ultima_instantanea(destino, opciones['use_catalog'])
+    else:
+        indice_destino, catalogo = obtener_indice_destino(destino, opciones['use_catalog'])
+    return (indice_destino, catalogo, indice_destino.tamano_total())
+
+
+def planificar_respaldo(origen, elementos_seleccionados, indice_origen, indice_destino, opciones):
+    """Plan de copia archivo por archivo (tamaño y fecha de modificación) para la selección"""
+    return comparar_origen_destino(origen, None, elementos_seleccionados, indice_origen, indice_destino,
+                                   opciones['mtime_tolerance'])
+
+
+def _copiar(origen, destino, elementos_seleccionados, elementos_a_copiar, opciones, canal, indice_origen,
+            indice_destino, catalogo, detalles, diario=None, limitador=None):
+    """
+    Copia la selección según el modo elegido (almacén, instantánea o copia normal).
+
+    Returns:
+        Tupla (elementos_copiados, destino_informe, indice_destino)
+    """
+    canal.estado("Iniciando copia...", 0.05)
+
+    # Variable para controlar si se usará robocopy o copia manual
+    usar_robocopy = False  # Cambiamos a False por defecto para usar el método manual
+    elementos_copiados = []
+    destino_informe = destino
+
+    if usar_robocopy and not (opciones['snapshot_mode'] or opciones['repository_mode']):
+        try:
+            # Preparar opciones para robocopy
+            opciones_adicionales = ""
+
+            if opciones['use_multithreading']:
+                opciones_adicionales += "/MT:8"  # Multihilo
+
+            if opciones['verify_copy']:
+                opciones_adicionales += " /V"  # Verificar
+
+            canal.estado("Ejecutando copia con Robocopy...", 0.1)
+
+            # Ejecutar robocopy
+            exito, codigo_salida, output_log, error_msg = copiar_con_robocopy(
+                origen, destino, elementos_seleccionados, opciones_adicionales
+            )
+
+            # Robocopy ya terminó: mostrar solo la última línea de su salida
+            if output_log:
+                canal.estado(f"Copiando: {output_log[-1][:60]}...", 0.9)
+
+            if not exito:
+                raise Exception(error_msg)
+
+            # Robocopy se ejecutó correctamente; el destino cambió fuera del índice
+            elementos_copiados = elementos_a_copiar
+            indice_destino = escanear_arbol(destino)
+            catalogo.importar_indice(indice_destino)
+
+        except Exception as e:
+            # Si falla robocopy, lo registramos y procedemos a copia manual
+            print(f"Error con robocopy: {e}")
+            usar_robocopy = False
+
+    # Si no usamos robocopy o falló, hacemos copia manual
+    if not usar_robocopy:
+        canal.estado("Realizando copia manual de archivos...", 0.1)
+
+        # Los hilos de copia solo actualizan el canal; quien lo consulta lo lee a su ritmo
+        actualizar_progreso = canal.tarea_completada
+        actualizar_trabajador = canal.trabajador
+
+        if opciones['repository_mode']:
+            # Trocear los archivos cambiados y guardar solo los fragmentos nuevos
+            from app.almacen import respaldar_en_almacen
+            elementos_copiados = respaldar_en_almacen(
+                origen, destino, elementos_seleccionados, actualizar_progreso,
+                opciones, actualizar_trabajador, indice_origen, detalles=detalles, limitador=limitador
+            )
+        elif opciones['snapshot_mode']:
+            # Nueva instantánea: los archivos sin cambios se enlazan a la anterior
+            from app.instantaneas import crear_instantanea
+            destino_informe, elementos_copiados, indice_destino = crear_instantanea(
+                origen, destino, elementos_seleccionados, actualizar_progreso,
+                opciones, actualizar_trabajador, indice_origen, detalles=detalles, limitador=limitador
+            )
+        else:
+            # Copiar manualmente exactamente el plan confirmado
+            elementos_copiados = copiar_archivos_manualmente(
+                origen, destino, elementos_seleccionados, actualizar_progreso,
+                opciones, actualizar_trabajador, indice_origen, indice_destino, catalogo,
+                plan=elementos_a_copiar, detalles=detalles, diario=diario, limitador=limitador
+            )
+
+        fallidos = detalles.get('verificacion', {}).get('fallidos', [])
+        if fallidos:
+            canal.error(f"{len(fallidos)} archivos no superaron la verificación. Consulta el informe.")
+
+    return (elementos_copiados, destino_informe, indice_destino)
+
+
+def ejecutar_respaldo(origen, destino, elementos_seleccionados, elementos_a_copiar, tamaño_destino_antes,
+                      opciones, canal, indice_origen, indice_destino, catalogo=None, medidor=None,
+                      copiados_previos=None, limitador=None):
+    """
+    Copia la selección según el modo elegido y genera el manifiesto, el informe HTML y
+    el archivo de tiempos por fase junto al informe.
+
+    Args:
+        origen: Ruta de origen
+        destino: Ruta de destino
+        elementos_seleccionados: Carpetas y archivos seleccionados (rutas relativas)
+        elementos_a_copiar: Plan de copia confirmado (ver planificar_respaldo)
+        tamaño_destino_antes: Tamaño del destino antes de la copia (ver preparar_destino)
+        opciones: Opciones de respaldo (ver obtener_opciones_backup)
+        canal: CanalProgreso donde se publica el avance
+        indice_origen: IndiceArbol del origen
+        indice_destino: Estado del destino obtenido con preparar_destino
+        catalogo: Catálogo del destino (modo normal)
+        medidor: Medidor con las fases ya medidas (escaneo, comparación); si no se indica
+            se crea uno nuevo
+        copiados_previos: Archivos copiados por una ejecución interrumpida que se está
+            reanudando (ver reanudar_respaldo); si es None se empieza un diario nuevo
+        limitador: Limitador de bytes y archivos por segundo (ver app.limitador); si no
+            se indica se crea uno con las opciones 'throttle_*'
+
+    Returns:
+        Diccionario con 'informe', 'manifiesto', 'rendimiento' (archivo de tiempos),
+        'destino' (la carpeta de la instantánea en ese modo), 'elementos_copiados',
+        'indice_destino', 'detalles' y 'medidor'
+    """
+    if medidor is None:
+        medidor = Medidor(opciones['profile'], opciones['trace_memory'])
+    detalles = {}  # Información adicional de la copia para el informe (verificación...)
+    if limitador is None:
+        limitador = crear_limitador(opciones, destino)
+
+    # Diario para reanudar la copia si se interrumpe (las instantáneas y el almacén no lo
+    # necesitan: cada instantánea es una carpeta nueva y el almacén no reescribe fragmentos)
+    diario = None
+    if not (opciones['snapshot_mode'] or opciones['repository_mode']):
+        diario = DiarioCopia(destino)
+        if copiados_previos is None:
+            diario.iniciar(origen, elementos_seleccionados, elementos_a_copiar, indice_origen, opciones,
+                           tamaño_destino_antes)
+        else:
+            diario.continuar()
+
+    try:
+        with medidor.fase("copia") as fase:
+            elementos_copiados, destino_informe, indice_destino = _copiar(
+                origen, destino, elementos_seleccionados, elementos_a_copiar, opciones, canal, indice_origen,
+                indice_destino, catalogo, detalles, diario, limitador
+            )
+            fase['archivos'] = sum(1 for e in elementos_copiados if e[1] == '[ARCHIVO]')
+            fase['bytes'] = sum(tamano for _, tipo, tamano in elementos_copiados if tipo == '[ARCHIVO]')
+    finally:
+        if diario is not None:
+            diario.cerrar()
+    if copiados_previos:
+        elementos_copiados = list(copiados_previos) + elementos_copiados
+
+    # Calcular tamaño después de la copia (el índice del destino ya incluye los archivos copiados)
+    canal.estado("Calculando tamaño total...", 0.9)
+    with medidor.fase("tamanos"):
+        if opciones['repository_mode']:
+            from app.almacen import Almacen
+            tamaño_destino_despues = Almacen(destino).tamano_en_disco()
+        else:
+            tamaño_destino_despues = indice_destino.tamano_total()
+    tamaño_diferencia = tamaño_destino_despues - tamaño_destino_antes
+
+    # Manifiesto de la ejecución: totales y elementos copiados para el informe, el correo y otras herramientas
+    with medidor.fase("manifiesto", archivos=len(elementos_copiados)):
+        ruta_manifiesto = escribir_manifiesto(
+            origen, destino_informe, elementos_copiados, tamaño_destino_antes,
+            tamaño_destino_despues, detalles, opciones['manifest_compress']
+        )
+
+    # Generar el informe HTML después de todo el proceso
+    canal.estado("Generando informe HTML...", 0.95)
+
+    # El informe incluye las fases medidas hasta ahora; la suya se añade al archivo de tiempos
+    detalles['rendimiento'] = list(medidor.fases)
+    with medidor.fase("informe", archivos=len(elementos_copiados)):
+        from app.reporte import generar_reporte_html
+        informe = generar_reporte_html(
+            origen,
+            destino_informe,
+            elementos_copiados,
+            tamaño_destino_antes,
+            tamaño_destino_despues,
+            tamaño_diferencia,
+            indice_origen,
+            indice_destino,
+            detalles,
+            manifiesto=ruta_manifiesto
+        )
+
+    # El respaldo está completo: ya no hay nada que reanudar
+    if diario is not None:
+        diario.finalizar()
+
+    return {
+        'informe': informe,
+        'manifiesto': ruta_manifiesto,
+        'rendimiento': medidor.guardar(informe),
+        'destino': destino_informe,
+        'elementos_copiados': elementos_copiados,
+        'indice_destino': indice_destino,
+        'detalles': detalles,
+        'medidor': medidor
+    }
+
+
+def copia_interrumpida(origen, destino):
+    """
+    Busca en el destino el diario de una copia interrumpida del mismo origen.
+
+    Returns:
+        Estado del diario (ver DiarioCopia.cargar) o None si no hay nada que reanudar
+    """
+    diario = DiarioCopia(destino)
+    if not diario.existe():
+        return None
+    try:
+        estado = diario.cargar()
+    except OSError as e:
+        print(f"No se pudo leer el diario de copia: {e}")
+        return None
+    if estado is None or estado['origen'] != os.path.abspath(origen):
+        return None
+    return estado
+
+
+def reanudar_respaldo(destino, canal, medidor=None, estado=None, limitador=None):
+    """
+    Reanuda una copia interrumpida a partir de su diario, sin analizar ni comparar de
+    nuevo: solo se copian los archivos que no llegaron a terminarse.
+
+    Args:
+        destino: Ruta de destino (donde está el diario)
+        canal: CanalProgreso donde se publica el avance
+        medidor: Medidor de rendimiento (si no se indica se crea uno nuevo)
+        estado: Estado del diario ya leído (ver copia_interrumpida)
+        limitador: Limitador de la copia (ver ejecutar_respaldo)
+
+    Returns:
+        Diccionario con el resultado (ver ejecutar_respaldo)
+    """
+    if estado is None:
+        diario = DiarioCopia(destino)
+        estado = diario.cargar() if diario.existe() else None
+        if estado is None:
+            raise ValueError(f"No hay ninguna copia interrumpida que reanudar en {destino}")
+    if not os.path.isdir(estado['origen']):
+        raise ValueError(f"La ruta de origen de la copia interrumpida ya no existe: {estado['origen']}")
+
+    opciones = obtener_opciones_backup(estado['opciones'])
+    if medidor is None:
+        medidor = Medidor(opciones['profile'], opciones['trace_memory'])
+    indice_origen = indice_origen_diario(estado)
+
+    with medidor.fase("indice_destino"):
+        indice_destino, catalogo = obtener_indice_destino(destino, True)
+    try:
+        with medidor.fase("comparacion") as fase:
+            pendientes, copiados = pendientes_diario(estado, destino)
+            fase['archivos'] = len(pendientes)
+        # Los últimos registros del catálogo pudieron no confirmarse antes de la interrupción
+        for ruta, _, tamano in copiados:
+            mtime = estado['mtimes'].get(ruta, 0)
+            hecho = estado['hechos'][ruta]
+            catalogo.registrar_archivo(ruta, tamano, mtime, hecho[1], hecho[3])
+            indice_destino.actualizar_archivo(ruta, tamano, mtime)
+
+        canal.establecer_total(sum(tamano for _, _, tamano in pendientes))
+        return ejecutar_respaldo(
+            estado['origen'], destino, estado['elementos'], pendientes, estado['tamano_destino_antes'],
+            opciones, canal, indice_origen, indice_destino, catalogo, medidor, copiados_previos=copiados,
+            limitador=limitador
+        )
+    finally:
+        catalogo.cerrar()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Cola de trabajos de respaldo con ejecución simultánea por disco
+
+Un trabajo tiene el mismo formato que los archivos de trabajo de la línea de comandos
+('origen', 'destino', 'elementos' y 'opciones'; ver cli.cargar_trabajo) más 'id',
+'nombre', 'estado' y 'resultado'. La cola se guarda en un archivo JSON (opción
+'queue_file'), de modo que los trabajos pendientes se conservan al cerrar la aplicación;
+un trabajo que quedó a medias vuelve a estar pendiente y, al ejecutarlo, reanuda su
+copia desde el diario del destino.
+
+El planificador ejecuta a la vez los trabajos que usan discos físicos distintos y pone
+en fila los que comparten alguno (en el origen o en el destino): dos copias sobre el
+mismo disco compiten por él y tardan más que una detrás de otra. Al terminar se genera
+un informe resumen con el resultado de todos los trabajos.
+
+Uso desde la línea de comandos:
+    python -m app encolar ORIGEN DESTINO [--nombre NOMBRE] [opciones de respaldar]
+    python -m app cola listar|ejecutar|limpiar|quitar [--id ID] [--simultaneos 4] [--por-dispositivo 1]
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import datetime
+import threading
+import collections
+
+from app.config import DEFAULT_CONFIG, obtener_opciones_backup
+
+ESTADOS_TRABAJO = ('pendiente', 'en_curso', 'completado', 'error')
+
+
+def _ruta_existente(ruta):
+    """La propia ruta o, si todavía no existe (un destino nuevo), su primer padre existente"""
+    ruta = os.path.abspath(ruta)
+    while not os.path.exists(ruta):
+        padre = os.path.dirname(ruta)
+        if padre == ruta:
+            break
+        ruta = padre
+    return ruta
+
+
+def _discos_sysfs(ruta_sysfs):
+    """Discos completos bajo un dispositivo de /sys/class/block (partición, LVM, RAID...)"""
+    if os.path.exists(os.path.join(ruta_sysfs, "partition")):
+        ruta_sysfs = os.path.dirname(ruta_sysfs)
+    carpeta_esclavos = os.path.join(ruta_sysfs, "slaves")
+    esclavos = os.listdir(carpeta_esclavos) if os.path.isdir(carpeta_esclavos) else []
+    if not esclavos:
+        return {os.path.basename(ruta_sysfs)}
+    discos = set()
+    for esclavo in esclavos:
+        discos |= _discos_sysfs(os.path.realpath(os.path.join(carpeta_esclavos, esclavo)))
+    return discos
+
+
+def dispositivos_fisicos(ruta):
+    """
+    Identificadores de los discos físicos que contienen una ruta. En Linux se busca en
+    /sys el disco de la partición (sda para sda1) y los discos bajo LVM o RAID; en el
+    resto de sistemas, o si no es un dispositivo de bloques (red, tmpfs), se usa st_dev.
+
+    Returns:
+        frozenset de identificadores
+    """
+    st_dev = os.stat(_ruta_existente(ruta)).st_dev
+    if sys.platform.startswith("linux"):
+        ruta_sysfs = os.path.realpath(f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}")
+        if os.path.isdir(ruta_sysfs):
+            try:
+                return frozenset(_discos_sysfs(ruta_sysfs))
+            except OSError:
+                pass
+    return frozenset([f"dev:{st_dev}"])
+
+
+def dispositivos_trabajo(trabajo):
+    """Discos físicos que usa un trabajo (los de su origen y los de su destino)"""
+    return dispositivos_fisicos(trabajo['origen']) | dispositivos_fisicos(trabajo['destino'])
+
+
+class ColaTrabajos:
+    """Cola persistente de trabajos (ver el encabezado del módulo); segura entre hilos"""
+
+    def __init__(self, ruta=None):
+        """
+        Args:
+            ruta: Archivo JSON de la cola (por defecto DEFAULT_CONFIG['jobs']['queue_file'])
+        """
+        self.ruta = ruta or DEFAULT_CONFIG['jobs']['queue_file']
+        self._cerrojo = threading.Lock()
+        self.trabajos = self._cargar()
+
+    def _cargar(self):
+        if not os.path.exists(self.ruta):
+            return []
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            trabajos = json.load(f)
+        for trabajo in trabajos:
+            # La aplicación se cerró durante el trabajo: se reanudará desde su diario
+            if trabajo['estado'] == 'en_curso':
+                trabajo['estado'] = 'pendiente'
+        return trabajos
+
+    def _guardar(self):
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self.trabajos, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, self.ruta)
+
+    def agregar(self, trabajo, nombre=None):
+        """
+        Añade un trabajo pendiente al final de la cola.
+
+        Args:
+            trabajo: Diccionario con 'origen', 'destino' y, opcionalmente, 'elementos' y 'opciones'
+            nombre: Nombre para los informes (por defecto "<carpeta de origen> -> <destino>")
+
+        Returns:
+            El trabajo añadido (con su 'id')
+        """
+        if not trabajo.get('origen') or not trabajo.get('destino'):
+            raise ValueError("El trabajo necesita un origen y un destino")
+        origen = os.path.abspath(trabajo['origen'])
+        destino = os.path.abspath(trabajo['destino'])
+        nuevo = {
+            'id': uuid.uuid4().hex[:8],
+            'nombre': nombre or trabajo.get('nombre') or f"{os.path.basename(origen)} -> {destino}",
+            'origen': origen,
+            'destino': destino,
+            'elementos': list(trabajo.get('elementos') or []),
+            'opciones': dict(trabajo.get('opciones') or {}),
+            'estado': 'pendiente',
+            'creado': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'resultado': None
+        }
+        with self._cerrojo:
+            self.trabajos.append(nuevo)
+            self._guardar()
+        return nuevo
+
+    def obtener(self, id_trabajo):
+        """Devuelve una copia del trabajo con ese id o None"""
+        with self._cerrojo:
+            for trabajo in self.trabajos:
+                if trabajo['id'] == id_trabajo:
+                    return dict(trabajo)
+        return None
+
+    def pendientes(self):
+        """Copias de los trabajos pendientes en el orden de la cola"""
+        with self._cerrojo:
+            return [dict(t) for t in self.trabajos if t['estado'] == 'pendiente']
+
+    def actualizar(self, id_trabajo, **campos):
+        """Cambia campos de un trabajo (p. ej. estado y resultado) y guarda la cola"""
+        with self._cerrojo:
+            for trabajo in self.trabajos:
+                if trabajo['id'] == id_trabajo:
+                    trabajo.update(campos)
+                    self._guardar()
+                    return True
+        return False
+
+    def quitar(self, id_trabajo):
+        """Quita un trabajo que no esté en curso; devuelve True si existía"""
+        with self._cerrojo:
+            restantes = [t for t in self.trabajos if t['id'] != id_trabajo or t['estado'] == 'en_curso']
+            if len(restantes) == len(self.trabajos):
+                return False
+            self.trabajos = restantes
+            self._guardar()
+        return True
+
+    def limpiar(self):
+        """Quita los trabajos terminados (completados o con error); devuelve cuántos"""
+        with self._cerrojo:
+            restantes = [t for t in self.trabajos if t['estado'] in ('pendiente', 'en_curso')]
+            quitados = len(self.trabajos) - len(restantes)
+            self.trabajos = restantes
+            self._guardar()
+        return quitados
+
+
+def ejecutar_trabajo(trabajo, canal=None):
+    """
+    Ejecuta un trabajo como lo haría "python -m app respaldar" (análisis, comparación,
+    copia, manifiesto e informe) o reanuda su copia si quedó interrumpida.
+
+    Args:
+        trabajo: Trabajo de la cola
+        canal: CanalProgreso donde se publica el avance (opcional)
+
+    Returns:
+        Diccionario con 'archivos', 'bytes', 'fallidos' (archivos que no superaron la
+        verificación), 'informe' y 'manifiesto' (None si no había nada que copiar)
+    """
+    from app.indice import escanear_arbol
+    from app.progreso import CanalProgreso
+    from app.rendimiento import Medidor
+    from app.respaldo import (seleccion_completa, preparar_destino, planificar_respaldo, ejecutar_respaldo,
+                              copia_interrumpida, reanudar_respaldo)
+
+    origen = trabajo['origen']
+    destino = trabajo['destino']
+    if not os.path.isdir(origen):
+        raise ValueError(f"La ruta de origen no es válida: {origen}")
+    os.makedirs(destino, exist_ok=True)
+    canal = canal or CanalProgreso()
+
+    estado = copia_interrumpida(origen, destino)
+    if estado is not None:
+        resultado = reanudar_respaldo(destino, canal, estado=estado)
+    else:
+        opciones = obtener_opciones_backup(trabajo.get('opciones'))
+        medidor = Medidor(opciones['profile'], opciones['trace_memory'])
+        with medidor.fase("escaneo"):
+            indice_origen = escanear_arbol(origen)
+        elementos_seleccionados = trabajo.get('elementos') or seleccion_completa(indice_origen)
+        with medidor.fase("indice_destino"):
+            indice_destino, catalogo, tamaño_destino_antes = preparar_destino(destino, opciones)
+        try:
+            with medidor.fase("comparacion"):
+                elementos_a_copiar = planificar_respaldo(origen, elementos_seleccionados, indice_origen,
+                                                         indice_destino, opciones)
+            if not elementos_a_copiar:
+                medidor.detener()
+                return {'archivos': 0, 'bytes': 0, 'fallidos': 0, 'informe': None, 'manifiesto': None}
+            canal.establecer_total(sum(tamano for _, _, tamano in elementos_a_copiar))
+            resultado = ejecutar_respaldo(
+                origen, destino, elementos_seleccionados, elementos_a_copiar, tamaño_destino_antes, opciones,
+                canal, indice_origen, indice_destino, catalogo, medidor
+            )
+        finally:
+            if catalogo is not None:
+                catalogo.cerrar()
+    resultado['medidor'].detener()
+
+    archivos = [e for e in resultado['elementos_copiados'] if e[1] == '[ARCHIVO]']
+    return {
+        'archivos': len(archivos),
+        'bytes': sum(tamano for _, _, tamano in archivos),
+        'fallidos': len(resultado['detalles'].get('verificacion', {}).get('fallidos', [])),
+        'informe': os.path.abspath(resultado['informe']),
+        'manifiesto': os.path.abspath(resultado['manifiesto'])
+    }
+
+
+def ejecutar_cola(cola, max_simultaneos=None, por_dispositivo=None, callback=None):
+    """
+    Ejecuta los trabajos pendientes de la cola. Los trabajos empiezan en el orden de la
+    cola, pero uno cuyos discos están libres adelanta a otro que espera por el suyo.
+
+    Args:
+        cola: ColaTrabajos
+        max_simultaneos: Trabajos simultáneos como máximo (por defecto 'max_concurrent')
+        por_dispositivo: Trabajos simultáneos por disco físico (por defecto 'per_device')
+        callback: Función que recibe (trabajo, evento) con evento 'inicio' o 'fin'; se
+            llama desde los hilos de los trabajos
+
+    Returns:
+        Tupla (trabajos, segundos) con los trabajos ejecutados (con su estado y resultado)
+        y la duración total
+    """
+    if max_simultaneos is None:
+        max_simultaneos = DEFAULT_CONFIG['jobs']['max_concurrent']
+    if por_dispositivo is None:
+        por_dispositivo = DEFAULT_CONFIG['jobs']['per_device']
+    # Con un límite menor que 1 no empezaría ningún trabajo y la espera no acabaría nunca
+    if max_simultaneos < 1 or por_dispositivo < 1:
+        raise ValueError(f"Los trabajos simultáneos deben ser al menos 1: "
+                         f"{max_simultaneos} en total, {por_dispositivo} por disco")
+    inicio_cola = time.monotonic()
+    ejecutados = []
+    esperando = []
+    dispositivos = {}
+    for trabajo in cola.pendientes():
+        try:
+            dispositivos[trabajo['id']] = dispositivos_trabajo(trabajo)
+            esperando.append(trabajo)
+        except OSError as e:
+            trabajo.update(estado='error', resultado={'error': f"No se puede acceder a la ruta: {e}"})
+            cola.actualizar(trabajo['id'], estado=trabajo['estado'], resultado=trabajo['resultado'])
+            ejecutados.append(trabajo)
+
+    en_uso = collections.Counter()
+    en_curso = {}
+    terminados = []
+    condicion = threading.Condition()
+
+    def ejecutar(trabajo):
+        if callback:
+            callback(trabajo, 'inicio')
+        inicio = time.monotonic()
+        try:
+            resultado = ejecutar_trabajo(trabajo)
+            estado = 'completado'
+        except Exception as e:
+            resultado = {'error': str(e)}
+            estado = 'error'
+        resultado['inicio'] = trabajo['inicio']
+        resultado['segundos'] = time.monotonic() - inicio
+        resultado['dispositivos'] = sorted(dispositivos[trabajo['id']])
+        trabajo.update(estado=estado, resultado=resultado)
+        cola.actualizar(trabajo['id'], estado=estado, resultado=resultado)
+        if callback:
+            callback(trabajo, 'fin')
+        with condicion:
+            terminados.append(trabajo)
+            condicion.notify()
+
+    while esperando or en_curso:
+        for trabajo in list(esperando):
+            if len(en_curso) >= max_simultaneos:
+                break
+            usados = dispositivos[trabajo['id']]
+            if any(en_uso[d] >= por_dispositivo for d in usados):
+                continue
+            esperando.remove(trabajo)
+            en_uso.update(usados)
+            trabajo['inicio'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            cola.actualizar(trabajo['id'], estado='en_curso')
+            hilo = threading.Thread(target=ejecutar, args=(trabajo,), daemon=True)
+            en_curso[trabajo['id']] = hilo
+            hilo.start()
+
+        with condicion:
+            while not terminados:
+                condicion.wait()
+            acabados = list(terminados)
+            terminados.clear()
+        for trabajo in acabados:
+            en_curso.pop(trabajo['id']).join()
+            en_uso.subtract(dispositivos[trabajo['id']])
+            ejecutados.append(trabajo)
+
+    return (ejecutados, time.monotonic() - inicio_cola)
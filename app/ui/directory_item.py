@@ -10,8 +10,9 @@ from app.utils import convertir_tamano
 
 class DirectorioItem(ctk.CTkFrame):
     """Widget personalizado para representar un directorio o archivo en la lista de selección"""
-    def __init__(self, master, ruta, es_dir, tamano, profundidad=0, **kwargs):
+    def __init__(self, master, ruta, es_dir, tamano, profundidad=0, comando=None, **kwargs):
         super().__init__(master, **kwargs)
+        self.comando = comando  # Función que recibe el propio item al cambiar la casilla
         self.ruta = ruta
         self.es_dir = es_dir
         self.tamano = tamano
@@ -29,7 +30,7 @@ class DirectorioItem(ctk.CTkFrame):
         
         # Checkbox para seleccionar/deseleccionar
         self.checkbox = ctk.CTkCheckBox(self, text="", variable=self.var_seleccionado,
-                                         onvalue=True, offvalue=False)
+                                         onvalue=True, offvalue=False, command=self._al_cambiar)
         self.checkbox.grid(row=0, column=0, padx=(padding, 5), pady=2, sticky="w")
         
         # Icono y nombre
@@ -42,6 +43,23 @@ class DirectorioItem(ctk.CTkFrame):
         self.label_tamano = ctk.CTkLabel(self, text=tamano_str, width=80)
         self.label_tamano.grid(row=0, column=2, padx=5, pady=2, sticky="e")
 
+    def _al_cambiar(self):
+        if self.comando is not None:
+            self.comando(self)
+
+    def asignar(self, ruta, es_dir, tamano, profundidad, seleccionado):
+        """Reutiliza el widget para mostrar otro elemento (lista virtualizada)"""
+        self.ruta = ruta
+        self.es_dir = es_dir
+        self.tamano = tamano
+        self.profundidad = profundidad
+        self.nombre = os.path.basename(ruta) or ruta
+        self.var_seleccionado.set(seleccionado)
+        self.checkbox.grid_configure(padx=(20 * profundidad, 5))
+        icono = "📁" if es_dir else "📄"
+        self.label_nombre.configure(text=f"{icono} {self.nombre}")
+        self.label_tamano.configure(text=convertir_tamano(tamano) if tamano is not None else "")
+
     def get_estado(self):
         """Devuelve el estado de selección del elemento"""
         return self.var_seleccionado.get()
\ No newline at end of file
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Lista virtualizada de carpetas para la selección
+"""
+
+import customtkinter as ctk
+
+from app.ui.directory_item import DirectorioItem
+
+
+class ModeloSeleccion:
+    """
+    Datos de la lista de selección (rutas, tamaños y casillas) sin ningún widget asociado.
+    El tamaño es None mientras no se conoce el total acumulado de la carpeta.
+    """
+
+    def __init__(self):
+        self.limpiar()
+
+    def limpiar(self):
+        """Elimina todos los elementos"""
+        self.rutas = []
+        self.es_dir = []
+        self.tamanos = []
+        self.profundidades = []
+        self.seleccionados = []
+        self.posiciones = {}
+
+    def __len__(self):
+        return len(self.rutas)
+
+    def agregar(self, ruta, es_dir, tamano, profundidad, seleccionado=True):
+        """Añade un elemento al final de la lista"""
+        self.posiciones[ruta] = len(self.rutas)
+        self.rutas.append(ruta)
+        self.es_dir.append(es_dir)
+        self.tamanos.append(tamano)
+        self.profundidades.append(profundidad)
+        self.seleccionados.append(seleccionado)
+
+    def elemento(self, posicion):
+        """Devuelve (ruta, es_dir, tamaño, profundidad, seleccionado) de una posición"""
+        return (self.rutas[posicion], self.es_dir[posicion], self.tamanos[posicion],
+                self.profundidades[posicion], self.seleccionados[posicion])
+
+    def actualizar_tamano(self, ruta, tamano):
+        """Actualiza el tamaño de un elemento; devuelve False si no está en la lista"""
+        posicion = self.posiciones.get(ruta)
+        if posicion is None:
+            return False
+        self.tamanos[posicion] = tamano
+        return True
+
+    def marcar(self, ruta, seleccionado):
+        """Cambia el estado de la casilla de un elemento"""
+        posicion = self.posiciones.get(ruta)
+        if posicion is not None:
+            self.seleccionados[posicion] = seleccionado
+
+    def marcar_todos(self, seleccionado):
+        """Cambia el estado de todas las casillas"""
+        self.seleccionados = [seleccionado] * len(self.rutas)
+
+    def obtener_seleccionados(self):
+        """Devuelve las rutas marcadas en el orden de la lista"""
+        return [ruta for ruta, marcado in zip(self.rutas, self.seleccionados) if marcado]
+
+
+class ListaVirtual(ctk.CTkFrame):
+    """
+    Lista con desplazamiento que solo crea widgets para las filas visibles.
+    Al desplazarse, las mismas filas (DirectorioItem) se reasignan a otros elementos
+    del modelo, de modo que el coste no depende del número de carpetas.
+    """
+
+    def __init__(self, master, alto_fila=34, **kwargs):
+        super().__init__(master, **kwargs)
+        self.modelo = ModeloSeleccion()
+        self.alto_fila = alto_fila
+        self.primera = 0  # Posición del modelo que se muestra en la primera fila
+        self.filas = []
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.cuerpo = ctk.CTkFrame(self, fg_color="transparent")
+        self.cuerpo.grid(row=0, column=0, sticky="nsew")
+        self.barra = ctk.CTkScrollbar(self, command=self._desplazar)
+        self.barra.grid(row=0, column=1, sticky="ns")
+
+        self.cuerpo.bind("<Configure>", lambda e: self._ajustar_filas())
+        self.bind_all("<MouseWheel>", self._rueda, add="+")
+        self.bind_all("<Button-4>", self._rueda, add="+")
+        self.bind_all("<Button-5>", self._rueda, add="+")
+
+    def _filas_visibles(self):
+        return max(1, self.cuerpo.winfo_height() // self.alto_fila)
+
+    def _ajustar_filas(self):
+        """Crea las filas que faltan para cubrir la altura visible"""
+        necesarias = self._filas_visibles() + 1
+        while len(self.filas) < necesarias:
+            fila = DirectorioItem(self.cuerpo, "", True, None, comando=self._al_marcar, height=self.alto_fila - 4)
+            self.filas.append(fila)
+        self.refrescar()
+
+    def _al_marcar(self, fila):
+        self.modelo.marcar(fila.ruta, fila.get_estado())
+
+    def refrescar(self):
+        """Vuelve a asignar las filas visibles a partir de la posición actual"""
+        total = len(self.modelo)
+        visibles = self._filas_visibles()
+        self.primera = max(0, min(self.primera, total - visibles))
+        for i, fila in enumerate(self.filas):
+            posicion = self.primera + i
+            if posicion < total:
+                fila.asignar(*self.modelo.elemento(posicion))
+                fila.place(x=0, y=i * self.alto_fila, relwidth=1.0, height=self.alto_fila - 4)
+            else:
+                fila.place_forget()
+        if total > visibles:
+            self.barra.set(self.primera / total, (self.primera + visibles) / total)
+        else:
+            self.barra.set(0.0, 1.0)
+
+    def _desplazar(self, accion, cantidad, unidad=None):
+        """Responde a la barra de desplazamiento ('moveto' o 'scroll')"""
+        if accion == "moveto":
+            self.primera = int(float(cantidad) * len(self.modelo))
+        else:
+            paso = self._filas_visibles() if unidad == "pages" else 1
+            self.primera += int(cantidad) * paso
+        self.refrescar()
+
+    def _rueda(self, event):
+        # Solo desplazar si el puntero está sobre la lista
+        if not str(event.widget).startswith(str(self)):
+            return
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self._desplazar("scroll", -3)
+        else:
+            self._desplazar("scroll", 3)
+
+    def limpiar(self):
+        """Elimina todos los elementos de la lista"""
+        self.modelo.limpiar()
+        self.primera = 0
+        self.refrescar()
+
+    def agregar_lote(self, elementos):
+        """Añade elementos (ruta, es_dir, tamaño, profundidad) y actualiza solo las filas visibles"""
+        for ruta, es_dir, tamano, profundidad in elementos:
+            self.modelo.agregar(ruta, es_dir, tamano, profundidad)
+        self.refrescar()
+
+    def marcar_todos(self, seleccionado):
+        """Marca o desmarca todos los elementos"""
+        self.modelo.marcar_todos(seleccionado)
+        self.refrescar()
@@ -5,16 +5,23 @@ PyRespaldos - Ventana principal de la aplicación
 """
 
 import os
+import time
 import threading
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import tkinter as tk
 
-from app.utils import comparar_origen_destino, convertir_tamano
-from app.ui.directory_item import DirectorioItem
-from app.backup import copiar_con_robocopy, copiar_archivos_manualmente, copiar_archivo_manual
-from app.reporte import generar_reporte_html
-from app.email_sender import probar_conexion_smtp, enviar_informe_por_correo
+from app.utils import convertir_tamano
+from app.config import DEFAULT_CONFIG, obtener_opciones_backup
+from app.verificacion import ALGORITMOS_HASH
+from app.motor_copia import POLITICAS_FSYNC
+from app.compresion import ALGORITMOS_COMPRESION
+from app.ui.lista_virtual import ListaVirtual
+from app.progreso import CanalProgreso, INTERVALO_MS
+
+# Arriba solo lo necesario para construir la ventana. El respaldo (catálogo, delta, informe...),
+# la vigilancia, la cola de trabajos, los límites y el correo se importan en los manejadores
+# que los usan, igual que en cli.py, para que la ventana aparezca cuanto antes
 
 class PyRespaldosApp(ctk.CTk):
     """Aplicación principal de PyRespaldos con CustomTkinter"""
@@ -30,7 +37,14 @@ class PyRespaldosApp(ctk.CTk):
         # Variables de la aplicación
         self.ruta_origen = ""
         self.ruta_destino = ""
-        self.elementos_mostrados = {}  # Para mantener referencia a los elementos mostrados
+        self.indice_origen = None  # Índice del origen obtenido al analizar
+        self.indice_destino = None  # Índice del destino obtenido al iniciar la copia
+        self.fases_analisis = []  # Tiempos del escaneo del origen (ver app.rendimiento)
+        self.catalogo = None  # Catálogo persistente del destino
+        self.bandeja = None  # Bandeja de salida de correo (se crea al enviar el primer informe)
+        self.limitador = None  # Limitador de la copia en curso (ver aplicar_limites)
+        self.detener_vigilancia = None  # threading.Event de la copia continua en curso
+        self.cola = None  # Cola de trabajos (se abre al usarla por primera vez)
         
         # Sección superior - Selección de rutas
         self.crear_seccion_rutas()
@@ -73,12 +87,46 @@ class PyRespaldosApp(ctk.CTk):
         self.var_multihilo = ctk.BooleanVar(value=True)
         self.var_verificar = ctk.BooleanVar(value=True)
         self.var_enviar_correo = ctk.BooleanVar(value=False)
+        self.var_catalogo = ctk.BooleanVar(value=True)
+        self.var_algoritmo_hash = ctk.StringVar(value="blake2b")
+        self.var_delta = ctk.BooleanVar(value=False)
+        self.var_instantaneas = ctk.BooleanVar(value=False)
+        self.var_almacen = ctk.BooleanVar(value=False)
+        self.var_empaquetar = ctk.BooleanVar(value=False)
+        self.var_compresion = ctk.StringVar(value="none")
+        self.var_fsync = ctk.StringVar(value=obtener_opciones_backup()['fsync_policy'])
         
         # Primera fila de opciones
         ctk.CTkCheckBox(frame_opciones, text="Usar múltiples hilos (más rápido)", variable=self.var_multihilo).grid(row=0, column=0, padx=10, pady=5, sticky="w")
         ctk.CTkCheckBox(frame_opciones, text="Verificar archivos copiados", variable=self.var_verificar).grid(row=0, column=1, padx=10, pady=5, sticky="w")
         ctk.CTkCheckBox(frame_opciones, text="Enviar informe por correo", variable=self.var_enviar_correo, command=self.toggle_email_options).grid(row=0, column=2, padx=10, pady=5, sticky="w")
         
+        # Opciones avanzadas de copia
+        self.frame_avanzadas = ctk.CTkFrame(frame_opciones, fg_color="transparent")
+        self.frame_avanzadas.grid(row=2, column=0, columnspan=3, padx=0, pady=0, sticky="ew")
+        ctk.CTkCheckBox(self.frame_avanzadas, text="Usar catálogo del destino (sin reescanear)", variable=self.var_catalogo).grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        ctk.CTkLabel(self.frame_avanzadas, text="Algoritmo de verificación:").grid(row=0, column=1, padx=(10, 5), pady=5, sticky="e")
+        ctk.CTkOptionMenu(self.frame_avanzadas, values=list(ALGORITMOS_HASH), variable=self.var_algoritmo_hash, width=110).grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        ctk.CTkCheckBox(self.frame_avanzadas, text="Transferencia delta (archivos grandes)", variable=self.var_delta).grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        ctk.CTkCheckBox(self.frame_avanzadas, text="Modo instantáneas (una versión por copia)", variable=self.var_instantaneas).grid(row=1, column=1, columnspan=2, padx=10, pady=5, sticky="w")
+        ctk.CTkCheckBox(self.frame_avanzadas, text="Destino como almacén deduplicado", variable=self.var_almacen).grid(row=2, column=0, padx=10, pady=5, sticky="w")
+        ctk.CTkCheckBox(self.frame_avanzadas, text="Empaquetar archivos pequeños (un contenedor por carpeta)", variable=self.var_empaquetar).grid(row=3, column=0, padx=10, pady=5, sticky="w")
+        ctk.CTkLabel(self.frame_avanzadas, text="Compresión:").grid(row=3, column=1, padx=(10, 5), pady=5, sticky="e")
+        ctk.CTkOptionMenu(self.frame_avanzadas, values=list(ALGORITMOS_COMPRESION), variable=self.var_compresion, width=110).grid(row=3, column=2, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(self.frame_avanzadas, text="Sincronizar con el disco:").grid(row=2, column=1, padx=(10, 5), pady=5, sticky="e")
+        ctk.CTkOptionMenu(self.frame_avanzadas, values=list(POLITICAS_FSYNC), variable=self.var_fsync, width=110).grid(row=2, column=2, padx=5, pady=5, sticky="w")
+        
+        # Límites de velocidad (admiten K, M y G; vacío = sin límite); se pueden cambiar durante la copia
+        frame_limites = ctk.CTkFrame(self.frame_avanzadas, fg_color="transparent")
+        frame_limites.grid(row=4, column=0, columnspan=3, padx=0, pady=0, sticky="w")
+        ctk.CTkLabel(frame_limites, text="Límite de bytes/s:").grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        self.entry_limite_bytes = ctk.CTkEntry(frame_limites, width=90, placeholder_text="p. ej. 10M")
+        self.entry_limite_bytes.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(frame_limites, text="Archivos/s:").grid(row=0, column=2, padx=(10, 5), pady=5, sticky="w")
+        self.entry_limite_archivos = ctk.CTkEntry(frame_limites, width=70)
+        self.entry_limite_archivos.grid(row=0, column=3, padx=5, pady=5, sticky="w")
+        ctk.CTkButton(frame_limites, text="Aplicar", width=80, command=self.aplicar_limites).grid(row=0, column=4, padx=10, pady=5, sticky="w")
+        
         # Segunda fila para opciones de correo
         self.frame_email = ctk.CTkFrame(frame_opciones)
         self.frame_email.grid(row=1, column=0, columnspan=3, padx=10, pady=5, sticky="ew")
@@ -112,9 +160,15 @@ class PyRespaldosApp(ctk.CTk):
         # Botón para probar configuración de correo
         ctk.CTkButton(self.frame_email, text="Probar conexión", command=self.probar_conexion_email).grid(row=2, column=2, columnspan=2, padx=5, pady=5, sticky="ew")
         
+        # Servidores locales o de pruebas pueden no admitir STARTTLS ni autenticación
+        self.var_smtp_tls = ctk.BooleanVar(value=DEFAULT_CONFIG['email']['use_tls'])
+        self.var_smtp_login = ctk.BooleanVar(value=DEFAULT_CONFIG['email']['use_login'])
+        ctk.CTkCheckBox(self.frame_email, text="Usar STARTTLS", variable=self.var_smtp_tls).grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+        ctk.CTkCheckBox(self.frame_email, text="Iniciar sesión", variable=self.var_smtp_login).grid(row=3, column=2, columnspan=2, padx=5, pady=5, sticky="w")
+        
         # Botón de analizar
         frame_botones = ctk.CTkFrame(frame_opciones)
-        frame_botones.grid(row=2, column=0, columnspan=3, padx=10, pady=5, sticky="ew")
+        frame_botones.grid(row=3, column=0, columnspan=3, padx=10, pady=5, sticky="ew")
         frame_botones.grid_columnconfigure(0, weight=1)
         
         ctk.CTkButton(frame_botones, text="Analizar", command=self.analizar_directorios).pack(padx=10, pady=5, fill="x")
@@ -128,10 +182,9 @@ class PyRespaldosApp(ctk.CTk):
         self.label_total = ctk.CTkLabel(frame_titulo, text="")
         self.label_total.pack(side="right", padx=10, pady=5)
         
-        # Frame con scroll para la lista de archivos
-        self.frame_contenedor = ctk.CTkScrollableFrame(self)
-        self.frame_contenedor.grid(row=3, column=0, padx=10, pady=10, sticky="nsew")
-        self.frame_contenedor.grid_columnconfigure(0, weight=1)
+        # Lista virtualizada: solo se crean widgets para las filas visibles
+        self.lista = ListaVirtual(self)
+        self.lista.grid(row=3, column=0, padx=10, pady=10, sticky="nsew")
 
     def crear_seccion_acciones(self):
         """Crea la sección para los botones de acción"""
@@ -141,11 +194,18 @@ class PyRespaldosApp(ctk.CTk):
         frame_acciones.grid_columnconfigure(0, weight=1)
         frame_acciones.grid_columnconfigure(1, weight=1)
         frame_acciones.grid_columnconfigure(2, weight=1)
+        frame_acciones.grid_columnconfigure(3, weight=1)
         
         ctk.CTkButton(frame_acciones, text="Seleccionar Todo", command=self.seleccionar_todo).grid(row=0, column=0, padx=10, pady=10, sticky="ew")
         ctk.CTkButton(frame_acciones, text="Deseleccionar Todo", command=self.deseleccionar_todo).grid(row=0, column=1, padx=10, pady=10, sticky="ew")
         self.btn_copiar = ctk.CTkButton(frame_acciones, text="Iniciar Copia", command=self.iniciar_copia, state="disabled")
         self.btn_copiar.grid(row=0, column=2, padx=10, pady=10, sticky="ew")
+        self.btn_vigilar = ctk.CTkButton(frame_acciones, text="Vigilar cambios", command=self.alternar_vigilancia, state="disabled")
+        self.btn_vigilar.grid(row=0, column=3, padx=10, pady=10, sticky="ew")
+        self.btn_encolar = ctk.CTkButton(frame_acciones, text="Añadir a la cola", command=self.agregar_a_cola, state="disabled")
+        self.btn_encolar.grid(row=1, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="ew")
+        self.btn_ejecutar_cola = ctk.CTkButton(frame_acciones, text="Ejecutar cola de trabajos", command=self.ejecutar_cola_trabajos)
+        self.btn_ejecutar_cola.grid(row=1, column=2, columnspan=2, padx=10, pady=(0, 10), sticky="ew")
 
     def crear_seccion_estado(self):
         """Crea la sección para mostrar el estado y progreso de la copia"""
@@ -159,6 +219,10 @@ class PyRespaldosApp(ctk.CTk):
         self.barra_progreso = ctk.CTkProgressBar(frame_estado)
         self.barra_progreso.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
         self.barra_progreso.set(0)
+        
+        # Progreso de cada hilo trabajador durante la copia
+        self.label_trabajadores = ctk.CTkLabel(frame_estado, text="", justify="left")
+        self.label_trabajadores.grid(row=2, column=0, padx=10, pady=(0, 5), sticky="w")
 
     def toggle_email_options(self):
         """Muestra u oculta las opciones de correo según el estado del checkbox"""
@@ -167,22 +231,80 @@ class PyRespaldosApp(ctk.CTk):
         else:
             self.frame_email.grid_remove()
             
-    def probar_conexion_email(self):
-        """Prueba la conexión al servidor SMTP con las credenciales proporcionadas"""
-        correo = self.entry_email.get().strip()
-        password = self.entry_password.get().strip()
-        servidor = self.entry_smtp.get().strip()
-        puerto = self.entry_puerto.get().strip()
-        
-        if not correo or not password or not servidor or not puerto:
+    def _configuracion_correo(self):
+        """Lee la configuración SMTP de la interfaz (debe llamarse desde el hilo principal)"""
+        return {
+            'correo': self.entry_email.get().strip(),
+            'password': self.entry_password.get().strip(),
+            'servidor': self.entry_smtp.get().strip(),
+            'puerto': self.entry_puerto.get().strip(),
+            'usar_tls': self.var_smtp_tls.get(),
+            'autenticar': self.var_smtp_login.get(),
+            'timeout': DEFAULT_CONFIG['email']['timeout']
+        }
+    
+    def _validar_configuracion_correo(self, configuracion):
+        """Comprueba que están los campos necesarios; muestra un error si falta alguno"""
+        faltan = not configuracion['correo'] or not configuracion['servidor'] or not configuracion['puerto']
+        if configuracion['autenticar'] and not configuracion['password']:
+            faltan = True
+        if faltan:
             messagebox.showerror("Error", "Por favor completa todos los campos de configuración de correo")
+        return not faltan
+    
+    def _preparar_envio_correo(self):
+        """
+        Lee la configuración de correo si está activado el envío del informe.
+        
+        Returns:
+            Tupla (correcto, envio_correo) con envio_correo = (bandeja, destinatario) o None
+        """
+        if not self.var_enviar_correo.get():
+            return (True, None)
+        configuracion_correo = self._configuracion_correo()
+        destinatario = self.entry_destinatario.get().strip()
+        if not self._validar_configuracion_correo(configuracion_correo):
+            return (False, None)
+        if not destinatario:
+            messagebox.showerror("Error", "Indica el destinatario del informe")
+            return (False, None)
+        return (True, (self._obtener_bandeja(configuracion_correo), destinatario))
+    
+    def _obtener_bandeja(self, configuracion):
+        """Devuelve la bandeja de salida (creándola la primera vez) con la configuración indicada"""
+        def resultado(id_mensaje, exito, mensaje):
+            texto = "Informe enviado por correo." if exito else f"Correo pendiente: {mensaje}"
+            self.after(0, lambda: self.label_estado.configure(text=texto))
+        
+        if self.bandeja is None:
+            from app.bandeja_salida import BandejaSalida
+            self.bandeja = BandejaSalida(configuracion, callback_resultado=resultado)
+        else:
+            self.bandeja.configurar(configuracion)
+        self.bandeja.iniciar()
+        return self.bandeja
+            
+    def probar_conexion_email(self):
+        """Prueba la conexión al servidor SMTP en segundo plano con las credenciales proporcionadas"""
+        configuracion = self._configuracion_correo()
+        if not self._validar_configuracion_correo(configuracion):
             return
         
         self.label_estado.configure(text="Probando conexión al servidor SMTP...")
-        self.update_idletasks()
         
-        exito, mensaje = probar_conexion_smtp(correo, password, servidor, puerto)
+        def probar():
+            from app.email_sender import probar_conexion_smtp
+            exito, mensaje = probar_conexion_smtp(
+                configuracion['correo'], configuracion['password'], configuracion['servidor'],
+                configuracion['puerto'], configuracion['usar_tls'], configuracion['autenticar'],
+                configuracion['timeout']
+            )
+            self.after(0, lambda: self._mostrar_prueba_smtp(exito, mensaje))
         
+        threading.Thread(target=probar, daemon=True).start()
+    
+    def _mostrar_prueba_smtp(self, exito, mensaje):
+        """Muestra el resultado de la prueba de conexión SMTP"""
         if exito:
             messagebox.showinfo("Éxito", mensaje)
             self.label_estado.configure(text="Conexión SMTP probada con éxito")
@@ -220,11 +342,28 @@ class PyRespaldosApp(ctk.CTk):
         if not self.ruta_destino or not os.path.exists(self.ruta_destino):
             messagebox.showerror("Error", "La ruta de destino no es válida")
             return
+        
+        # Si una copia anterior de este origen se interrumpió, ofrecer reanudarla sin analizar de nuevo
+        from app.respaldo import copia_interrumpida
+        estado_diario = copia_interrumpida(self.ruta_origen, self.ruta_destino)
+        if estado_diario is not None:
+            total = sum(1 for e in estado_diario['plan'] if e[1] == '[ARCHIVO]')
+            reanudar = messagebox.askyesno(
+                "Copia interrumpida",
+                f"La copia del {estado_diario['fecha']} a este destino no terminó "
+                f"({len(estado_diario['hechos'])} de {total} archivos copiados).\n\n"
+                "¿Deseas reanudarla? Si eliges No, se analizará de nuevo el origen.")
+            if reanudar:
+                self.reanudar_copia(estado_diario)
+                return
             
         # Limpiar elementos previos
-        for widget in self.frame_contenedor.winfo_children():
-            widget.destroy()
-        self.elementos_mostrados = {}
+        self.lista.limpiar()
+        self.indice_origen = None
+        self.label_total.configure(text="")
+        
+        # La copia necesita el índice completo del origen
+        self.btn_copiar.configure(state="disabled")
         
         # Mostrar mensaje de carga
         self.label_estado.configure(text="Analizando directorios... Por favor espera.")
@@ -234,95 +373,113 @@ class PyRespaldosApp(ctk.CTk):
         threading.Thread(target=self._analizar_en_hilo, daemon=True).start()
 
     def _analizar_en_hilo(self):
-        """Realiza el análisis de directorios en un hilo separado"""
+        """Realiza el análisis de directorios en un hilo separado publicando las carpetas por lotes"""
+        from app.indice import escanear_arbol
+        from app.respaldo import contar_archivos
+        from app.rendimiento import Medidor
+        
         try:
-            # Analizar la estructura del directorio de origen
-            estructura = []
-            tamano_total = 0
+            def publicar_lote(lote, total_descubiertas):
+                # Estructura de carpetas (sin mostrar archivos individuales)
+                # (el tamaño se muestra al terminar, cuando se conoce el total acumulado)
+                estructura = [(ruta_relativa, True, None, profundidad - 1)
+                              for ruta_relativa, profundidad, _ in lote]
+                self.after(0, lambda: self._agregar_lote_estructura(estructura, total_descubiertas))
             
-            # Primero todas las carpetas
-            for root, dirs, files in os.walk(self.ruta_origen):
-                ruta_relativa = os.path.relpath(root, self.ruta_origen)
-                if ruta_relativa != ".":  # No mostrar la carpeta raíz
-                    nivel = ruta_relativa.count(os.sep)
-                    estructura.append((ruta_relativa, True, 0, nivel))
-                
-                # Calcular tamaño total de la carpeta (sin mostrar archivos individuales)
-                tamano_carpeta = 0
-                for file in files:
-                    try:
-                        ruta_archivo = os.path.join(root, file)
-                        tamano = os.path.getsize(ruta_archivo) if os.path.exists(ruta_archivo) else 0
-                        tamano_carpeta += tamano
-                    except Exception as e:
-                        print(f"Error al obtener tamaño de {ruta_archivo}: {e}")
-                
-                # Solo agregamos tamaño a la carpeta, no a los archivos individuales
-                if ruta_relativa != ".":
-                    for i in range(len(estructura)):
-                        if estructura[i][0] == ruta_relativa:
-                            estructura[i] = (ruta_relativa, True, tamano_carpeta, nivel)
-                
-                tamano_total += tamano_carpeta
+            # Escanear el origen una sola vez; el índice se reutiliza al comparar, copiar y generar el informe
+            medidor = Medidor()
+            with medidor.fase("escaneo") as fase:
+                indice = escanear_arbol(self.ruta_origen, publicar_lote)
+                fase['archivos'] = contar_archivos(indice)
+                fase['bytes'] = indice.tamano_total()
+            self.fases_analisis = medidor.fases
             
-            # Actualizar la interfaz en el hilo principal
-            self.after(0, lambda: self._mostrar_estructura(estructura, tamano_total))
+            # Actualizar la interfaz en el hilo principal con los tamaños acumulados
+            self.after(0, lambda: self._finalizar_analisis(indice))
             
         except Exception as e:
-            self.after(0, lambda: messagebox.showerror("Error", f"Error al analizar los directorios: {e}"))
+            self.after(0, lambda e=e: messagebox.showerror("Error", f"Error al analizar los directorios: {e}"))
             self.after(0, lambda: self.label_estado.configure(text="Error al analizar los directorios."))
 
-    def _mostrar_estructura(self, estructura, tamano_total):
-        """Muestra la estructura de archivos y carpetas en la interfaz"""
-        for ruta, es_dir, tamano, nivel in estructura:
-            item = DirectorioItem(self.frame_contenedor, ruta, es_dir, tamano, nivel, height=30)
-            item.pack(fill="x", padx=5, pady=2)
-            self.elementos_mostrados[ruta] = item
+    def _agregar_lote_estructura(self, estructura, total_descubiertas):
+        """Añade a la interfaz un lote de carpetas descubiertas durante el análisis"""
+        self.lista.agregar_lote(estructura)
+        
+        self.label_estado.configure(text=f"Analizando directorios... {total_descubiertas} carpetas encontradas.")
+
+    def _finalizar_analisis(self, indice):
+        """Completa el análisis con los tamaños acumulados de cada carpeta"""
+        self.indice_origen = indice
+        
+        for ruta, _, _, tamano_total in indice.carpetas():
+            self.lista.modelo.actualizar_tamano(ruta, tamano_total)
+        self.lista.refrescar()
         
         # Actualizar información de tamaño total
-        self.label_total.configure(text=f"Tamaño total: {convertir_tamano(tamano_total)}")
+        self.label_total.configure(text=f"Tamaño total: {convertir_tamano(indice.tamano_total())}")
         
-        # Habilitar botón de copia
+        # Habilitar botones de copia
         self.btn_copiar.configure(state="normal")
+        self.btn_vigilar.configure(state="normal")
+        self.btn_encolar.configure(state="normal")
         
         # Actualizar estado
-        self.label_estado.configure(text=f"Se encontraron {len(estructura)} elementos. Selecciona los que deseas copiar.")
+        self.label_estado.configure(text=f"Se encontraron {len(self.lista.modelo)} elementos. Selecciona los que deseas copiar.")
 
     def seleccionar_todo(self):
         """Selecciona todos los elementos de la lista"""
-        for item in self.elementos_mostrados.values():
-            item.var_seleccionado.set(True)
+        self.lista.marcar_todos(True)
 
     def deseleccionar_todo(self):
         """Deselecciona todos los elementos de la lista"""
-        for item in self.elementos_mostrados.values():
-            item.var_seleccionado.set(False)
+        self.lista.marcar_todos(False)
 
     def obtener_elementos_seleccionados(self):
         """Obtiene la lista de elementos seleccionados"""
-        seleccionados = []
-        for ruta, item in self.elementos_mostrados.items():
-            if item.get_estado():
-                seleccionados.append(ruta)
-        return seleccionados
+        return self.lista.modelo.obtener_seleccionados()
 
     def iniciar_copia(self):
         """Inicia el proceso de copia con los elementos seleccionados"""
+        from app.respaldo import preparar_destino, planificar_respaldo, ejecutar_respaldo
+        from app.rendimiento import Medidor
+        from app.limitador import crear_limitador
+        
         elementos_seleccionados = self.obtener_elementos_seleccionados()
         
         if not elementos_seleccionados:
             messagebox.showwarning("Advertencia", "No has seleccionado ningún elemento para copiar")
             return
             
-        # Previsualizar elementos a copiar
-        elementos_a_copiar = comparar_origen_destino(self.ruta_origen, self.ruta_destino, elementos_seleccionados)
+        opciones = self.obtener_opciones()
+        limites = self._leer_limites()
+        if limites is None:
+            return
+        opciones['throttle_bytes_per_sec'], opciones['throttle_files_per_sec'] = limites
+        
+        # La configuración de correo se lee aquí, en el hilo principal
+        correcto, envio_correo = self._preparar_envio_correo()
+        if not correcto:
+            return
+        
+        # Obtener el estado del destino del catálogo (o escanearlo una sola vez) para comparar y para el tamaño previo
+        if self.catalogo is not None:
+            self.catalogo.cerrar()
+            self.catalogo = None
+        medidor = Medidor(opciones['profile'], opciones['trace_memory'])
+        medidor.agregar(self.fases_analisis)
+        with medidor.fase("indice_destino"):
+            self.indice_destino, self.catalogo, tamaño_destino_antes = preparar_destino(self.ruta_destino, opciones)
+        
+        # Previsualizar elementos a copiar: plan archivo por archivo (tamaño y fecha de modificación)
+        with medidor.fase("comparacion") as fase:
+            elementos_a_copiar = planificar_respaldo(self.ruta_origen, elementos_seleccionados, self.indice_origen,
+                                                     self.indice_destino, opciones)
+            fase['archivos'] = len(elementos_a_copiar)
         
         if not elementos_a_copiar:
+            medidor.detener()
             messagebox.showinfo("Información", "No hay elementos nuevos o modificados que necesiten ser copiados")
             return
-            
-        # Calcular tamaño antes de la copia - Guardamos esta información para el informe
-        tamaño_destino_antes = self.calcular_tamaño_directorio(self.ruta_destino)
         
         # Mostrar confirmación con resumen
         texto_confirmacion = "Se copiarán los siguientes elementos:\n\n"
@@ -341,176 +498,311 @@ class PyRespaldosApp(ctk.CTk):
         
         confirmar = messagebox.askyesno("Confirmar copia", texto_confirmacion)
         if not confirmar:
+            medidor.detener()
             return
             
         # Desactivar botones mientras se realiza la copia
         self.btn_copiar.configure(state="disabled")
+        self.btn_vigilar.configure(state="disabled")
+        self.btn_ejecutar_cola.configure(state="disabled")
+        
+        # Iniciar la copia en un hilo separado; el progreso se mide en bytes
+        canal = CanalProgreso(tamano_total)
+        self.limitador = crear_limitador(opciones, self.ruta_destino)
+        limitador = self.limitador
+        
+        def ejecutar():
+            return ejecutar_respaldo(
+                self.ruta_origen, self.ruta_destino, elementos_seleccionados, elementos_a_copiar,
+                tamaño_destino_antes, opciones, canal, self.indice_origen, self.indice_destino, self.catalogo,
+                medidor, limitador=limitador
+            )
+        
+        threading.Thread(target=self._copiar_en_hilo, args=(ejecutar, canal, envio_correo, medidor),
+                         daemon=True).start()
+        self._sondear_progreso(canal)
+    
+    def reanudar_copia(self, estado_diario):
+        """Reanuda una copia interrumpida a partir del diario guardado en el destino"""
+        from app.respaldo import reanudar_respaldo
+        from app.limitador import crear_limitador
+        
+        correcto, envio_correo = self._preparar_envio_correo()
+        if not correcto:
+            return
+        limites = self._leer_limites()
+        if limites is None:
+            return
         
-        # Iniciar la copia en un hilo separado
-        threading.Thread(target=self._copiar_en_hilo, 
-                         args=(elementos_seleccionados, elementos_a_copiar, tamaño_destino_antes), 
+        # El catálogo lo abre y lo cierra reanudar_respaldo
+        if self.catalogo is not None:
+            self.catalogo.cerrar()
+            self.catalogo = None
+        self.btn_copiar.configure(state="disabled")
+        self.btn_vigilar.configure(state="disabled")
+        self.btn_ejecutar_cola.configure(state="disabled")
+        canal = CanalProgreso()
+        # Los límites del diario se mantienen salvo que se hayan indicado otros en la interfaz
+        self.limitador = crear_limitador(obtener_opciones_backup(estado_diario['opciones']), self.ruta_destino)
+        if any(limites):
+            self.limitador.establecer_limites(*limites)
+        limitador = self.limitador
+        
+        def ejecutar():
+            return reanudar_respaldo(self.ruta_destino, canal, estado=estado_diario, limitador=limitador)
+        
+        threading.Thread(target=self._copiar_en_hilo, args=(ejecutar, canal, envio_correo),
                          daemon=True).start()
+        self._sondear_progreso(canal)
     
-    def calcular_tamaño_directorio(self, ruta):
-        """Calcula el tamaño total de un directorio"""
-        tamaño_total = 0
-        for dirpath, dirnames, filenames in os.walk(ruta):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                try:
-                    tamaño_total += os.path.getsize(fp)
-                except OSError:
-                    pass  # Ignorar archivos que no se pueden acceder
-        return tamaño_total
-
-    def _copiar_en_hilo(self, elementos_seleccionados, elementos_a_copiar, tamaño_destino_antes):
-        """Realiza la copia en un hilo separado"""
+    def alternar_vigilancia(self):
+        """Inicia o detiene la copia continua de los elementos seleccionados (ver app.vigilancia)"""
+        if self.detener_vigilancia is not None:
+            self.detener_vigilancia.set()
+            self.btn_vigilar.configure(text="Deteniendo...", state="disabled")
+            return
+        
+        elementos_seleccionados = self.obtener_elementos_seleccionados()
+        if not elementos_seleccionados:
+            messagebox.showwarning("Advertencia", "No has seleccionado ningún elemento para vigilar")
+            return
+        opciones = self.obtener_opciones()
+        limites = self._leer_limites()
+        if limites is None:
+            return
+        opciones['throttle_bytes_per_sec'], opciones['throttle_files_per_sec'] = limites
+        
+        # La copia continua abre su propio catálogo del destino
+        if self.catalogo is not None:
+            self.catalogo.cerrar()
+            self.catalogo = None
         try:
-            # Actualizar estado
-            self.after(0, lambda: self.label_estado.configure(text="Iniciando copia..."))
-            self.after(0, lambda: self.barra_progreso.set(0.05))
-            
-            # Variable para controlar si se usará robocopy o copia manual
-            usar_robocopy = False  # Cambiamos a False por defecto para usar el método manual
-            elementos_copiados = []
-            
-            if usar_robocopy:
-                try:
-                    # Preparar opciones para robocopy
-                    opciones_adicionales = ""
-                    
-                    if self.var_multihilo.get():
-                        opciones_adicionales += "/MT:8"  # Multihilo
-                        
-                    if self.var_verificar.get():
-                        opciones_adicionales += " /V"  # Verificar
-                    
-                    self.after(0, lambda: self.label_estado.configure(text="Ejecutando copia con Robocopy..."))
-                    self.after(0, lambda: self.barra_progreso.set(0.1))
-                    
-                    # Ejecutar robocopy
-                    exito, codigo_salida, output_log, error_msg = copiar_con_robocopy(
-                        self.ruta_origen, self.ruta_destino, elementos_seleccionados, opciones_adicionales
-                    )
-                    
-                    # Actualizar progreso basado en la salida
-                    for i, linea in enumerate(output_log):
-                        if i % 10 == 0:  # Actualizar cada 10 líneas para no sobrecargar la UI
-                            progreso = min(0.1 + (i / len(output_log) * 0.8), 0.9)
-                            self.after(0, lambda p=progreso: self.barra_progreso.set(p))
-                            self.after(0, lambda l=linea: self.label_estado.configure(text=f"Copiando: {l[:60]}..."))
-                    
-                    if not exito:
-                        raise Exception(error_msg)
-                    
-                    # Robocopy se ejecutó correctamente
-                    elementos_copiados = elementos_a_copiar
-                
-                except Exception as e:
-                    # Si falla robocopy, lo registramos y procedemos a copia manual
-                    print(f"Error con robocopy: {e}")
-                    usar_robocopy = False
-            
-            # Si no usamos robocopy o falló, hacemos copia manual
-            if not usar_robocopy:
-                self.after(0, lambda: self.label_estado.configure(text="Realizando copia manual de archivos..."))
-                
-                # Función de callback para actualizar progreso
-                def actualizar_progreso(idx, total, ruta):
-                    progreso = 0.1 + (idx / total * 0.8)
-                    self.after(0, lambda p=progreso: self.barra_progreso.set(p))
-                    self.after(0, lambda r=ruta: self.label_estado.configure(text=f"Copiando: {r[:60]}..."))
-                
-                # Copiar manualmente
-                elementos_copiados = copiar_archivos_manualmente(
-                    self.ruta_origen, self.ruta_destino, elementos_seleccionados, actualizar_progreso
-                )
-            
-            # Calcular tamaño después de la copia
-            self.after(0, lambda: self.label_estado.configure(text="Calculando tamaño total..."))
-            tamaño_destino_despues = self.calcular_tamaño_directorio(self.ruta_destino)
-            tamaño_diferencia = tamaño_destino_despues - tamaño_destino_antes
-            
-            # Preparamos los datos necesarios para el informe pero no lo generamos todavía
-            datos_informe = {
-                'origen': self.ruta_origen,
-                'destino': self.ruta_destino,
-                'elementos_copiados': elementos_copiados,
-                'tamaño_destino_antes': tamaño_destino_antes,
-                'tamaño_destino_despues': tamaño_destino_despues,
-                'tamaño_diferencia': tamaño_diferencia
-            }
-            
-            # Enviar informe por correo si está habilitado
-            if self.var_enviar_correo.get():
-                self.after(0, lambda: self.label_estado.configure(text="Preparando envío de correo..."))
-                self.after(0, lambda: self.barra_progreso.set(0.9))
-                
-                correo = self.entry_email.get().strip()
-                password = self.entry_password.get().strip()
-                destinatario = self.entry_destinatario.get().strip()
-                servidor = self.entry_smtp.get().strip()
-                puerto = self.entry_puerto.get().strip()
-                
-                # Ahora generamos el informe HTML después de todo el proceso
-                self.after(0, lambda: self.label_estado.configure(text="Generando informe HTML..."))
-                self.after(0, lambda: self.barra_progreso.set(0.95))
-                
-                informe = generar_reporte_html(
-                    datos_informe['origen'],
-                    datos_informe['destino'],
-                    datos_informe['elementos_copiados'],
-                    datos_informe['tamaño_destino_antes'],
-                    datos_informe['tamaño_destino_despues'],
-                    datos_informe['tamaño_diferencia']
-                )
-                
-                self.after(0, lambda: self.label_estado.configure(text="Enviando informe por correo..."))
-                
-                exito, mensaje = enviar_informe_por_correo(
-                    informe, correo, password, destinatario, servidor, puerto, 
-                    self.ruta_origen, self.ruta_destino
-                )
-                
-                if exito:
-                    self.after(0, lambda: self.label_estado.configure(text=f"Copia completada. Informe enviado por correo y guardado en: {informe}"))
-                    mensaje_final = f"Copia finalizada con éxito.\nSe ha generado un informe: {informe}\nEl informe ha sido enviado por correo."
+            from app.vigilancia import CopiaContinua
+            copia = CopiaContinua(self.ruta_origen, self.ruta_destino, elementos_seleccionados, opciones)
+        except ValueError as e:
+            messagebox.showwarning("Advertencia", str(e))
+            return
+        
+        self.limitador = copia.limitador
+        self.detener_vigilancia = threading.Event()
+        self.btn_copiar.configure(state="disabled")
+        self.btn_ejecutar_cola.configure(state="disabled")
+        self.btn_vigilar.configure(text="Detener vigilancia")
+        self.label_estado.configure(text="Vigilando cambios en el origen...")
+        threading.Thread(target=self._vigilar_en_hilo, args=(copia, self.detener_vigilancia), daemon=True).start()
+    
+    def _vigilar_en_hilo(self, copia, detener):
+        """Ejecuta la copia continua en un hilo separado hasta que se detenga"""
+        def lote(elementos_copiados, detalles):
+            archivos = [e for e in elementos_copiados if e[1] == '[ARCHIVO]']
+            if archivos:
+                texto = (f"Vigilando cambios. Último lote a las {time.strftime('%H:%M:%S')}: {len(archivos)} archivos "
+                         f"({convertir_tamano(sum(tamano for _, _, tamano in archivos))})")
+                self.after(0, lambda: self.label_estado.configure(text=texto))
+            fallidos = detalles.get('verificacion', {}).get('fallidos', [])
+            if fallidos:
+                mensaje = f"{len(fallidos)} archivos no superaron la verificación: " + ", ".join(f[0] for f in fallidos[:5])
+                self.after(0, lambda: messagebox.showerror("Error", mensaje))
+        
+        try:
+            copia.ejecutar(detener, lote)
+        except Exception as e:
+            self.after(0, lambda e=e: messagebox.showerror("Error", f"Error durante la copia continua: {e}"))
+        finally:
+            copia.cerrar()
+            self.after(0, self._finalizar_vigilancia)
+    
+    def _finalizar_vigilancia(self):
+        """Restablece los botones al terminar la copia continua"""
+        self.detener_vigilancia = None
+        self.limitador = None
+        self.btn_vigilar.configure(text="Vigilar cambios", state="normal")
+        self.btn_copiar.configure(state="normal")
+        self.btn_ejecutar_cola.configure(state="normal")
+        self.label_estado.configure(text="Vigilancia detenida")
+    
+    def _obtener_cola(self):
+        """Devuelve la cola de trabajos, abriéndola la primera vez"""
+        if self.cola is None:
+            from app.trabajos import ColaTrabajos
+            self.cola = ColaTrabajos()
+        return self.cola
+    
+    def agregar_a_cola(self):
+        """Añade la selección actual (origen, destino, elementos y opciones) a la cola de trabajos"""
+        elementos_seleccionados = self.obtener_elementos_seleccionados()
+        if not elementos_seleccionados:
+            messagebox.showwarning("Advertencia", "No has seleccionado ningún elemento para copiar")
+            return
+        opciones = self.obtener_opciones()
+        limites = self._leer_limites()
+        if limites is None:
+            return
+        opciones['throttle_bytes_per_sec'], opciones['throttle_files_per_sec'] = limites
+        try:
+            cola = self._obtener_cola()
+            cola.agregar({'origen': self.ruta_origen, 'destino': self.ruta_destino,
+                          'elementos': elementos_seleccionados, 'opciones': opciones})
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"No se pudo añadir el trabajo a la cola: {e}")
+            return
+        self.label_estado.configure(text=f"Trabajo añadido a la cola ({len(cola.pendientes())} pendientes)")
+    
+    def ejecutar_cola_trabajos(self):
+        """Ejecuta los trabajos pendientes de la cola en segundo plano (ver app.trabajos)"""
+        try:
+            cola = self._obtener_cola()
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"No se pudo leer la cola de trabajos: {e}")
+            return
+        if not cola.pendientes():
+            messagebox.showinfo("Información", "No hay trabajos pendientes en la cola")
+            return
+        self.btn_ejecutar_cola.configure(state="disabled")
+        self.btn_copiar.configure(state="disabled")
+        self.btn_vigilar.configure(state="disabled")
+        threading.Thread(target=self._ejecutar_cola_en_hilo, args=(cola,), daemon=True).start()
+    
+    def _ejecutar_cola_en_hilo(self, cola):
+        """Ejecuta la cola en un hilo separado y muestra el informe resumen al terminar"""
+        en_curso = []
+        cerrojo = threading.Lock()
+        
+        def progreso(trabajo, evento):
+            with cerrojo:
+                if evento == 'inicio':
+                    en_curso.append(trabajo['nombre'])
                 else:
-                    self.after(0, lambda: self.label_estado.configure(text=f"Copia completada. Informe guardado en: {informe}. Error al enviar por correo."))
-                    mensaje_final = f"Copia finalizada con éxito.\nSe ha generado un informe: {informe}\nNo se pudo enviar el informe por correo: {mensaje}"
-            else:
-                # Si no enviamos correo, generamos el informe al final
-                self.after(0, lambda: self.label_estado.configure(text="Generando informe HTML..."))
-                self.after(0, lambda: self.barra_progreso.set(0.95))
-                
-                informe = generar_reporte_html(
-                    datos_informe['origen'],
-                    datos_informe['destino'],
-                    datos_informe['elementos_copiados'],
-                    datos_informe['tamaño_destino_antes'],
-                    datos_informe['tamaño_destino_despues'],
-                    datos_informe['tamaño_diferencia']
-                )
-                
-                self.after(0, lambda: self.label_estado.configure(text=f"Copia completada. Informe guardado en: {informe}"))
-                mensaje_final = f"Copia finalizada con éxito.\nSe ha generado un informe: {informe}"
-            
-            self.after(0, lambda: self.barra_progreso.set(1.0))
-            self.after(0, lambda: self.btn_copiar.configure(state="normal"))
-            self.after(0, lambda: messagebox.showinfo("Operación completada", mensaje_final))
-            
-            # Intentar abrir el informe
+                    en_curso.remove(trabajo['nombre'])
+                texto = f"Trabajos en curso: {', '.join(en_curso)}" if en_curso else "Generando el resumen..."
+            self.after(0, lambda: self.label_estado.configure(text=texto))
+        
+        try:
+            from app.trabajos import ejecutar_cola
+            ejecutados, segundos = ejecutar_cola(cola, callback=progreso)
+            from app.reporte import generar_resumen_trabajos_html
+            resumen = generar_resumen_trabajos_html(ejecutados, segundos)
+            errores = sum(1 for t in ejecutados if t['estado'] == 'error')
+            mensaje = f"Cola terminada: {len(ejecutados) - errores} de {len(ejecutados)} trabajos completados.\nResumen: {resumen}"
+            self.after(0, lambda: messagebox.showinfo("Operación completada", mensaje))
             try:
-                os.startfile(informe)
+                os.startfile(resumen)
             except Exception as e:
-                print(f"No se pudo abrir el informe: {e}")
-                
+                print(f"No se pudo abrir el resumen: {e}")
         except Exception as e:
-            self.after(0, lambda: messagebox.showerror("Error", f"Error durante la copia: {e}"))
-            self.after(0, lambda: self.label_estado.configure(text=f"Error: {str(e)}"))
-            self.after(0, lambda: self.btn_copiar.configure(state="normal"))
-            self.after(0, lambda: self.barra_progreso.set(1.0))
-            self.after(0, lambda: self.btn_copiar.configure(state="normal"))
+            self.after(0, lambda e=e: messagebox.showerror("Error", f"Error al ejecutar la cola: {e}"))
+        finally:
+            self.after(0, self._finalizar_cola)
+    
+    def _finalizar_cola(self):
+        """Restablece los botones al terminar la cola de trabajos"""
+        self.btn_ejecutar_cola.configure(state="normal")
+        self.label_estado.configure(text="Cola de trabajos terminada")
+        if self.indice_origen is not None:
+            self.btn_copiar.configure(state="normal")
+            self.btn_vigilar.configure(state="normal")
+    
+    def _leer_limites(self):
+        """
+        Lee los límites de velocidad de la interfaz.
+
+        Returns:
+            Tupla (bytes_por_segundo, archivos_por_segundo) o None si no son válidos
+        """
+        from app.limitador import interpretar_tasa
+        
+        try:
+            return (interpretar_tasa(self.entry_limite_bytes.get()),
+                    interpretar_tasa(self.entry_limite_archivos.get()))
+        except ValueError:
+            messagebox.showerror("Error", "Los límites deben ser números (se admiten los sufijos K, M y G)")
+            return None
+    
+    def aplicar_limites(self):
+        """Aplica los límites de velocidad a la copia en curso"""
+        limites = self._leer_limites()
+        if limites is None:
+            return
+        if self.limitador is None or self.btn_copiar.cget("state") == "normal":
+            messagebox.showinfo("Información", "Los límites se aplicarán al iniciar la copia")
+            return
+        self.limitador.establecer_limites(*limites)
+    
+    def _sondear_progreso(self, canal):
+        """Aplica en la interfaz el estado acumulado del canal de progreso (una vez por fotograma)"""
+        estado = canal.instantanea()
+        if estado is not None:
+            if estado['fraccion'] is None:
+                # Fase de copia: progreso según los bytes procesados
+                self.barra_progreso.set(0.1 + 0.8 * estado['fraccion_bytes'])
+                self.label_estado.configure(
+                    text=f"Copiando: {estado['archivo'][:60]}... "
+                         f"({convertir_tamano(estado['bytes_hechos'])} de {convertir_tamano(estado['bytes_totales'])})")
+                self.label_trabajadores.configure(text=self._formatear_trabajadores(estado['trabajadores']))
+            else:
+                self.barra_progreso.set(estado['fraccion'])
+                self.label_estado.configure(text=estado['texto'])
+                self.label_trabajadores.configure(text="")
+            if estado['errores']:
+                messagebox.showerror("Error", "\n".join(estado['errores']))
+            if estado['terminado']:
+                self.btn_copiar.configure(state="normal")
+                self.btn_ejecutar_cola.configure(state="normal")
+                if self.indice_origen is not None:
+                    self.btn_vigilar.configure(state="normal")
+                return
+        self.after(INTERVALO_MS, lambda: self._sondear_progreso(canal))
+    
+    def _formatear_trabajadores(self, estado_trabajadores):
+        """Genera el texto con el archivo y porcentaje que procesa cada hilo"""
+        lineas = []
+        for id_trabajador in sorted(estado_trabajadores):
+            ruta, bytes_hechos, tamaño = estado_trabajadores[id_trabajador]
+            porcentaje = (bytes_hechos / tamaño * 100) if tamaño else 100
+            lineas.append(f"Hilo {id_trabajador + 1}: {ruta[-50:]} ({porcentaje:.0f}%)")
+        return "\n".join(lineas)
+
+    def obtener_opciones(self):
+        """Devuelve las opciones de respaldo elegidas en la interfaz combinadas con las predeterminadas"""
+        return obtener_opciones_backup({
+            'use_multithreading': self.var_multihilo.get(),
+            'verify_copy': self.var_verificar.get(),
+            'hash_algorithm': self.var_algoritmo_hash.get(),
+            'use_catalog': self.var_catalogo.get(),
+            'delta_transfer': self.var_delta.get(),
+            'snapshot_mode': self.var_instantaneas.get(),
+            'repository_mode': self.var_almacen.get(),
+            'pack_small_files': self.var_empaquetar.get(),
+            'compression': self.var_compresion.get(),
+            'fsync_policy': self.var_fsync.get()
+        })
+
+    def _copiar_en_hilo(self, ejecutar, canal, envio_correo=None, medidor=None):
+        """
+        Realiza la copia en un hilo separado. ejecutar es la función que hace el respaldo
+        (ejecutar_respaldo o reanudar_respaldo). El progreso se publica en el canal, que la
+        interfaz consulta a intervalos fijos (ver _sondear_progreso). Si se indica
+        envio_correo (bandeja, destinatario), el informe se deja en la bandeja de salida.
+        """
+        try:
+            resultado = ejecutar()
+            medidor = resultado['medidor']
+            self.indice_destino = resultado['indice_destino']
+            informe = resultado['informe']
+            ruta_manifiesto = resultado['manifiesto']
+            mensaje_final = f"Copia finalizada con éxito.\nSe ha generado un informe: {informe}"
+            
+            # El correo se envía en segundo plano desde la bandeja de salida (con reintentos)
+            if envio_correo is not None:
+                bandeja, destinatario = envio_correo
+                with medidor.fase("correo"):
+                    bandeja.encolar_informe(informe, destinatario, self.ruta_origen, self.ruta_destino, ruta_manifiesto)
+                medidor.guardar(informe)
+                canal.estado(f"Copia completada. Informe guardado en: {informe}. Enviando por correo en segundo plano...", 1.0)
+                mensaje_final += "\nEl informe se enviará por correo en segundo plano."
+            else:
+                canal.estado(f"Copia completada. Informe guardado en: {informe}", 1.0)
+            
             self.after(0, lambda: messagebox.showinfo("Operación completada", mensaje_final))
             
             # Intentar abrir el informe
@@ -520,9 +812,12 @@ class PyRespaldosApp(ctk.CTk):
                 print(f"No se pudo abrir el informe: {e}")
                 
         except Exception as e:
-            self.after(0, lambda: messagebox.showerror("Error", f"Error durante la copia: {e}"))
-            self.after(0, lambda: self.label_estado.configure(text=f"Error: {str(e)}"))
-            self.after(0, lambda: self.btn_copiar.configure(state="normal"))
+            canal.error(f"Error durante la copia: {e}")
+            canal.estado(f"Error: {e}", 1.0)
+        finally:
+            if medidor is not None:
+                medidor.detener()
+            canal.finalizar()
             
     def actualizar_estado(self):
         """Actualiza el estado de la aplicación según las rutas seleccionadas"""
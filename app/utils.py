@@ -7,6 +7,9 @@ PyRespaldos - Funciones utilitarias para la aplicación
 import os
 import datetime
 
+from app.indice import escanear_arbol
+from app.plan_copia import planificar_copia
+
 def obtener_metadatos(ruta):
     """Obtiene metadatos de un archivo o carpeta (tamaño y fecha de modificación)."""
     if not os.path.exists(ruta):
@@ -20,52 +23,43 @@ def convertir_tamano(bytes):
             return f"{bytes:.2f} {unidad}"
         bytes /= 1024
 
-def comparar_origen_destino(origen, destino, elementos_seleccionados=None):
-    """Compara carpetas entre origen y destino y devuelve las que son nuevas o diferentes."""
-    elementos_a_copiar = []
-
-    for elemento in elementos_seleccionados:
-        ruta_origen = os.path.join(origen, elemento)
-        ruta_destino = os.path.join(destino, elemento)
+def reservar_nombre(base, extension):
+    """
+    Crea vacío y devuelve el primer nombre libre entre base+extension, base_2+extension...
+    La creación es exclusiva, así que dos ejecuciones simultáneas (p. ej. trabajos de la
+    cola con el mismo nombre de origen en el mismo minuto) nunca comparten el archivo.
+    """
+    numero = 1
+    while True:
+        nombre = f"{base}{extension}" if numero == 1 else f"{base}_{numero}{extension}"
+        try:
+            with open(nombre, "x"):
+                return nombre
+        except FileExistsError:
+            numero += 1
 
-        # Verificar si es una carpeta
-        if os.path.isdir(ruta_origen):
-            if not os.path.exists(ruta_destino):
-                elementos_a_copiar.append((elemento, '[CARPETA]', 0))
-            else:
-                # Para carpetas, comparamos el contenido total
-                tamano_origen = calcular_tamano_carpeta(ruta_origen)
-                tamano_destino = calcular_tamano_carpeta(ruta_destino)
-                
-                if tamano_origen != tamano_destino:
-                    elementos_a_copiar.append((elemento, '[CARPETA]', tamano_origen))
-                    
-    return elementos_a_copiar
+def comparar_origen_destino(origen, destino, elementos_seleccionados=None, indice_origen=None, indice_destino=None,
+                            tolerancia_mtime=2.0):
+    """
+    Compara origen y destino archivo por archivo (tamaño y fecha de modificación) y
+    devuelve el plan de copia con las carpetas que faltan y los archivos nuevos o modificados.
+    Si no se proporcionan los índices de origen y destino se escanean una sola vez.
+    """
+    if indice_origen is None:
+        indice_origen = escanear_arbol(origen)
+    if indice_destino is None:
+        indice_destino = escanear_arbol(destino)
+    
+    return planificar_copia(elementos_seleccionados or [], indice_origen, indice_destino, tolerancia_mtime)
 
-def calcular_tamano_carpeta(ruta):
+def calcular_tamano_carpeta(ruta, indice=None):
     """Calcula el tamaño total de una carpeta incluyendo todos sus archivos."""
-    tamano_total = 0
-    for dirpath, dirnames, filenames in os.walk(ruta):
-        for f in filenames:
-            try:
-                fp = os.path.join(dirpath, f)
-                tamano_total += os.path.getsize(fp)
-            except OSError:
-                pass  # Ignorar archivos a los que no se puede acceder
-    return tamano_total
+    if indice is not None:
+        return indice.tamano_total(os.path.abspath(ruta))
+    return escanear_arbol(ruta).tamano_total()
 
-def obtener_arbol_con_tamanos_nivel_2(base_path):
+def obtener_arbol_con_tamanos_nivel_2(base_path, indice=None):
     """Genera un árbol de archivos con el tamaño total de cada carpeta hasta el nivel 2."""
-    arbol = {}
-    for root, dirs, files in os.walk(base_path):
-        # Calcular el nivel de la carpeta
-        nivel = root[len(base_path):].count(os.sep)
-        if nivel > 2:  # Solo tomar hasta el nivel 2
-            continue
-        try:
-            total_size = sum(os.path.getsize(os.path.join(root, f)) for f in files if os.path.exists(os.path.join(root, f)))
-            arbol[root] = total_size
-        except Exception as e:
-            print(f"Error al calcular tamaño de {root}: {e}")
-            arbol[root] = 0
-    return arbol
\ No newline at end of file
+    if indice is None:
+        indice = escanear_arbol(base_path)
+    return indice.arbol_hasta_nivel(2)
\ No newline at end of file
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Verificación del contenido copiado mediante hashes
+"""
+
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.motor_copia import TAMANO_BLOQUE, obtener_buffer
+
+# Algoritmos de hash admitidos para la verificación
+ALGORITMOS_HASH = ("blake2b", "sha256", "sha1", "md5")
+
+
+def crear_hash(algoritmo):
+    """Crea un objeto hash de hashlib para el algoritmo indicado"""
+    if algoritmo not in ALGORITMOS_HASH:
+        raise ValueError(f"Algoritmo de hash no admitido: {algoritmo}")
+    return hashlib.new(algoritmo)
+
+
+def calcular_hash(ruta, algoritmo="blake2b", tamano_bloque=TAMANO_BLOQUE, desplazamiento=0, longitud=None,
+                  codec=None):
+    """
+    Calcula el hash de un archivo leyéndolo por bloques. En sistemas que lo permiten
+    se pide al núcleo que descarte de la caché las páginas del archivo ya escritas en el
+    disco. Las que aún no se han escrito (copia en curso sin sincronizar, p. ej. con la
+    política 'end') siguen en la caché, así que la comprobación puede leerse de la
+    memoria y no del disco.
+
+    Args:
+        ruta: Ruta del archivo
+        algoritmo: Nombre del algoritmo de hashlib
+        tamano_bloque: Tamaño de cada lectura
+        desplazamiento: Posición donde empiezan los datos (archivos dentro de un contenedor)
+        longitud: Bytes a leer desde el desplazamiento (None = hasta el final)
+        codec: Algoritmo de compresión del archivo (ver compresion.py); se calcula el
+            hash de los datos descomprimidos
+
+    Returns:
+        Hash en hexadecimal
+    """
+    hasher = crear_hash(algoritmo)
+    buffer = obtener_buffer(tamano_bloque)
+    vista = memoryview(buffer)
+    try:
+        with open(ruta, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                try:
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+                except OSError:
+                    pass
+            if desplazamiento:
+                f.seek(desplazamiento)
+            lector = f
+            if codec is not None:
+                from app.compresion import abrir_comprimido
+                lector = abrir_comprimido(f, codec)
+            try:
+                restantes = longitud
+                while restantes is None or restantes > 0:
+                    leidos = lector.readinto(buffer if restantes is None or restantes >= len(buffer)
+                                             else vista[:restantes])
+                    if not leidos:
+                        break
+                    hasher.update(vista[:leidos])
+                    if restantes is not None:
+                        restantes -= leidos
+            finally:
+                if lector is not f:
+                    lector.close()
+    finally:
+        vista.release()
+    return hasher.hexdigest()
+
+
+class Verificador:
+    """
+    Relee y comprueba los archivos copiados en un grupo de hilos propio, de modo que
+    la verificación se solapa con la copia de los archivos siguientes.
+    """
+
+    def __init__(self, algoritmo="blake2b", num_hilos=2):
+        crear_hash(algoritmo)  # Validar el algoritmo antes de empezar
+        self.algoritmo = algoritmo
+        self._ejecutor = ThreadPoolExecutor(max_workers=max(1, int(num_hilos)),
+                                            thread_name_prefix="verificacion")
+        self._futuros = []
+        self._cerrojo = threading.Lock()
+
+    def _verificar(self, ruta_relativa, ruta_destino, hash_esperado, desplazamiento=0, longitud=None, codec=None):
+        try:
+            hash_obtenido = calcular_hash(ruta_destino, self.algoritmo, desplazamiento=desplazamiento,
+                                          longitud=longitud, codec=codec)
+        except Exception as e:  # OSError o datos comprimidos dañados (EOFError, LZMAError...)
+            return (ruta_relativa, hash_esperado, f"error: {e}")
+        if hash_obtenido != hash_esperado:
+            return (ruta_relativa, hash_esperado, hash_obtenido)
+        return None
+
+    def enviar(self, ruta_relativa, ruta_destino, hash_esperado, desplazamiento=0, longitud=None, codec=None):
+        """
+        Programa la relectura de un archivo copiado y la comparación con su hash de origen.
+        Con desplazamiento y longitud se verifica un archivo guardado dentro de un contenedor;
+        con codec, un archivo guardado comprimido.
+        """
+        futuro = self._ejecutor.submit(self._verificar, ruta_relativa, ruta_destino, hash_esperado,
+                                       desplazamiento, longitud, codec)
+        with self._cerrojo:
+            self._futuros.append(futuro)
+
+    def finalizar(self):
+        """
+        Espera a que terminen todas las verificaciones pendientes.
+
+        Returns:
+            Diccionario con el algoritmo, el número de archivos verificados y la lista
+            de fallos en formato (ruta, hash_esperado, hash_obtenido)
+        """
+        self._ejecutor.shutdown(wait=True)
+        fallidos = [r for r in (f.result() for f in self._futuros) if r is not None]
+        return {
+            'algoritmo': self.algoritmo,
+            'verificados': len(self._futuros),
+            'fallidos': fallidos
+        }
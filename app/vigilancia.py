@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Copia continua: vigila el origen y copia solo lo que cambia
+
+En Linux los cambios se reciben con inotify (mediante ctypes, sin dependencias); en
+el resto de sistemas, o si inotify no está disponible o se agota el límite de
+vigilancias del sistema, se compara cada pocos segundos una instantánea del árbol
+hecha con os.scandir. Los cambios se agrupan en lotes: un lote se copia cuando lleva
+unos segundos sin cambios nuevos (o, si no para de cambiar, como mucho cada cierto
+tiempo), y solo se comparan y copian las rutas que han cambiado, con las mismas
+funciones de copia, catálogo y verificación que una copia normal. Si inotify pierde
+eventos (cola desbordada) se vuelve a escanear el origen y se compara todo.
+
+La copia continua solo se aplica al modo normal (no a las instantáneas ni al almacén)
+y no borra nada del destino, igual que una copia normal.
+
+Uso desde la línea de comandos:
+    python -m app vigilar ORIGEN DESTINO [--retardo 2] [--sondeo] [--intervalo 5]
+"""
+
+import os
+import sys
+import stat
+import time
+import errno
+import select
+import struct
+import threading
+
+from app.config import obtener_opciones_backup
+from app.indice import PREFIJO_INTERNO, escanear_arbol
+from app.plan_copia import planificar_copia
+
+# Segundos sin cambios nuevos antes de copiar un lote
+RETARDO = 2.0
+# Segundos máximos desde el primer cambio de un lote hasta copiarlo
+ESPERA_MAXIMA = 30.0
+# Segundos entre dos instantáneas del árbol en el modo de sondeo
+INTERVALO_SONDEO = 5.0
+# Segundos máximos de espera sin cambios antes de comprobar si hay que detenerse
+ESPERA_INACTIVO = 1.0
+
+# Constantes de inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Eventos que indican que un archivo o carpeta es nuevo o ha cambiado (los borrados no
+# interesan: la copia no elimina nada del destino)
+MASCARA_EVENTOS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event: wd, mask, cookie, len (seguido del nombre)
+_CABECERA_EVENTO = struct.Struct("iIII")
+TAMANO_LECTURA = 64 * 1024
+
+
+def inotify_disponible():
+    """Indica si el sistema ofrece inotify"""
+    return sys.platform.startswith("linux")
+
+
+class VigilanteInotify:
+    """
+    Vigila un árbol con inotify: una vigilancia por carpeta, que se añaden al aparecer
+    carpetas nuevas. leer_cambios devuelve las rutas relativas que han cambiado.
+    """
+
+    def __init__(self, raiz):
+        import ctypes
+        self.raiz = raiz
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._ctypes = ctypes
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            numero = ctypes.get_errno()
+            raise OSError(numero, f"inotify_init1: {os.strerror(numero)}")
+        self._carpetas = {}  # descriptor de vigilancia -> ruta relativa de la carpeta
+        try:
+            self._vigilar_arbol(".")
+        except OSError:
+            self.cerrar()
+            raise
+
+    def _vigilar_carpeta(self, ruta):
+        ruta_abs = self.raiz if ruta == "." else os.path.join(self.raiz, ruta)
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(ruta_abs),
+                                          MASCARA_EVENTOS | IN_ONLYDIR | IN_DONT_FOLLOW)
+        if wd < 0:
+            numero = self._ctypes.get_errno()
+            if numero == errno.ENOSPC:
+                raise OSError(numero, "Se ha alcanzado el límite de vigilancias de inotify "
+                                      "(fs.inotify.max_user_watches)")
+            # La carpeta ha desaparecido o no se puede leer: no hay nada que vigilar
+            print(f"No se puede vigilar la carpeta {ruta_abs}: {os.strerror(numero)}")
+            return
+        # Una carpeta renombrada conserva su descriptor: se actualiza su ruta
+        self._carpetas[wd] = ruta
+
+    def _vigilar_arbol(self, ruta):
+        """Añade una vigilancia a la carpeta y a todas sus subcarpetas"""
+        pila = [ruta]
+        while pila:
+            actual = pila.pop()
+            self._vigilar_carpeta(actual)
+            ruta_abs = self.raiz if actual == "." else os.path.join(self.raiz, actual)
+            try:
+                with os.scandir(ruta_abs) as entradas:
+                    for entrada in entradas:
+                        if not entrada.name.startswith(PREFIJO_INTERNO) and entrada.is_dir(follow_symlinks=False):
+                            pila.append(entrada.name if actual == "." else os.path.join(actual, entrada.name))
+            except OSError as e:
+                print(f"Error al leer la carpeta {ruta_abs}: {e}")
+
+    def _leer_eventos(self):
+        eventos = []
+        while True:
+            try:
+                datos = os.read(self._fd, TAMANO_LECTURA)
+            except BlockingIOError:
+                return eventos
+            posicion = 0
+            while posicion + _CABECERA_EVENTO.size <= len(datos):
+                wd, mascara, _, longitud = _CABECERA_EVENTO.unpack_from(datos, posicion)
+                posicion += _CABECERA_EVENTO.size
+                nombre = datos[posicion:posicion + longitud].rstrip(b"\0")
+                posicion += longitud
+                eventos.append((wd, mascara, os.fsdecode(nombre)))
+
+    def leer_cambios(self, espera):
+        """
+        Espera hasta espera segundos a que haya cambios.
+
+        Returns:
+            Conjunto de rutas relativas cambiadas (vacío si no hubo ninguno) o None si se
+            perdieron eventos y hay que volver a comparar todo el origen
+        """
+        listos, _, _ = select.select([self._fd], [], [], espera)
+        if not listos:
+            return set()
+        cambios = set()
+        desbordado = False
+        for wd, mascara, nombre in self._leer_eventos():
+            if mascara & IN_Q_OVERFLOW:
+                desbordado = True
+                continue
+            if mascara & IN_IGNORED:
+                self._carpetas.pop(wd, None)
+                continue
+            carpeta = self._carpetas.get(wd)
+            if carpeta is None or not nombre or nombre.startswith(PREFIJO_INTERNO):
+                continue
+            ruta = nombre if carpeta == "." else os.path.join(carpeta, nombre)
+            if mascara & IN_ISDIR:
+                if not mascara & (IN_CREATE | IN_MOVED_TO):
+                    continue
+                # Lo que se escribió en la carpeta antes de vigilarla se copia con ella
+                try:
+                    self._vigilar_arbol(ruta)
+                except OSError as e:
+                    print(f"No se pueden vigilar los cambios de {ruta}: {e}")
+            cambios.add(ruta)
+        return None if desbordado else cambios
+
+    def cerrar(self):
+        """Libera el descriptor de inotify (y con él todas las vigilancias)"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class VigilanteSondeo:
+    """
+    Vigila un árbol comparando cada intervalo segundos una instantánea hecha con
+    os.scandir (tamaño y fecha de cada archivo y lista de carpetas) con la anterior.
+    """
+
+    def __init__(self, raiz, intervalo=INTERVALO_SONDEO):
+        self.raiz = raiz
+        self.intervalo = intervalo
+        self._archivos, self._carpetas = self._instantanea()
+        self._proxima = time.monotonic() + intervalo
+
+    def _instantanea(self):
+        indice = escanear_arbol(self.raiz)
+        archivos = {ruta: (tamano, mtime) for ruta, tamano, mtime in indice.archivos_bajo(".")}
+        return (archivos, set(indice.nodos))
+
+    def leer_cambios(self, espera):
+        """Espera hasta espera segundos a la próxima instantánea (ver VigilanteInotify.leer_cambios)"""
+        restante = self._proxima - time.monotonic()
+        if restante > 0:
+            time.sleep(min(espera, restante))
+            if restante > espera:
+                return set()
+        self._proxima = time.monotonic() + self.intervalo
+        archivos, carpetas = self._instantanea()
+        cambios = {ruta for ruta, info in archivos.items() if self._archivos.get(ruta) != info}
+        cambios.update(carpetas - self._carpetas)
+        self._archivos, self._carpetas = archivos, carpetas
+        return cambios
+
+    def cerrar(self):
+        """No hay nada que liberar"""
+
+
+def crear_vigilante(raiz, sondeo=False, intervalo=INTERVALO_SONDEO):
+    """
+    Crea el vigilante del origen: inotify si está disponible y no se pide el sondeo;
+    si inotify falla (p. ej. por el límite de vigilancias) se usa el sondeo.
+    """
+    if not sondeo and inotify_disponible():
+        try:
+            return VigilanteInotify(raiz)
+        except (OSError, AttributeError) as e:
+            print(f"No se puede usar inotify ({e}); se comprobarán los cambios cada {intervalo:g} s")
+    return VigilanteSondeo(raiz, intervalo)
+
+
+def _en_seleccion(ruta, seleccion):
+    """
+    Elementos que hay que comparar por un cambio en ruta: la propia ruta si está dentro
+    de la selección o los elementos seleccionados que contiene (si es una carpeta nueva).
+    """
+    if seleccion is None:
+        return [ruta]
+    for elemento in seleccion:
+        if ruta == elemento or ruta.startswith(elemento + os.sep):
+            return [ruta]
+    return [elemento for elemento in seleccion if elemento.startswith(ruta + os.sep)]
+
+
+class CopiaContinua:
+    """
+    Copia continua de un origen en un destino (ver el encabezado del módulo). Mantiene
+    los índices del origen y del destino y el catálogo abiertos entre lotes.
+    """
+
+    def __init__(self, origen, destino, elementos_seleccionados=None, opciones=None):
+        """
+        Args:
+            origen: Ruta de origen
+            destino: Ruta de destino
+            elementos_seleccionados: Carpetas y archivos vigilados (rutas relativas);
+                None para todo el origen, incluidos los elementos que se creen después
+            opciones: Opciones de respaldo (ver obtener_opciones_backup)
+        """
+        self.origen = origen
+        self.destino = destino
+        self.opciones = obtener_opciones_backup(opciones)
+        if self.opciones['snapshot_mode'] or self.opciones['repository_mode']:
+            raise ValueError("La copia continua solo está disponible en el modo normal "
+                             "(sin instantáneas ni almacén)")
+        self.seleccion = ([os.path.normpath(e) for e in elementos_seleccionados]
+                          if elementos_seleccionados else None)
+        # Si el destino está dentro del origen, sus cambios no se vuelven a copiar
+        relativa = os.path.relpath(os.path.abspath(destino), os.path.abspath(origen))
+        self._excluida = None if relativa.startswith(os.pardir) else relativa
+
+        from app.catalogo import obtener_indice_destino
+        from app.limitador import crear_limitador
+        self.indice_destino, self.catalogo = obtener_indice_destino(destino, self.opciones['use_catalog'])
+        self.limitador = crear_limitador(self.opciones, destino)
+        self.indice_origen = None
+
+    def _excluir(self, ruta):
+        return self._excluida is not None and (ruta == self._excluida or ruta.startswith(self._excluida + os.sep))
+
+    def _actualizar_origen(self, cambios):
+        """Actualiza el índice del origen con las rutas cambiadas y devuelve los elementos a comparar"""
+        elementos = []
+        for ruta in sorted(cambios):
+            if self._excluir(ruta):
+                continue
+            afectados = _en_seleccion(ruta, self.seleccion)
+            if not afectados:
+                continue
+            ruta_abs = os.path.join(self.origen, ruta)
+            try:
+                info = os.stat(ruta_abs)
+            except OSError:
+                continue  # Borrado o renombrado antes de copiarlo
+            if stat.S_ISDIR(info.st_mode):
+                if os.path.islink(ruta_abs):
+                    continue  # El escaneo tampoco sigue los enlaces a carpetas
+                subarbol = escanear_arbol(ruta_abs)
+                for carpeta in subarbol.carpetas_bajo("."):
+                    self.indice_origen.registrar_carpeta(os.path.normpath(os.path.join(ruta, carpeta)))
+                for relativa, tamano, mtime in subarbol.archivos_bajo("."):
+                    self.indice_origen.actualizar_archivo(os.path.join(ruta, relativa), tamano, mtime)
+            else:
+                self.indice_origen.actualizar_archivo(ruta, info.st_size, info.st_mtime)
+            elementos.extend(afectados)
+        return elementos
+
+    def copiar_cambios(self, cambios=None):
+        """
+        Compara y copia las rutas cambiadas.
+
+        Args:
+            cambios: Rutas relativas cambiadas; None para escanear y comparar todo el origen
+
+        Returns:
+            Tupla (elementos_copiados, detalles) con los elementos en formato
+            (ruta, tipo, tamaño) y la información de la copia (ver copiar_archivos_manualmente)
+        """
+        if cambios is None or self.indice_origen is None:
+            self.indice_origen = escanear_arbol(self.origen)
+            elementos = self.seleccion or ["."]
+        else:
+            elementos = self._actualizar_origen(cambios)
+        plan = planificar_copia(elementos, self.indice_origen, self.indice_destino, self.opciones['mtime_tolerance'])
+        if self._excluida is not None:
+            plan = [e for e in plan if not self._excluir(e[0])]
+        detalles = {}
+        if not plan:
+            return ([], detalles)
+
+        from app.backup import copiar_archivos_manualmente
+        elementos_copiados = copiar_archivos_manualmente(
+            self.origen, self.destino, elementos, None, self.opciones, None, self.indice_origen,
+            self.indice_destino, self.catalogo, plan=plan, detalles=detalles, limitador=self.limitador
+        )
+        return (elementos_copiados, detalles)
+
+    def ejecutar(self, detener=None, callback_lote=None, retardo=RETARDO, espera_maxima=ESPERA_MAXIMA,
+                 sondeo=False, intervalo=INTERVALO_SONDEO):
+        """
+        Vigila el origen y copia los cambios por lotes hasta que se active detener.
+        Antes de empezar se copia lo que haya cambiado desde la última copia.
+
+        Args:
+            detener: threading.Event que detiene la vigilancia (None = hasta Ctrl+C)
+            callback_lote: Función que recibe (elementos_copiados, detalles) tras cada lote
+            retardo: Segundos sin cambios nuevos antes de copiar un lote
+            espera_maxima: Segundos máximos desde el primer cambio hasta copiar el lote
+            sondeo: Si es True se usa el sondeo aunque inotify esté disponible
+            intervalo: Segundos entre instantáneas en el modo de sondeo
+        """
+        detener = detener or threading.Event()
+        # El vigilante se crea antes de la primera comparación para no perder nada entre ambas
+        vigilante = crear_vigilante(self.origen, sondeo, intervalo)
+        try:
+            resultado = self.copiar_cambios()
+            if callback_lote:
+                callback_lote(*resultado)
+
+            pendientes = set()
+            completa = False  # Se perdieron eventos: comparar todo el origen
+            primera = ultima = None
+            while not detener.is_set():
+                if primera is None:
+                    espera = ESPERA_INACTIVO
+                else:
+                    espera = max(0.0, min(ultima + retardo, primera + espera_maxima) - time.monotonic())
+                cambios = vigilante.leer_cambios(espera)
+                ahora = time.monotonic()
+                if cambios is None:
+                    completa = True
+                if cambios or cambios is None:
+                    pendientes.update(cambios or ())
+                    ultima = ahora
+                    primera = primera or ahora
+                if primera is None or (ahora - ultima < retardo and ahora - primera < espera_maxima):
+                    continue
+
+                resultado = self.copiar_cambios(None if completa else pendientes)
+                pendientes = set()
+                completa = False
+                primera = ultima = None
+                if callback_lote:
+                    callback_lote(*resultado)
+        finally:
+            vigilante.cerrar()
+
+    def cerrar(self):
+        """Guarda y cierra el catálogo del destino"""
+        self.catalogo.cerrar()
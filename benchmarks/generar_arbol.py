@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Generador determinista de árboles sintéticos para las pruebas de rendimiento
+
+La misma semilla y escala producen siempre los mismos nombres, tamaños, contenidos y
+fechas de modificación, de modo que dos ejecuciones de las pruebas son comparables.
+
+Uso:
+    python -m benchmarks.generar_arbol CARPETA [--perfil mixto] [--escala 1.0] [--semilla 1]
+"""
+
+import os
+import random
+import argparse
+
+# Fecha de modificación fija (2024-01-01 00:00:00 UTC) para que el plan de copia sea reproducible
+MTIME_BASE = 1704067200
+
+BLOQUE = 1024 * 1024
+
+PERFILES = ("pequenos", "grandes", "profundo", "ancho", "mixto")
+
+
+def _bytes_aleatorios(rnd, n):
+    """Genera n bytes pseudoaleatorios con el generador indicado"""
+    if n == 0:
+        return b""
+    return rnd.getrandbits(8 * n).to_bytes(n, "little")
+
+
+def _escribir(ruta, tamano, rnd, bloque, estadisticas):
+    """Escribe un archivo de tamaño fijo y contenido determinista"""
+    with open(ruta, "wb") as f:
+        if tamano <= BLOQUE:
+            f.write(_bytes_aleatorios(rnd, tamano))
+        else:
+            # Archivos grandes: el bloque base cambia en sus primeros bytes en cada MiB
+            numero = 0
+            restante = tamano
+            while restante > 0:
+                trozo = numero.to_bytes(8, "little") + bloque[8:]
+                f.write(trozo[:restante])
+                restante -= len(trozo)
+                numero += 1
+    os.utime(ruta, (MTIME_BASE, MTIME_BASE + estadisticas['archivos'] % 86400))
+    estadisticas['archivos'] += 1
+    estadisticas['bytes'] += tamano
+
+
+def _carpeta(ruta, estadisticas):
+    os.makedirs(ruta, exist_ok=True)
+    estadisticas['carpetas'] += 1
+
+
+def _pequenos(raiz, escala, rnd, bloque, estadisticas):
+    """Muchos archivos diminutos (0-4 KB) repartidos en carpetas de 100"""
+    total = max(1, int(20000 * escala))
+    for i in range(total):
+        carpeta = os.path.join(raiz, "pequenos", f"lote_{i // 100:04d}")
+        if i % 100 == 0:
+            _carpeta(carpeta, estadisticas)
+        _escribir(os.path.join(carpeta, f"archivo_{i:06d}.txt"), rnd.randint(0, 4096), rnd, bloque, estadisticas)
+
+
+def _grandes(raiz, escala, rnd, bloque, estadisticas):
+    """Unos pocos archivos enormes"""
+    carpeta = os.path.join(raiz, "grandes")
+    _carpeta(carpeta, estadisticas)
+    for i in range(3):
+        tamano = max(BLOQUE, int(32 * BLOQUE * escala)) + rnd.randint(0, BLOQUE)
+        _escribir(os.path.join(carpeta, f"imagen_{i}.bin"), tamano, rnd, bloque, estadisticas)
+
+
+def _profundo(raiz, escala, rnd, bloque, estadisticas):
+    """Una cadena de carpetas anidadas con unos pocos archivos por nivel"""
+    niveles = max(1, int(40 * min(escala, 2.0)))
+    carpeta = os.path.join(raiz, "profundo")
+    for nivel in range(niveles):
+        carpeta = os.path.join(carpeta, f"nivel_{nivel:02d}")
+        _carpeta(carpeta, estadisticas)
+        for i in range(5):
+            _escribir(os.path.join(carpeta, f"doc_{i}.dat"), rnd.randint(1024, 64 * 1024), rnd, bloque, estadisticas)
+
+
+def _ancho(raiz, escala, rnd, bloque, estadisticas):
+    """Una carpeta con miles de archivos y miles de subcarpetas"""
+    carpeta = os.path.join(raiz, "ancho")
+    _carpeta(carpeta, estadisticas)
+    for i in range(max(1, int(5000 * escala))):
+        _escribir(os.path.join(carpeta, f"f_{i:05d}.log"), rnd.randint(0, 2048), rnd, bloque, estadisticas)
+    for i in range(max(1, int(2000 * escala))):
+        subcarpeta = os.path.join(carpeta, f"sub_{i:05d}")
+        _carpeta(subcarpeta, estadisticas)
+        _escribir(os.path.join(subcarpeta, "unico.txt"), rnd.randint(0, 512), rnd, bloque, estadisticas)
+
+
+GENERADORES = {
+    'pequenos': (_pequenos,),
+    'grandes': (_grandes,),
+    'profundo': (_profundo,),
+    'ancho': (_ancho,),
+    'mixto': (_pequenos, _grandes, _profundo, _ancho)
+}
+
+
+def generar_arbol(raiz, perfil="mixto", escala=1.0, semilla=1):
+    """
+    Genera un árbol sintético.
+
+    Args:
+        raiz: Carpeta donde se crea el árbol (debe no existir o estar vacía)
+        perfil: Uno de PERFILES
+        escala: Multiplica el número de archivos y el tamaño de los archivos grandes
+        semilla: Semilla del generador pseudoaleatorio
+
+    Returns:
+        Diccionario con 'archivos', 'carpetas' y 'bytes' generados
+    """
+    if perfil not in GENERADORES:
+        raise ValueError(f"Perfil desconocido: {perfil}")
+    if os.path.isdir(raiz) and os.listdir(raiz):
+        raise ValueError(f"La carpeta {raiz} no está vacía")
+
+    rnd = random.Random(semilla)
+    bloque = _bytes_aleatorios(rnd, BLOQUE)
+    estadisticas = {'archivos': 0, 'carpetas': 0, 'bytes': 0}
+    os.makedirs(raiz, exist_ok=True)
+    for generador in GENERADORES[perfil]:
+        generador(raiz, escala, rnd, bloque, estadisticas)
+    return estadisticas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un árbol sintético determinista")
+    parser.add_argument("carpeta", help="Carpeta donde se crea el árbol")
+    parser.add_argument("--perfil", choices=PERFILES, default="mixto")
+    parser.add_argument("--escala", type=float, default=1.0)
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+    estadisticas = generar_arbol(args.carpeta, args.perfil, args.escala, args.semilla)
+    print(f"{estadisticas['archivos']} archivos, {estadisticas['carpetas']} carpetas, {estadisticas['bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
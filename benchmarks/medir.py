@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PyRespaldos - Pruebas de rendimiento por fases sobre un árbol sintético
+
+Mide por separado el escaneo del origen, el estado del destino, la comparación, la
+copia, el cálculo de tamaños, el manifiesto, el informe y una segunda comparación sin
+cambios (la ejecución incremental habitual). Los tiempos se guardan en JSON para
+comparar ejecuciones.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.medir [--perfil mixto] [--escala 0.25] [--repeticiones 3] [--salida r.json]
+    python -m benchmarks.medir --comparar anterior.json [--tolerancia 0.2]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import statistics
+import tempfile
+
+from app.config import obtener_opciones_backup
+from app.indice import escanear_arbol
+from app.catalogo import obtener_indice_destino
+from app.utils import comparar_origen_destino, calcular_tamano_carpeta
+from app.backup import copiar_archivos_manualmente
+from app.manifiesto import escribir_manifiesto
+from app.reporte import generar_reporte_html
+from app.respaldo import seleccion_completa
+from benchmarks.generar_arbol import generar_arbol, PERFILES
+
+FASES = ("escaneo", "indice_destino", "comparacion", "copia", "tamanos", "manifiesto", "informe",
+         "comparacion_sin_cambios")
+
+
+class Cronometro:
+    """Acumula el tiempo de cada fase de una ejecución"""
+
+    def __init__(self):
+        self.tiempos = {}
+
+    def medir(self, fase, funcion, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = funcion(*args, **kwargs)
+        self.tiempos[fase] = self.tiempos.get(fase, 0.0) + time.perf_counter() - inicio
+        return resultado
+
+
+def _analizar(origen):
+    """Reproduce el análisis de la interfaz: escaneo por lotes y tamaños de cada carpeta"""
+    estructura = []
+
+    def publicar_lote(lote, total_descubiertas):
+        estructura.extend((ruta, True, None, profundidad - 1) for ruta, profundidad, _ in lote)
+
+    indice = escanear_arbol(origen, publicar_lote)
+    tamanos = {ruta: tamano_total for ruta, _, _, tamano_total in indice.carpetas()}
+    return indice, tamanos
+
+
+def ejecutar_fases(origen, destino, opciones):
+    """
+    Ejecuta un respaldo completo sobre un destino vacío midiendo cada fase.
+
+    Returns:
+        Diccionario {fase: segundos}
+    """
+    cronometro = Cronometro()
+    indice_origen, _ = cronometro.medir("escaneo", _analizar, origen)
+    seleccion = seleccion_completa(indice_origen)
+
+    indice_destino, catalogo = cronometro.medir("indice_destino", obtener_indice_destino, destino,
+                                                opciones['use_catalog'])
+    tamaño_antes = indice_destino.tamano_total()
+    plan = cronometro.medir("comparacion", comparar_origen_destino, origen, destino, seleccion,
+                            indice_origen, indice_destino, opciones['mtime_tolerance'])
+
+    detalles = {}
+    try:
+        copiados = cronometro.medir("copia", copiar_archivos_manualmente, origen, destino, seleccion, None,
+                                    opciones, None, indice_origen, indice_destino, catalogo, plan=plan,
+                                    detalles=detalles)
+    finally:
+        catalogo.cerrar()
+
+    # Tamaño según el índice (lo que usa la aplicación) y recuento independiente del disco
+    tamaño_despues = cronometro.medir("tamanos", indice_destino.tamano_total)
+    cronometro.medir("tamanos", calcular_tamano_carpeta, destino)
+
+    manifiesto = cronometro.medir("manifiesto", escribir_manifiesto, origen, destino, copiados, tamaño_antes,
+                                  tamaño_despues, detalles, opciones['manifest_compress'])
+    informe = cronometro.medir("informe", generar_reporte_html, origen, destino, copiados, tamaño_antes,
+                               tamaño_despues, tamaño_despues - tamaño_antes, indice_origen, indice_destino,
+                               detalles, manifiesto=manifiesto)
+
+    # Segunda ejecución sin cambios: catálogo del destino y plan vacío
+    def comparar_sin_cambios():
+        indice, catalogo = obtener_indice_destino(destino, True)
+        catalogo.cerrar()
+        return comparar_origen_destino(origen, destino, seleccion, indice_origen, indice,
+                                       opciones['mtime_tolerance'])
+
+    pendientes = cronometro.medir("comparacion_sin_cambios", comparar_sin_cambios)
+    if pendientes:
+        print(f"Aviso: la segunda comparación encontró {len(pendientes)} elementos pendientes", file=sys.stderr)
+
+    # El informe y el manifiesto se escriben en el directorio actual
+    for ruta in (informe, manifiesto):
+        os.remove(ruta)
+    paginas = os.path.splitext(informe)[0] + "_paginas"
+    if os.path.isdir(paginas):
+        shutil.rmtree(paginas)
+    return cronometro.tiempos
+
+
+def medir(perfil="mixto", escala=0.25, semilla=1, repeticiones=3, opciones=None, directorio=None):
+    """
+    Genera el árbol y ejecuta las fases varias veces con un destino nuevo cada vez.
+
+    Returns:
+        Diccionario con la descripción de la prueba y la mediana de cada fase en segundos
+    """
+    opciones = obtener_opciones_backup(opciones)
+    trabajo = tempfile.mkdtemp(prefix="pyrespaldos_bench_", dir=directorio)
+    directorio_actual = os.getcwd()
+    try:
+        origen = os.path.join(trabajo, "origen")
+        inicio = time.perf_counter()
+        arbol = generar_arbol(origen, perfil, escala, semilla)
+        generacion = time.perf_counter() - inicio
+
+        os.chdir(trabajo)
+        ejecuciones = []
+        for i in range(repeticiones):
+            destino = os.path.join(trabajo, f"destino_{i}")
+            os.makedirs(destino)
+            ejecuciones.append(ejecutar_fases(origen, destino, opciones))
+            shutil.rmtree(destino)
+    finally:
+        os.chdir(directorio_actual)
+        shutil.rmtree(trabajo, ignore_errors=True)
+
+    fases = {fase: statistics.median(e.get(fase, 0.0) for e in ejecuciones) for fase in FASES}
+    return {
+        'fecha': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'perfil': perfil,
+        'escala': escala,
+        'semilla': semilla,
+        'repeticiones': repeticiones,
+        'opciones': {clave: opciones[clave] for clave in ('use_multithreading', 'num_workers', 'verify_copy',
+                                                          'hash_algorithm', 'use_catalog')},
+        'arbol': arbol,
+        'generacion': generacion,
+        'fases': fases,
+        'total': sum(fases.values())
+    }
+
+
+def comparar_resultados(anterior, actual, tolerancia=0.2, minimo=0.01):
+    """
+    Compara dos resultados fase a fase.
+
+    Args:
+        anterior: Resultado de referencia
+        actual: Resultado nuevo
+        tolerancia: Aumento relativo admitido (0.2 = 20 %)
+        minimo: Las fases que tardan menos de estos segundos en ambos no se consideran
+
+    Returns:
+        Lista de (fase, segundos_antes, segundos_ahora, es_regresion)
+    """
+    filas = []
+    for fase in FASES:
+        antes = anterior['fases'].get(fase)
+        ahora = actual['fases'].get(fase)
+        if antes is None or ahora is None:
+            continue
+        regresion = max(antes, ahora) >= minimo and ahora > antes * (1 + tolerancia)
+        filas.append((fase, antes, ahora, regresion))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pruebas de rendimiento de PyRespaldos")
+    parser.add_argument("--perfil", choices=PERFILES, default="mixto")
+    parser.add_argument("--escala", type=float, default=0.25)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sin-multihilo", action="store_true")
+    parser.add_argument("--sin-verificar", action="store_true")
+    parser.add_argument("--directorio", help="Carpeta temporal para el árbol (por defecto la del sistema)")
+    parser.add_argument("--salida", help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", help="Resultado anterior con el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+
+    opciones = {}
+    if args.sin_multihilo:
+        opciones['use_multithreading'] = False
+    if args.sin_verificar:
+        opciones['verify_copy'] = False
+    if anterior is not None:
+        # Repetir la prueba con la misma configuración que la referencia
+        args.perfil, args.escala, args.semilla = anterior['perfil'], anterior['escala'], anterior['semilla']
+        opciones.update(anterior['opciones'])
+
+    resultado = medir(args.perfil, args.escala, args.semilla, args.repeticiones, opciones, args.directorio)
+
+    print(f"Árbol: {resultado['arbol']['archivos']} archivos, {resultado['arbol']['carpetas']} carpetas, "
+          f"{resultado['arbol']['bytes']} bytes")
+    for fase in FASES:
+        print(f"  {fase:<24} {resultado['fases'][fase]:9.3f} s")
+    print(f"  {'total':<24} {resultado['total']:9.3f} s")
+
+    salida = args.salida or f"benchmark_{args.perfil}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en {salida}")
+
+    if anterior is not None:
+        regresiones = 0
+        for fase, antes, ahora, regresion in comparar_resultados(anterior, resultado, args.tolerancia):
+            marca = "  REGRESIÓN" if regresion else ""
+            print(f"  {fase:<24} {antes:9.3f} s -> {ahora:9.3f} s{marca}")
+            regresiones += regresion
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()